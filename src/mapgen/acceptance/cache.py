@@ -0,0 +1,72 @@
+"""Result cache for incremental acceptance runs.
+
+An AOI's result is keyed by the content of its golden files and a fingerprint
+of the code that renders and scores it. The key is stored in the AOI's
+``result.json``; while it matches and the artifacts are still there, the
+previous result is reused instead of rendering and scoring again.
+"""
+
+import hashlib
+import json
+from functools import cache
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+
+import mapgen
+from mapgen.omap.cache import file_sha256
+
+# Golden files of an AOI that determine its result
+INPUT_FILES = ("ref.omap", "ref.png", "render_config.json", "threshold.txt")
+
+# Subpackages and modules of mapgen whose code determines a result
+CODE_PACKAGES = ("acceptance", "metrics", "omap", "render")
+CODE_MODULES = ("images.py",)
+
+# Distributions that take part in decoding, drawing and scoring
+DEPENDENCIES = ("numpy", "Pillow", "scikit-image")
+
+
+@cache
+def code_fingerprint() -> str:
+    """
+    Hashes the source of the image loading, rendering and scoring code and the
+    versions of DEPENDENCIES.
+    """
+    digest = hashlib.sha256()
+    root = Path(mapgen.__file__).parent
+    paths = [path for package in CODE_PACKAGES for path in sorted((root / package).rglob("*.py"))]
+    for path in paths + [root / module for module in CODE_MODULES]:
+        digest.update(path.relative_to(root).as_posix().encode("utf-8") + b"\0")
+        digest.update(path.read_bytes() + b"\0")
+    for name in DEPENDENCIES:
+        digest.update(f"{name} {metadata.version(name)}\0".encode())
+    return digest.hexdigest()
+
+
+def input_key(aoi_dir: Path, streaming: bool = False) -> str:
+    """Computes the cache key of an AOI's result."""
+    files = {
+        name: file_sha256(aoi_dir / name) if (aoi_dir / name).exists() else None
+        for name in INPUT_FILES
+    }
+    key = {"files": files, "streaming": streaming, "code": code_fingerprint()}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def cached_result(output_dir: Path, key: str) -> dict[str, Any] | None:
+    """
+    Returns the previous result in ``output_dir`` if it was computed for ``key``
+    and its artifacts still exist.
+    """
+    try:
+        with open(output_dir / "result.json") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(result, dict) or result.get("input_key") != key:
+        return None
+    artifacts = result.get("artifacts", {})
+    if not all(Path(path).exists() for path in artifacts.values()):
+        return None
+    return result
@@ -1,26 +1,53 @@
 """Core logic for running end-to-end acceptance tests."""
 
 import json
-import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Any
 
 import numpy as np
 from PIL import Image, ImageChops
 
-from mapgen.render.renderer import render_omap_to_png
-from mapgen.metrics.similarity import compute_ssim
+from mapgen.acceptance.cache import cached_result, input_key
+from mapgen.images import load_image
+from mapgen.metrics.similarity import ssim_gray
+from mapgen.omap.model import OMapDocument
+from mapgen.render.renderer import render_omap
+
+
+def run_aoi(
+    aoi_dir: Path,
+    output_dir: Path,
+    streaming: bool = False,
+    omap_cache_dir: Path | None = None,
+    force: bool = False,
+    write_images: bool = True,
+    load_document: Callable[[str | Path], OMapDocument] | None = None,
+    load_reference: Callable[[str, str], np.ndarray] = load_image,
+) -> dict[str, Any]:
+    """Run acceptance test for a single AOI.
 
+    The candidate is rendered in memory and the reference decoded once; the
+    score and the diff share both. The candidate and diff PNGs are written in
+    a background thread while the score is computed.
 
-def run_aoi(aoi_dir: Path, output_dir: Path) -> Dict[str, Any]:
-    """Run acceptance test for a single AOI.
+    The previous result in ``output_dir`` is reused while the AOI's golden
+    files and the rendering code are unchanged (see mapgen.acceptance.cache).
 
     Args:
         aoi_dir: Directory containing AOI golden files.
         output_dir: Directory to save artifacts.
+        streaming: Render with the streaming .omap loader.
+        omap_cache_dir: Directory for compiled .omap caches.
+        force: Render and score even if a previous result is up to date.
+        write_images: Write the candidate and diff PNGs.
+        load_document: Loads ref.omap in place of load_omap (see render_omap).
+        load_reference: Decodes ref.png in a PIL mode, like load_image.
 
     Returns:
-        Result dictionary.
+        Result dictionary; "cached" tells whether it was reused.
     """
     ref_omap = aoi_dir / "ref.omap"
     ref_png = aoi_dir / "ref.png"
@@ -30,12 +57,19 @@ def run_aoi(aoi_dir: Path, output_dir: Path) -> Dict[str, Any]:
     if not config_path.exists():
         raise FileNotFoundError(f"Missing render_config.json in {aoi_dir}")
 
-    with open(config_path, "r") as f:
+    key = input_key(aoi_dir, streaming)
+    if not force:
+        cached = cached_result(output_dir, key)
+        if cached is not None and (cached["artifacts"] or not write_images):
+            cached["cached"] = True
+            return cached
+
+    with open(config_path) as f:
         config = json.load(f)
 
     threshold = 1.0
     if threshold_path.exists():
-        with open(threshold_path, "r") as f:
+        with open(threshold_path) as f:
             threshold = float(f.read().strip())
 
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -46,51 +80,160 @@ def run_aoi(aoi_dir: Path, output_dir: Path) -> Dict[str, Any]:
     # Render candidate
     bbox = tuple(config["bbox"])
     size = tuple(config["size"])
-    render_omap_to_png(ref_omap, candidate_png, bbox, size)
-
-    # Score
-    score = compute_ssim(str(ref_png), str(candidate_png))
-    passed = score >= threshold
-
-    # Generate diff
-    with Image.open(ref_png) as ref_img, Image.open(candidate_png) as cand_img:
-        diff = ImageChops.difference(ref_img.convert("RGB"), cand_img.convert("RGB"))
-        diff.save(diff_png)
-
+    cand_img = render_omap(
+        ref_omap,
+        bbox,
+        size,
+        streaming=streaming,
+        cache_dir=omap_cache_dir,
+        load_document=load_document,
+    )
+    ref_img = Image.fromarray(load_reference(str(ref_png), "RGB"))
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        images = None
+        if write_images:
+            images = pool.submit(_write_images, ref_img, cand_img, candidate_png, diff_png)
+
+        # Score
+        score = ssim_gray(np.asarray(ref_img.convert("L")), np.asarray(cand_img.convert("L")))
+        passed = score >= threshold
+
+        # result.json must not exist before the images it lists
+        if images is not None:
+            images.result()
+
+    artifacts = {"candidate": str(candidate_png), "diff": str(diff_png)}
+    if not write_images:
+        # Images of an earlier run would no longer match the result
+        for path in (candidate_png, diff_png):
+            path.unlink(missing_ok=True)
+        artifacts = {}
     result = {
         "aoi": aoi_dir.name,
         "score": score,
         "threshold": threshold,
         "pass": passed,
-        "artifacts": {
-            "candidate": str(candidate_png),
-            "diff": str(diff_png),
-        }
+        "artifacts": artifacts,
+        "input_key": key,
     }
 
     with open(result_json, "w") as f:
         json.dump(result, f, indent=2)
 
+    result["cached"] = False
     return result
 
 
-def run_all(golden_dir: Path, artifacts_dir: Path) -> List[Dict[str, Any]]:
+def _write_images(
+    ref_img: Image.Image, cand_img: Image.Image, candidate_png: Path, diff_png: Path
+) -> None:
+    cand_img.save(candidate_png)
+    ImageChops.difference(ref_img, cand_img).save(diff_png)
+
+
+def run_all(
+    golden_dir: Path,
+    artifacts_dir: Path,
+    streaming: bool = False,
+    omap_cache_dir: Path | None = None,
+    jobs: int | None = None,
+    force: bool = False,
+    write_images: bool = True,
+) -> list[dict[str, Any]]:
     """Run acceptance tests for all AOIs in the golden directory.
 
+    AOIs run in name order, or in a process pool of ``jobs`` workers. Either
+    way results and progress lines come out in name order, and a summary with
+    per-AOI timings is written to ``artifacts_dir / "summary.json"``.
+
     Args:
         golden_dir: Directory containing AOI subdirectories.
         artifacts_dir: Directory to save artifacts.
+        streaming: Render with the streaming .omap loader.
+        omap_cache_dir: Directory for compiled .omap caches.
+        jobs: Run AOIs in a process pool of this size.
+        force: Re-run AOIs whose previous result is up to date.
+        write_images: Write the candidate and diff PNGs.
 
     Returns:
         List of result dictionaries.
     """
+    aoi_dirs = sorted(
+        entry
+        for entry in golden_dir.iterdir()
+        if entry.is_dir() and (entry / "render_config.json").exists()
+    )
+    tasks = [
+        (entry, artifacts_dir / entry.name, streaming, omap_cache_dir, force, write_images)
+        for entry in aoi_dirs
+    ]
+
+    start = time.perf_counter()
     results = []
-    for entry in golden_dir.iterdir():
-        if entry.is_dir() and (entry / "render_config.json").exists():
-            print(f"Running AOI: {entry.name}...")
-            result = run_aoi(entry, artifacts_dir / entry.name)
+    timings = []
+    if jobs is None or jobs <= 1:
+        for task in tasks:
+            print(f"Running AOI: {task[0].name}...")
+            result, seconds = _timed_run(*task)
+            _report(result)
             results.append(result)
-            status = "PASS" if result["pass"] else "FAIL"
-            print(f"  Score: {result['score']:.6f} (threshold: {result['threshold']:.6f}) -> {status}")
-    
+            timings.append(seconds)
+    else:
+        # Workers do not print; progress is reported here in AOI order as
+        # results arrive, so lines never interleave
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_timed_run, *task) for task in tasks]
+            for task, future in zip(tasks, futures, strict=True):
+                print(f"Running AOI: {task[0].name}...")
+                result, seconds = future.result()
+                _report(result)
+                results.append(result)
+                timings.append(seconds)
+
+    write_summary(results, timings, time.perf_counter() - start, artifacts_dir / "summary.json")
     return results
+
+
+def write_summary(
+    results: list[dict[str, Any]], timings: list[float], seconds: float, path: Path
+) -> None:
+    """Writes the results of a run-all, with per-AOI timings, to a JSON file."""
+    summary = {
+        "total": len(results),
+        "passed": sum(1 for r in results if r["pass"]),
+        "failed": [r["aoi"] for r in results if not r["pass"]],
+        "cached": sum(1 for r in results if r.get("cached")),
+        "seconds": seconds,
+        "aois": [dict(result, seconds=t) for result, t in zip(results, timings, strict=True)],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+
+def _timed_run(
+    aoi_dir: Path,
+    output_dir: Path,
+    streaming: bool,
+    omap_cache_dir: Path | None,
+    force: bool,
+    write_images: bool,
+) -> tuple[dict[str, Any], float]:
+    start = time.perf_counter()
+    result = run_aoi(
+        aoi_dir,
+        output_dir,
+        streaming=streaming,
+        omap_cache_dir=omap_cache_dir,
+        force=force,
+        write_images=write_images,
+    )
+    return result, time.perf_counter() - start
+
+
+def _report(result: dict[str, Any]) -> None:
+    status = "PASS" if result["pass"] else "FAIL"
+    if result.get("cached"):
+        status += " (cached)"
+    print(f"  Score: {result['score']:.6f} (threshold: {result['threshold']:.6f}) -> {status}")
@@ -0,0 +1,343 @@
+"""Benchmarks of the parse, render, score and acceptance hot paths.
+
+``mapgen bench`` times the hot paths on synthetic maps of a given number of
+vertices and writes the results to a JSON file. Given the results of an
+earlier run as a baseline, it flags benchmarks that got slower by more than a
+tolerance.
+
+Synthetic maps are random but deterministic: lines and areas of a few
+symbols, spread over several map parts, a fraction of them made of Bezier
+curves. They are kept in the work directory and reused by later runs.
+"""
+
+import contextlib
+import gc
+import io
+import json
+import math
+import platform
+import shutil
+import statistics
+import sys
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from mapgen.omap.model import COORD_CLOSE_POINT, COORD_CURVE_START
+from mapgen.omap.writer import OMAP_NAMESPACE, XML_DECLARATION, coords_text
+
+BENCHMARKS = (
+    "load_omap",
+    "get_objects",
+    "render_omap_to_png",
+    "compute_ssim",
+    "save_omap",
+    "run_all",
+)
+
+DEFAULT_TOLERANCE = 0.2
+
+# Differences below this many seconds are timer noise, never regressions
+_NOISE_SECONDS = 0.005
+
+# (name, color priority, rgb) of the synthetic map's colors; symbol i uses color i
+_SYMBOLS = (
+    ("Contour", 0, (0.82, 0.36, 0.0)),
+    ("Path", 1, (0.0, 0.0, 0.0)),
+    ("Water", 2, (0.0, 1.0, 1.0)),
+    ("Forest", 3, (0.24, 1.0, 0.09)),
+)
+# Symbol types: two lines, then two areas
+_SYMBOL_TYPES = (2, 2, 4, 4)
+
+
+@dataclass
+class BenchResult:
+    """Timings of one benchmark on a map of ``vertices`` vertices, in seconds."""
+
+    name: str
+    vertices: int
+    runs: list[float] = field(default_factory=list)
+
+    @property
+    def seconds(self) -> float:
+        """Best of the runs, the least disturbed by other load."""
+        return min(self.runs)
+
+
+@dataclass
+class Comparison:
+    """Best time of a benchmark against its best time in a baseline."""
+
+    name: str
+    vertices: int
+    seconds: float
+    baseline: float
+
+    @property
+    def change(self) -> float:
+        """Relative change of the time; positive is slower."""
+        return self.seconds / self.baseline - 1 if self.baseline > 0 else 0.0
+
+    def regressed(self, tolerance: float) -> bool:
+        return self.change > tolerance and self.seconds - self.baseline > _NOISE_SECONDS
+
+
+def write_synthetic_omap(
+    path: str | Path,
+    vertices: int,
+    parts: int = 8,
+    curve_fraction: float = 0.25,
+    seed: int = 0,
+) -> tuple[float, float, float, float]:
+    """
+    Writes a random .omap file with about ``vertices`` vertices.
+
+    Objects have 4 to 100 vertices and are spread evenly over ``parts`` map
+    parts. Half are lines, wandering from a random start, and half closed
+    areas; ``curve_fraction`` of both are cubic Bezier curves throughout. The
+    extent grows with the square root of ``vertices``, so the density of the
+    map stays the same.
+
+    Returns:
+        The extent of the map as (xmin, ymin, xmax, ymax).
+    """
+    rng = np.random.default_rng(seed)
+    side = 100.0 * math.sqrt(max(vertices, 1))
+    counts = []
+    total = 0
+    while total < vertices:
+        # Curved objects need 3k + 1 vertices
+        counts.append(3 * int(rng.integers(1, 34)) + 1)
+        total += counts[-1]
+    n_objects = len(counts)
+    curved = rng.random(n_objects) < curve_fraction
+    symbols = rng.integers(0, len(_SYMBOLS), n_objects)
+    bounds = np.linspace(0, n_objects, parts + 1).astype(int) if parts > 0 else np.array([0, 0])
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(XML_DECLARATION)
+        f.write(f'<map xmlns="{OMAP_NAMESPACE}" version="9">\n')
+        f.write(f'<colors count="{len(_SYMBOLS)}">\n')
+        for name, priority, (r, g, b) in _SYMBOLS:
+            f.write(
+                f'<color priority="{priority}" name="{name}" c="0" m="0" y="0" k="1" opacity="1">'
+                f'<rgb r="{r}" g="{g}" b="{b}"/></color>\n'
+            )
+        f.write('</colors>\n<barrier version="6" required="0.6.0">\n')
+        f.write(f'<symbols count="{len(_SYMBOLS)}">\n')
+        for i, ((name, priority, _), symbol_type) in enumerate(
+            zip(_SYMBOLS, _SYMBOL_TYPES, strict=True)
+        ):
+            body = (
+                f'<line_symbol color="{priority}" line_width="{150 + 100 * i}"/>'
+                if symbol_type == 2
+                else f'<area_symbol inner_color="{priority}" min_area="0" patterns="0"/>'
+            )
+            f.write(
+                f'<symbol type="{symbol_type}" id="{i}" code="{i + 1}" name="{name}">'
+                f"{body}</symbol>\n"
+            )
+        f.write(f'</symbols>\n<parts count="{parts}" current="0">\n')
+        for p in range(parts):
+            a, b = bounds[p], bounds[p + 1]
+            f.write(f'<part name="Part {p + 1}"><objects count="{b - a}">\n')
+            for i in range(a, b):
+                area = _SYMBOL_TYPES[symbols[i]] == 4
+                coords, flags = _synthetic_object(rng, counts[i], bool(curved[i]), area, side)
+                f.write(
+                    f'<object type="{3 if area else 2}" symbol="{symbols[i]}">'
+                    f'<coords count="{len(coords)}">{coords_text(coords, flags)}</coords>'
+                    "</object>\n"
+                )
+            f.write("</objects></part>\n")
+        f.write("</parts>\n</barrier>\n</map>\n")
+    return (0.0, 0.0, side, side)
+
+
+def _synthetic_object(
+    rng: np.random.Generator, n: int, curved: bool, area: bool, side: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Vertices and flags of an object with ``n`` vertices."""
+    step = side / 200
+    start = rng.random(2) * side
+    if area:
+        # A wobbly ring around a center, closed on its first vertex
+        angles = np.linspace(0, 2 * np.pi, n)
+        radius = step * n / 8 * (1 + 0.3 * rng.random(n))
+        radius[-1] = radius[0]
+        coords = start + np.stack([np.cos(angles), np.sin(angles)], axis=1) * radius[:, None]
+    else:
+        coords = start + np.cumsum(rng.normal(0, step, (n, 2)), axis=0)
+    flags = np.zeros(n, dtype=np.uint8)
+    if curved:
+        flags[0 : n - 1 : 3] = COORD_CURVE_START
+    if area:
+        flags[-1] |= COORD_CLOSE_POINT
+    # Kept within the extent, so renders of it cover every object
+    return np.rint(np.clip(coords, 0, side)).astype(np.int64), flags
+
+
+def run_benchmarks(
+    work_dir: str | Path,
+    vertices: Sequence[int],
+    names: Sequence[str] = BENCHMARKS,
+    parts: int = 8,
+    curve_fraction: float = 0.25,
+    size_px: tuple[int, int] = (1024, 1024),
+    repeat: int = 3,
+    report: Callable[[BenchResult], None] | None = None,
+) -> list[BenchResult]:
+    """
+    Times benchmarks on synthetic maps of each of the given sizes.
+
+    Every benchmark runs ``repeat`` times; its inputs are prepared before each
+    run and not timed. Renders cover the whole map.
+
+    Args:
+        work_dir: Directory for the synthetic maps and everything the
+            benchmarks write.
+        vertices: Map sizes, in vertices.
+        names: Benchmarks to run, of BENCHMARKS.
+        parts: Map parts of the synthetic maps.
+        curve_fraction: Fraction of objects made of Bezier curves.
+        size_px: (width, height) of renders and scored images.
+        repeat: Runs of every benchmark.
+        report: Called with every result as soon as it is complete.
+    """
+    unknown = sorted(set(names) - set(BENCHMARKS))
+    if unknown:
+        raise ValueError(
+            f"Unknown benchmarks {', '.join(unknown)}, expected some of {', '.join(BENCHMARKS)}"
+        )
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    results = []
+    for n in vertices:
+        cases = _cases(work_dir, n, parts, curve_fraction, size_px)
+        for name in BENCHMARKS:
+            if name not in names:
+                continue
+            setup, run = cases[name]
+            result = BenchResult(name, n)
+            for _ in range(repeat):
+                state = setup()
+                gc.collect()
+                start = time.perf_counter()
+                run(state)
+                result.runs.append(time.perf_counter() - start)
+            results.append(result)
+            if report is not None:
+                report(result)
+    return results
+
+
+def _cases(
+    work_dir: Path, vertices: int, parts: int, curve_fraction: float, size_px: tuple[int, int]
+) -> dict[str, tuple[Callable[[], Any], Callable[[Any], Any]]]:
+    """(setup, run) of every benchmark on the synthetic map of a size."""
+    from mapgen.acceptance.run import run_all
+    from mapgen.metrics.similarity import compute_ssim
+    from mapgen.omap import load_omap, save_omap
+    from mapgen.render.renderer import render_omap_to_png
+
+    name = f"synthetic_{vertices}_{parts}_{curve_fraction:g}"
+    omap_path = work_dir / f"{name}.omap"
+    extent_path = omap_path.with_suffix(".json")
+    if omap_path.exists() and extent_path.exists():
+        extent = tuple(json.loads(extent_path.read_text()))
+    else:
+        extent = write_synthetic_omap(omap_path, vertices, parts, curve_fraction)
+        extent_path.write_text(json.dumps(extent))
+    bbox = (extent[0], extent[1], extent[2], extent[3])
+
+    # Golden AOI of the map for run_all; the reference is an LOD render, so
+    # scores are high but not exact
+    golden = work_dir / f"{name}_{size_px[0]}x{size_px[1]}_golden"
+    aoi_dir = golden / "aoi"
+    ref_png = aoi_dir / "ref.png"
+    if not ref_png.exists():
+        aoi_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(omap_path, aoi_dir / "ref.omap")
+        (aoi_dir / "render_config.json").write_text(json.dumps({"bbox": bbox, "size": size_px}))
+        (aoi_dir / "threshold.txt").write_text("0.5\n")
+        render_omap_to_png(omap_path, ref_png, bbox, size_px, lod=True)
+    cand_png = work_dir / f"{name}_{size_px[0]}x{size_px[1]}.png"
+
+    def render(_: Any) -> None:
+        render_omap_to_png(omap_path, cand_png, bbox, size_px)
+
+    def prepare_candidate() -> None:
+        if not cand_png.exists():
+            render(None)
+
+    def acceptance(_: Any) -> None:
+        # run_all reports progress on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_all(golden, work_dir / f"{name}_artifacts", force=True)
+
+    return {
+        "load_omap": (lambda: None, lambda _: load_omap(omap_path)),
+        "get_objects": (lambda: load_omap(omap_path), lambda doc: doc.get_objects()),
+        "render_omap_to_png": (lambda: None, render),
+        "compute_ssim": (
+            prepare_candidate,
+            lambda _: compute_ssim(str(ref_png), str(cand_png)),
+        ),
+        "save_omap": (
+            lambda: load_omap(omap_path),
+            lambda doc: save_omap(doc, work_dir / f"{name}_saved.omap"),
+        ),
+        "run_all": (lambda: None, acceptance),
+    }
+
+
+def write_results(results: Sequence[BenchResult], path: str | Path) -> None:
+    """Writes results, with the interpreter and machine they ran on, to a JSON file."""
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": [dict(asdict(r), seconds=r.seconds) for r in results],
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def read_results(path: str | Path) -> list[BenchResult]:
+    """Reads results written by write_results."""
+    with open(path) as f:
+        data = json.load(f)
+    return [BenchResult(r["name"], r["vertices"], r["runs"]) for r in data["results"]]
+
+
+def compare(results: Sequence[BenchResult], baseline: Sequence[BenchResult]) -> list[Comparison]:
+    """Pairs results with the baseline results of the same benchmark and size."""
+    best = {(r.name, r.vertices): r.seconds for r in baseline}
+    return [
+        Comparison(r.name, r.vertices, r.seconds, best[(r.name, r.vertices)])
+        for r in results
+        if (r.name, r.vertices) in best
+    ]
+
+
+def print_result(
+    result: BenchResult, baseline: Comparison | None = None, tolerance: float = DEFAULT_TOLERANCE
+) -> None:
+    """Prints a result on one line, with its change against the baseline if given."""
+    line = f"{result.name:<20} {result.vertices:>12,} vertices  {result.seconds:9.4f} s"
+    if len(result.runs) > 1:
+        line += f"  (median {statistics.median(result.runs):.4f} s)"
+    if baseline is not None:
+        line += f"  {baseline.change:+7.1%} vs {baseline.baseline:.4f} s"
+        if baseline.regressed(tolerance):
+            line += "  REGRESSION"
+    print(line)
+    sys.stdout.flush()
@@ -2,7 +2,29 @@
 
 import argparse
 import sys
-from collections.abc import Sequence
+from collections.abc import Callable, Iterator, Sequence
+
+# Only the standard library is imported at module level; every command imports
+# what it needs, so startup and `mapgen --help` stay cheap.
+
+
+class _LazyChoices:
+    """Argument choices that are only listed when argparse checks or shows them."""
+
+    def __init__(self, names: Callable[[], list[str]]):
+        self.names = names
+
+    def __contains__(self, value: object) -> bool:
+        return value in self.names()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names())
+
+
+def _metric_names() -> list[str]:
+    from mapgen.metrics import metric_names
+
+    return metric_names()
 
 
 def main(argv: Sequence[str] | None = None) -> int:
@@ -22,45 +44,225 @@ def main(argv: Sequence[str] | None = None) -> int:
 
     # OMap commands
     omap_parser = subparsers.add_parser("omap", help="OMap file operations")
-    omap_subparsers = omap_parser.add_subparsers(dest="omap_command", help="Available OMap commands")
+    omap_subparsers = omap_parser.add_subparsers(
+        dest="omap_command", help="Available OMap commands"
+    )
 
     roundtrip_parser = omap_subparsers.add_parser("roundtrip", help="Round-trip an OMap file")
     roundtrip_parser.add_argument("--in", dest="input_file", required=True, help="Input OMap file")
-    roundtrip_parser.add_argument("--out", dest="output_file", required=True, help="Output OMap file")
+    roundtrip_parser.add_argument(
+        "--out", dest="output_file", required=True, help="Output OMap file"
+    )
+
+    compile_parser = omap_subparsers.add_parser(
+        "compile", help="Compile an OMap file into a binary cache"
+    )
+    compile_parser.add_argument("--in", dest="input_file", required=True, help="Input OMap file")
+    compile_parser.add_argument(
+        "--cache-dir", help="Cache directory (default: sidecar file next to the input)"
+    )
 
     # Render command
+    # --in/--out/--bbox/--size are required unless a render subcommand is given;
+    # that is checked after parsing.
     render_parser = subparsers.add_parser("render", help="Render OMap to PNG")
-    render_parser.add_argument("--in", dest="input_file", required=True, help="Input OMap file")
-    render_parser.add_argument("--out", dest="output_file", required=True, help="Output PNG file")
-    render_parser.add_argument("--bbox", required=True, help="Bounding box as xmin,ymin,xmax,ymax")
-    render_parser.add_argument("--size", required=True, help="Output size as width,height")
+    render_parser.add_argument("--in", dest="input_file", help="Input OMap file (required)")
+    render_parser.add_argument("--out", dest="output_file", help="Output PNG file (required)")
+    render_parser.add_argument("--bbox", help="Bounding box as xmin,ymin,xmax,ymax (required)")
+    render_parser.add_argument("--size", help="Output size as width,height (required)")
+    render_parser.add_argument(
+        "--streaming", action="store_true", help="Stream the OMap file instead of loading it fully"
+    )
+    render_parser.add_argument(
+        "--parse-workers", type=int, help="Parse map parts in this many processes"
+    )
+    render_parser.add_argument("--cache-dir", help="Directory for compiled OMap caches")
+    render_parser.add_argument(
+        "--tile-rows", type=int, help="Render in horizontal tiles of this many pixel rows"
+    )
+    render_parser.add_argument("--workers", type=int, help="Render tiles in this many processes")
+    render_parser.add_argument(
+        "--lod", action="store_true", help="Simplify geometry to the pixel grid before drawing"
+    )
+    render_subparsers = render_parser.add_subparsers(
+        dest="render_command", help="Available render commands"
+    )
+
+    tiles_parser = render_subparsers.add_parser("tiles", help="Render an XYZ tile pyramid")
+    tiles_parser.add_argument("--in", dest="input_file", required=True, help="Input OMap file")
+    tiles_parser.add_argument(
+        "--out", dest="output_file", required=True, help="Output directory or .mbtiles file"
+    )
+    tiles_parser.add_argument("--zoom-min", type=int, default=0, help="Lowest zoom level")
+    tiles_parser.add_argument("--zoom-max", type=int, required=True, help="Highest zoom level")
+    tiles_parser.add_argument("--tile-size", type=int, default=256, help="Tile size in pixels")
+    tiles_parser.add_argument(
+        "--bbox", help="Pyramid extent as xmin,ymin,xmax,ymax (default: all objects)"
+    )
+    tiles_parser.add_argument(
+        "--parse-workers", type=int, help="Parse map parts in this many processes"
+    )
+    tiles_parser.add_argument("--cache-dir", help="Directory for compiled OMap caches")
+    tiles_parser.add_argument("--workers", type=int, help="Render tiles in this many processes")
 
     # Score command
     score_parser = subparsers.add_parser("score", help="Compute similarity score between images")
-    score_parser.add_argument("--ref", required=True, help="Reference PNG image")
-    score_parser.add_argument("--cand", required=True, help="Candidate PNG image")
-    score_parser.add_argument("--metric", default="ssim", choices=["ssim"], help="Similarity metric")
-    score_parser.add_argument("--out", required=True, help="Output JSON score file")
+    score_parser.add_argument("--ref", help="Reference PNG image")
+    score_parser.add_argument("--cand", help="Candidate PNG image")
+    score_parser.add_argument(
+        "--batch", help='JSONL manifest of {"ref", "cand"} pairs to score instead of --ref/--cand'
+    )
+    score_parser.add_argument(
+        "--metric",
+        default="ssim",
+        choices=_LazyChoices(_metric_names),
+        metavar="METRIC",
+        help="Similarity metric: %(choices)s",
+    )
+    score_parser.add_argument(
+        "--out",
+        required=True,
+        help="Output JSON score file (JSONL if it ends in .jsonl in batch mode)",
+    )
     score_parser.add_argument("--threshold", type=float, help="Similarity threshold")
+    score_parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=1024,
+        help="Score large images in blocks of this size (0: whole images at once)",
+    )
+    score_parser.add_argument(
+        "--workers", type=int, help="Score blocks, or batch candidates, in this many threads"
+    )
 
     # Acceptance commands
     acceptance_parser = subparsers.add_parser("acceptance", help="Run acceptance tests")
-    acceptance_subparsers = acceptance_parser.add_subparsers(dest="acceptance_command", help="Available acceptance commands")
+    acceptance_subparsers = acceptance_parser.add_subparsers(
+        dest="acceptance_command", help="Available acceptance commands"
+    )
 
     run_parser = acceptance_subparsers.add_parser("run", help="Run acceptance for a single AOI")
     run_parser.add_argument("--aoi", required=True, help="AOI name (folder name in tests/golden)")
-    run_parser.add_argument("--artifacts", default="artifacts/acceptance", help="Directory for artifacts")
+    run_parser.add_argument(
+        "--artifacts", default="artifacts/acceptance", help="Directory for artifacts"
+    )
+    run_parser.add_argument(
+        "--streaming", action="store_true", help="Stream the OMap file instead of loading it fully"
+    )
+    run_parser.add_argument("--omap-cache-dir", help="Directory for compiled OMap caches")
+    run_parser.add_argument(
+        "--force", action="store_true", help="Re-run even if the previous result is up to date"
+    )
+    run_parser.add_argument(
+        "--no-images", action="store_true", help="Do not write the candidate and diff PNGs"
+    )
 
     run_all_parser = acceptance_subparsers.add_parser("run-all", help="Run acceptance for all AOIs")
-    run_all_parser.add_argument("--golden-dir", default="tests/golden", help="Directory containing golden AOIs")
-    run_all_parser.add_argument("--artifacts", default="artifacts/acceptance", help="Directory for artifacts")
+    run_all_parser.add_argument(
+        "--golden-dir", default="tests/golden", help="Directory containing golden AOIs"
+    )
+    run_all_parser.add_argument(
+        "--artifacts", default="artifacts/acceptance", help="Directory for artifacts"
+    )
+    run_all_parser.add_argument(
+        "--streaming", action="store_true", help="Stream the OMap file instead of loading it fully"
+    )
+    run_all_parser.add_argument("--omap-cache-dir", help="Directory for compiled OMap caches")
+    run_all_parser.add_argument("--jobs", type=int, help="Run AOIs in this many processes")
+    run_all_parser.add_argument(
+        "--force", action="store_true", help="Re-run AOIs whose previous result is up to date"
+    )
+    run_all_parser.add_argument(
+        "--no-images", action="store_true", help="Do not write the candidate and diff PNGs"
+    )
 
     # Raster commands
-    from mapgen.raster import register_raster_commands
+    from mapgen.raster.cli import register_raster_commands
+
     register_raster_commands(subparsers)
 
-    # Placeholder for future commands
-    subparsers.add_parser("generate", help="Generate a map (placeholder)")
+    # Generate command
+    generate_parser = subparsers.add_parser(
+        "generate", help="Generate a map from processed raster masks"
+    )
+    generate_parser.add_argument("--aoi", required=True, help="AOI name")
+    generate_parser.add_argument(
+        "--cache-dir", default="cache/raster", help="Directory of the raster pipeline artifacts"
+    )
+    generate_parser.add_argument(
+        "--out", dest="output_file", required=True, help="Output OMap file"
+    )
+    generate_parser.add_argument(
+        "--bbox",
+        help="Extent of the raster in map units as xmin,ymin,xmax,ymax "
+        "(default: one unit per pixel)",
+    )
+    generate_parser.add_argument(
+        "--objects", default="both", choices=["areas", "lines", "both"], help="Objects to generate"
+    )
+    generate_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.0,
+        help="Simplify outlines to this many pixels (0: keep pixel edges)",
+    )
+    generate_parser.add_argument(
+        "--block-size", type=int, default=1024, help="Trace the masks in tiles of this size"
+    )
+    generate_parser.add_argument("--workers", type=int, help="Trace tiles in this many processes")
+
+    # Serve command
+    serve_parser = subparsers.add_parser(
+        "serve", help="Answer render, score and acceptance requests in one process"
+    )
+    serve_parser.add_argument(
+        "--socket", help="Listen on this Unix socket instead of reading JSONL requests from stdin"
+    )
+    serve_parser.add_argument(
+        "--jobs", type=int, help="Run this many requests at once (default: number of CPUs)"
+    )
+    serve_parser.add_argument(
+        "--cache-mb",
+        type=int,
+        help="Memory budget of the document and image cache in MB (default: 1024)",
+    )
+    serve_parser.add_argument("--omap-cache-dir", help="Directory for compiled OMap caches")
+
+    # Bench command
+    bench_parser = subparsers.add_parser("bench", help="Time the hot paths on synthetic maps")
+    bench_parser.add_argument(
+        "--vertices",
+        default="10000,100000",
+        help="Comma-separated sizes of the synthetic maps, in vertices",
+    )
+    bench_parser.add_argument(
+        "--parts", type=int, default=8, help="Map parts of the synthetic maps"
+    )
+    bench_parser.add_argument(
+        "--curves", type=float, default=0.25, help="Fraction of objects made of Bezier curves"
+    )
+    bench_parser.add_argument(
+        "--size", default="1024,1024", help="Size of renders and scored images as width,height"
+    )
+    bench_parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs of every benchmark; the best counts"
+    )
+    bench_parser.add_argument("--only", help="Comma-separated benchmarks to run (default: all)")
+    bench_parser.add_argument(
+        "--work-dir", default="artifacts/bench", help="Directory for the synthetic maps and outputs"
+    )
+    bench_parser.add_argument(
+        "--out", default="artifacts/bench/results.json", help="Output JSON results file"
+    )
+    bench_parser.add_argument(
+        "--baseline", help="Results file of an earlier run to compare against"
+    )
+    bench_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Slowdown against the baseline flagged as a regression",
+    )
 
     args = parser.parse_args(argv)
 
@@ -71,26 +273,101 @@ def main(argv: Sequence[str] | None = None) -> int:
     if args.command == "omap":
         if args.omap_command == "roundtrip":
             from mapgen.omap import load_omap, save_omap
+
             doc = load_omap(args.input_file)
             save_omap(doc, args.output_file)
-            
+
             # Print summary
-            symbol_count = len(doc.root.findall(".//{http://openorienteering.org/apps/mapper/xml/v2}symbol"))
+            symbol_count = len(
+                doc.root.findall(".//{http://openorienteering.org/apps/mapper/xml/v2}symbol")
+            )
             print(f"Round-tripped OMap: {args.input_file} -> {args.output_file}")
             print(f"Version: {doc.version}")
             print(f"Symbols found: {symbol_count}")
             return 0
+        elif args.omap_command == "compile":
+            from mapgen.omap import load_omap
+            from mapgen.omap.cache import cache_path, write_cache
+
+            doc = load_omap(args.input_file)
+            cache_file = cache_path(args.input_file, args.cache_dir)
+            write_cache(doc, args.input_file, cache_file)
+            print(f"Compiled OMap: {args.input_file} -> {cache_file}")
+            print(f"Objects: {len(doc.get_object_store())}")
+            return 0
         else:
             omap_parser.print_help()
             return 0
+    elif args.command == "render" and args.render_command == "tiles":
+        from mapgen.omap import load_omap
+        from mapgen.render.pyramid import render_pyramid
+
+        extent = None
+        if args.bbox:
+            try:
+                bbox_parts = args.bbox.split(",")
+                if len(bbox_parts) != 4:
+                    raise ValueError("bbox must have 4 components")
+                xmin, ymin, xmax, ymax = map(float, bbox_parts)
+                extent = (xmin, ymin, xmax, ymax)
+            except ValueError as e:
+                print(f"Error: Invalid bbox format: {e}")
+                return 1
+
+        doc = load_omap(
+            args.input_file,
+            workers=args.parse_workers,
+            cache_dir=args.cache_dir,
+            write_cache=args.cache_dir is not None,
+        )
+        counts = render_pyramid(
+            doc,
+            args.output_file,
+            args.zoom_min,
+            args.zoom_max,
+            tile_size=args.tile_size,
+            extent=extent,
+            workers=args.workers,
+        )
+        print(f"Rendered tiles of {args.input_file} to {args.output_file}")
+        for z, count in counts.items():
+            print(f"Zoom {z}: {count} tiles")
+        return 0
+
     elif args.command == "render":
         from mapgen.render.renderer import render_omap_to_png
+
+        missing = [
+            flag
+            for flag, value in (
+                ("--in", args.input_file),
+                ("--out", args.output_file),
+                ("--bbox", args.bbox),
+                ("--size", args.size),
+            )
+            if value is None
+        ]
+        if missing:
+            render_parser.error(f"the following arguments are required: {', '.join(missing)}")
+        if args.streaming:
+            unused = [
+                flag
+                for flag, value in (
+                    ("--parse-workers", args.parse_workers),
+                    ("--cache-dir", args.cache_dir),
+                    ("--tile-rows", args.tile_rows),
+                    ("--workers", args.workers),
+                )
+                if value is not None
+            ]
+            if unused:
+                render_parser.error(f"--streaming cannot be combined with {', '.join(unused)}")
         try:
             bbox_parts = args.bbox.split(",")
             if len(bbox_parts) != 4:
                 raise ValueError("bbox must have 4 components")
             bbox = tuple(map(float, bbox_parts))
-            
+
             size_parts = args.size.split(",")
             if len(size_parts) != 2:
                 raise ValueError("size must have 2 components")
@@ -98,38 +375,62 @@ def main(argv: Sequence[str] | None = None) -> int:
         except ValueError as e:
             print(f"Error: Invalid bbox or size format: {e}")
             return 1
-            
-        render_omap_to_png(args.input_file, args.output_file, (bbox[0], bbox[1], bbox[2], bbox[3]), (size[0], size[1]))
+
+        render_omap_to_png(
+            args.input_file,
+            args.output_file,
+            (bbox[0], bbox[1], bbox[2], bbox[3]),
+            (size[0], size[1]),
+            streaming=args.streaming,
+            parse_workers=args.parse_workers,
+            cache_dir=args.cache_dir,
+            tile_rows=args.tile_rows,
+            workers=args.workers,
+            lod=args.lod,
+        )
         print(f"Rendered {args.input_file} to {args.output_file}")
         return 0
 
     elif args.command == "score":
         import json
-        from mapgen.metrics.similarity import compute_ssim
-        
+
+        from mapgen.metrics import compute_metric
+
+        if args.batch:
+            if args.ref or args.cand:
+                score_parser.error("--batch cannot be combined with --ref/--cand")
+            return _score_batch(args)
+        missing = [
+            flag for flag, value in (("--ref", args.ref), ("--cand", args.cand)) if value is None
+        ]
+        if missing:
+            score_parser.error(f"the following arguments are required: {', '.join(missing)}")
+
         try:
-            if args.metric == "ssim":
-                score = compute_ssim(args.ref, args.cand)
-            else:
-                print(f"Error: Unknown metric {args.metric}")
-                return 1
-            
+            score = compute_metric(
+                args.metric,
+                args.ref,
+                args.cand,
+                tile_size=args.tile_size or None,
+                workers=args.workers,
+            )
+
             result = {
                 "metric": args.metric,
                 "score": score,
                 "reference": args.ref,
                 "candidate": args.cand,
             }
-            
+
             if args.threshold is not None:
                 result["threshold"] = args.threshold
                 result["pass"] = score >= args.threshold
-            
+
             with open(args.out, "w") as f:
                 json.dump(result, f, indent=2)
-            
+
             print(f"Score ({args.metric}): {score:.6f}")
-            
+
             if args.threshold is not None:
                 if score >= args.threshold:
                     print("Status: PASS")
@@ -137,7 +438,7 @@ def main(argv: Sequence[str] | None = None) -> int:
                 else:
                     print(f"Status: FAIL (threshold: {args.threshold})")
                     return 2
-            
+
             return 0
         except FileNotFoundError as e:
             print(f"Error: File not found: {e}")
@@ -148,22 +449,42 @@ def main(argv: Sequence[str] | None = None) -> int:
 
     elif args.command == "acceptance":
         from pathlib import Path
-        from mapgen.acceptance.run import run_aoi, run_all
-        
+
+        from mapgen.acceptance.run import run_all, run_aoi
+
         golden_root = Path("tests/golden")
         artifacts_root = Path(args.artifacts)
-        
+        omap_cache_dir = Path(args.omap_cache_dir) if args.omap_cache_dir else None
+        if omap_cache_dir is not None and args.streaming:
+            parser = run_parser if args.acceptance_command == "run" else run_all_parser
+            parser.error("--streaming cannot be combined with --omap-cache-dir")
+
         if args.acceptance_command == "run":
             aoi_dir = golden_root / args.aoi
             if not aoi_dir.exists():
                 print(f"Error: AOI directory {aoi_dir} does not exist.")
                 return 1
-            
-            result = run_aoi(aoi_dir, artifacts_root / args.aoi)
+
+            result = run_aoi(
+                aoi_dir,
+                artifacts_root / args.aoi,
+                streaming=args.streaming,
+                omap_cache_dir=omap_cache_dir,
+                force=args.force,
+                write_images=not args.no_images,
+            )
             return 0 if result["pass"] else 2
-            
+
         elif args.acceptance_command == "run-all":
-            results = run_all(Path(args.golden_dir), artifacts_root)
+            results = run_all(
+                Path(args.golden_dir),
+                artifacts_root,
+                streaming=args.streaming,
+                omap_cache_dir=omap_cache_dir,
+                jobs=args.jobs,
+                force=args.force,
+                write_images=not args.no_images,
+            )
             all_passed = all(r["pass"] for r in results)
             return 0 if all_passed else 2
         else:
@@ -171,11 +492,175 @@ def main(argv: Sequence[str] | None = None) -> int:
             return 0
 
     elif args.command == "raster":
-        from mapgen.raster import handle_raster_command
+        from mapgen.raster.cli import handle_raster_command
+
         return handle_raster_command(args)
 
+    elif args.command == "generate":
+        return _generate(args)
+
+    elif args.command == "serve":
+        return _serve(args)
+
+    elif args.command == "bench":
+        return _bench(args)
+
     return 0
 
 
+def _score_batch(args: argparse.Namespace) -> int:
+    """Runs `mapgen score --batch`."""
+    from mapgen.metrics.batch import read_manifest, score_batch, write_results
+
+    try:
+        pairs = read_manifest(args.batch)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    results = score_batch(
+        pairs,
+        metric=args.metric,
+        tile_size=args.tile_size or None,
+        workers=args.workers,
+        threshold=args.threshold,
+    )
+    write_results(results, args.out, args.metric)
+
+    errors = [r for r in results if "error" in r]
+    failed = [r for r in results if r.get("pass") is False]
+    print(f"Scored {len(results) - len(errors)} of {len(results)} pairs ({args.metric})")
+    for r in errors:
+        print(f"Error: {r['candidate']}: {r['error']}")
+    for r in failed:
+        print(f"FAIL: {r['candidate']}: {r['score']:.6f} (threshold: {args.threshold})")
+    if errors:
+        return 1
+    return 2 if failed else 0
+
+
+def _generate(args: argparse.Namespace) -> int:
+    """Runs `mapgen generate`."""
+    from collections import Counter
+    from pathlib import Path
+
+    from mapgen.omap import save_omap
+    from mapgen.omap.model import Object
+    from mapgen.raster.pipeline import MORPHOLOGY_FILE
+    from mapgen.raster.vectorize import vectorize_stream
+
+    mask_path = Path(args.cache_dir) / args.aoi / MORPHOLOGY_FILE
+    if not mask_path.exists():
+        print(
+            f"Error: No {MORPHOLOGY_FILE} in {mask_path.parent}; run `mapgen raster process` first"
+        )
+        return 1
+    bbox = None
+    if args.bbox:
+        try:
+            xmin, ymin, xmax, ymax = map(float, args.bbox.split(","))
+        except ValueError as e:
+            print(f"Error: Invalid bbox format: {e}")
+            return 1
+        bbox = (xmin, ymin, xmax, ymax)
+
+    doc, objects = vectorize_stream(
+        str(mask_path), bbox, args.objects, args.tolerance, args.block_size, args.workers
+    )
+    # Objects go to the file as they are built; only their types are counted
+    types: Counter[int] = Counter()
+
+    def counted() -> Iterator[Object]:
+        for obj in objects:
+            types[obj.type] += 1
+            yield obj
+
+    save_omap(doc, args.output_file, counted())
+    print(
+        f"Generated {sum(types.values())} objects ({types[3]} areas, {types[2]} lines)"
+        f" -> {args.output_file}"
+    )
+    return 0
+
+
+def _serve(args: argparse.Namespace) -> int:
+    """Runs `mapgen serve`."""
+    from mapgen.serve import DEFAULT_CACHE_MB, Worker, serve_socket, serve_stream
+
+    cache_mb = args.cache_mb if args.cache_mb is not None else DEFAULT_CACHE_MB
+    worker = Worker(cache_mb << 20, args.jobs, args.omap_cache_dir)
+    try:
+        if args.socket:
+            serve_socket(worker, args.socket)
+        else:
+            # Responses are the only output on stdout
+            serve_stream(worker, sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
+    return 0
+
+
+def _bench(args: argparse.Namespace) -> int:
+    """Runs `mapgen bench`."""
+    from mapgen.bench import (
+        BENCHMARKS,
+        BenchResult,
+        Comparison,
+        compare,
+        print_result,
+        read_results,
+        run_benchmarks,
+        write_results,
+    )
+
+    try:
+        vertices = [int(v) for v in args.vertices.split(",")]
+        width, height = map(int, args.size.split(","))
+    except ValueError as e:
+        print(f"Error: Invalid vertices or size format: {e}")
+        return 1
+    baseline = []
+    if args.baseline:
+        try:
+            baseline = read_results(args.baseline)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: Cannot read baseline: {e}")
+            return 1
+    names = args.only.split(",") if args.only else BENCHMARKS
+    comparisons: list[Comparison] = []
+
+    def report(result: BenchResult) -> None:
+        match = compare([result], baseline)
+        comparisons.extend(match)
+        print_result(result, match[0] if match else None, args.tolerance)
+
+    try:
+        results = run_benchmarks(
+            args.work_dir,
+            vertices,
+            names,
+            args.parts,
+            args.curves,
+            (width, height),
+            args.repeat,
+            report,
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    write_results(results, args.out)
+    print(f"Wrote {args.out}")
+
+    regressions = [c for c in comparisons if c.regressed(args.tolerance)]
+    if args.baseline:
+        print(
+            f"Compared {len(comparisons)} benchmarks with {args.baseline}: "
+            f"{len(regressions)} regressions"
+        )
+    return 2 if regressions else 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,20 @@
+"""Loading of the renders, goldens and scans that mapgen reads."""
+
+import numpy as np
+from PIL import Image
+
+# Renders of large AOIs and raster scans exceed PIL's default decompression bomb
+# limit. Images up to 20,000 x 20,000 pixels load silently; PIL refuses images
+# of more than twice that.
+MAX_IMAGE_PIXELS = 20_000 * 20_000
+
+# Raised once for the process rather than lifted around every open: the limit is
+# a module global of PIL, and threads loading images at once would race on it
+if Image.MAX_IMAGE_PIXELS is not None and Image.MAX_IMAGE_PIXELS < MAX_IMAGE_PIXELS:
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+def load_image(path: str, mode: str = "L") -> np.ndarray:
+    """Loads an image as an array in a PIL mode, e.g. "L" or "RGB"."""
+    with Image.open(path) as img:
+        return np.array(img.convert(mode))
@@ -0,0 +1,91 @@
+"""Image similarity metrics.
+
+Metrics are registered by name with register_metric; ``mapgen score --metric``
+offers every registered metric. A metric is a function of two images of equal
+shape, decoded in the metric's PIL mode, plus the ``tile_size`` and
+``workers`` options of the score command. Higher scores mean more similar.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import numpy as np
+
+from mapgen.images import load_image
+from mapgen.metrics.fast import color_iou, psnr
+from mapgen.metrics.similarity import DEFAULT_SSIM_TILE_SIZE, compute_ssim, ms_ssim, ssim_gray
+
+MetricFunction = Callable[[np.ndarray, np.ndarray, int | None, int | None], float]
+
+
+@dataclass
+class Metric:
+    name: str
+    mode: str  # PIL mode the images are decoded in
+    function: MetricFunction
+    description: str = ""
+
+
+METRICS: dict[str, Metric] = {}
+
+
+def register_metric(name: str, mode: str, function: MetricFunction, description: str = "") -> None:
+    """Registers a metric under a name, replacing any metric of that name."""
+    METRICS[name] = Metric(name, mode, function, description)
+
+
+def get_metric(name: str) -> Metric:
+    """Returns a registered metric by name."""
+    try:
+        return METRICS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown metric {name!r}, expected one of {', '.join(metric_names())}"
+        ) from None
+
+
+def metric_names() -> list[str]:
+    """Names of the registered metrics, in registration order."""
+    return list(METRICS)
+
+
+def compute_metric(
+    name: str,
+    ref_path: str,
+    cand_path: str,
+    tile_size: int | None = DEFAULT_SSIM_TILE_SIZE,
+    workers: int | None = None,
+    load_reference: Callable[[str, str], np.ndarray] = load_image,
+) -> float:
+    """
+    Scores a candidate image against a reference with a registered metric.
+
+    ``load_reference`` decodes the reference in a PIL mode, like load_image;
+    a long-lived process can pass a cache of decoded references.
+
+    Raises:
+        FileNotFoundError: If one of the images is not found.
+        ValueError: If the metric is unknown or the images differ in size.
+    """
+    metric = get_metric(name)
+    ref = load_reference(ref_path, metric.mode)
+    cand = load_image(cand_path, metric.mode)
+    if ref.shape != cand.shape:
+        raise ValueError(f"Image dimensions do not match: {ref.shape} vs {cand.shape}")
+    return float(metric.function(ref, cand, tile_size, workers))
+
+
+register_metric("ssim", "L", ssim_gray, "Structural similarity of the grayscale images")
+register_metric("ms_ssim", "L", ms_ssim, "Multi-scale SSIM over a 2x pyramid")
+register_metric("psnr", "RGB", psnr, "Peak signal-to-noise ratio in dB")
+register_metric("color_iou", "RGB", color_iou, "Mean IoU of quantized color classes")
+
+__all__ = [
+    "METRICS",
+    "Metric",
+    "compute_metric",
+    "compute_ssim",
+    "get_metric",
+    "metric_names",
+    "register_metric",
+]
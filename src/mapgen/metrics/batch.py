@@ -0,0 +1,144 @@
+"""Scoring many candidate images against shared references."""
+
+import json
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from mapgen.images import load_image
+from mapgen.metrics import get_metric
+from mapgen.metrics.similarity import DEFAULT_SSIM_TILE_SIZE, ReferenceStats
+
+
+def read_manifest(path: str | Path) -> list[dict[str, Any]]:
+    """
+    Reads a batch manifest.
+
+    A manifest is a JSON Lines file with one ``{"ref": ..., "cand": ...}`` pair
+    per line. Blank lines are skipped; other keys are passed through to the
+    results, e.g. an ``"id"`` to identify the pair.
+
+    Raises:
+        ValueError: If a line is not a JSON object with "ref" and "cand".
+    """
+    pairs = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                pair = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: invalid JSON: {e}") from e
+            if not isinstance(pair, dict) or "ref" not in pair or "cand" not in pair:
+                raise ValueError(f'{path}:{number}: expected an object with "ref" and "cand"')
+            pairs.append(pair)
+    return pairs
+
+
+def score_batch(
+    pairs: list[dict[str, Any]],
+    metric: str = "ssim",
+    tile_size: int | None = DEFAULT_SSIM_TILE_SIZE,
+    workers: int | None = None,
+    threshold: float | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Scores every candidate against its reference with a registered metric.
+
+    Each reference is decoded once; for SSIM its window statistics are also
+    computed once (see ReferenceStats). References are processed one after the
+    other, so only one is held in memory. Scores match compute_metric up to
+    float rounding.
+
+    Args:
+        pairs: Manifest entries with "ref" and "cand" image paths.
+        metric: Name of a registered metric.
+        tile_size: Block size passed to the metric; None processes whole images.
+        workers: Score the candidates of a reference in a thread pool of this size.
+        threshold: Optional pass threshold for every pair.
+
+    Returns:
+        One result per pair, in manifest order. A pair that cannot be scored
+        gets an "error" message instead of a score.
+    """
+    scorer = get_metric(metric)
+    results: list[dict[str, Any]] = []
+    by_ref: dict[str, list[int]] = {}
+    for i, pair in enumerate(pairs):
+        result = dict(pair)
+        result.update(metric=metric, reference=str(pair["ref"]), candidate=str(pair["cand"]))
+        del result["ref"], result["cand"]
+        results.append(result)
+        by_ref.setdefault(str(pair["ref"]), []).append(i)
+
+    pool = ThreadPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    try:
+        for ref_path, indices in by_ref.items():
+            try:
+                ref = load_image(ref_path, scorer.mode)
+                stats = ReferenceStats(ref, tile_size) if metric == "ssim" else None
+            except Exception as e:
+                for i in indices:
+                    results[i]["error"] = _error_message(e)
+                continue
+
+            # The loop variables are bound now; the pool calls score later
+            def score(i: int, ref: np.ndarray = ref, stats: ReferenceStats | None = stats) -> None:
+                try:
+                    cand = load_image(results[i]["candidate"], scorer.mode)
+                    results[i]["score"] = _score(scorer.function, ref, stats, cand, tile_size)
+                except Exception as e:
+                    results[i]["error"] = _error_message(e)
+
+            if pool is None:
+                for i in indices:
+                    score(i)
+            else:
+                list(pool.map(score, indices))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if threshold is not None:
+        for result in results:
+            if "score" in result:
+                result["threshold"] = threshold
+                result["pass"] = result["score"] >= threshold
+    return results
+
+
+def write_results(results: list[dict[str, Any]], path: str | Path, metric: str = "ssim") -> None:
+    """
+    Writes batch results as JSON Lines if ``path`` ends in .jsonl, otherwise as
+    one JSON document with a "results" list.
+    """
+    with open(path, "w") as f:
+        if str(path).endswith(".jsonl"):
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        else:
+            json.dump({"metric": metric, "results": results}, f, indent=2)
+
+
+def _score(
+    function: Callable[..., float],
+    ref: np.ndarray,
+    stats: ReferenceStats | None,
+    cand: np.ndarray,
+    tile_size: int | None,
+) -> float:
+    if stats is not None:
+        return stats.score(cand)
+    if ref.shape != cand.shape:
+        raise ValueError(f"Image dimensions do not match: {ref.shape} vs {cand.shape}")
+    return float(function(ref, cand, tile_size, None))
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, FileNotFoundError):
+        return f"File not found: {error}"
+    return str(error)
@@ -1,4 +1,4 @@
-from .io import load_omap, save_omap
+from .io import iter_omap, load_omap, save_omap
 from .model import OMapDocument
 
-__all__ = ["load_omap", "save_omap", "OMapDocument"]
+__all__ = ["iter_omap", "load_omap", "save_omap", "OMapDocument"]
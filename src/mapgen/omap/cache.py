@@ -0,0 +1,198 @@
+"""Compiled binary cache for parsed .omap documents.
+
+A cache file holds everything the renderer needs from an .omap file: colors,
+symbols, part names and the ObjectStore buffers. Its layout is::
+
+    MAGIC (8 bytes) | header length (uint64 LE) | JSON header | arrays
+
+Every array starts on a 64-byte boundary, so the buffers are memory-mapped
+directly instead of being read or copied. The header records the size, mtime and
+SHA-256 of the source file; a cache is only used while it matches the source.
+"""
+
+import dataclasses
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .model import Color, ObjectStore, OMapDocument, Symbol
+
+MAGIC = b"MGOMAPC1"
+FORMAT_VERSION = 1
+CACHE_SUFFIX = ".cache"
+_ALIGN = 64
+_ARRAYS = ("vertices", "flags", "offsets", "symbol_ids", "types", "part_ids")
+
+
+def cache_path(omap_path: str | Path, cache_dir: str | Path | None = None) -> Path:
+    """
+    Returns where the cache of an .omap file lives.
+
+    Args:
+        omap_path: Path to the .omap file.
+        cache_dir: Directory for cache files. Defaults to a sidecar file next to the
+            .omap file (``map.omap`` -> ``map.omap.cache``).
+
+    Returns:
+        Path of the cache file.
+    """
+    omap_path = Path(omap_path)
+    if cache_dir is None:
+        return omap_path.with_name(omap_path.name + CACHE_SUFFIX)
+    # Files with the same name in different directories must not collide
+    location = hashlib.sha256(str(omap_path.resolve()).encode("utf-8")).hexdigest()[:16]
+    return Path(cache_dir) / f"{omap_path.name}-{location}{CACHE_SUFFIX}"
+
+
+def file_sha256(path: str | Path) -> str:
+    """Computes the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _align(n: int) -> int:
+    return -(-n // _ALIGN) * _ALIGN
+
+
+def _source_key(omap_path: Path) -> dict[str, Any]:
+    stat = omap_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(omap_path)}
+
+
+def write_cache(doc: OMapDocument, omap_path: str | Path, cache_file: str | Path) -> None:
+    """
+    Compiles a parsed document into a cache file.
+
+    Args:
+        doc: Document parsed from ``omap_path``.
+        omap_path: Source .omap file, used to key the cache.
+        cache_file: Path of the cache file to write.
+    """
+    omap_path = Path(omap_path)
+    cache_file = Path(cache_file)
+    store = doc.get_object_store()
+
+    arrays: dict[str, np.ndarray] = {
+        name: np.ascontiguousarray(getattr(store, name)) for name in _ARRAYS
+    }
+    header: dict[str, Any] = {
+        "format": FORMAT_VERSION,
+        "source": _source_key(omap_path),
+        "version": doc.version,
+        "colors": [dataclasses.asdict(c) for c in doc.get_colors().values()],
+        "symbols": [dataclasses.asdict(s) for s in doc.get_symbols().values()],
+        "part_names": doc.get_part_names(),
+        "arrays": {},
+    }
+
+    # Arrays are laid out relative to the first aligned offset after the header
+    size = 0
+    for name, arr in arrays.items():
+        header["arrays"][name] = {"offset": size, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        size += _align(arr.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(cache_file.name + f".{os.getpid()}.tmp")
+    with open(tmp_file, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(arr.tobytes())
+        f.truncate(data_start + size)
+    tmp_file.replace(cache_file)
+
+
+def read_cache(omap_path: str | Path, cache_file: str | Path) -> OMapDocument | None:
+    """
+    Loads a document from its cache file if the cache matches the source.
+
+    The size and mtime of the source are compared first; only when they differ is
+    the content hash computed, so touching a file does not invalidate its cache.
+    The new mtime is then recorded, so later loads skip the hash again.
+
+    Args:
+        omap_path: Source .omap file.
+        cache_file: Path of the cache file.
+
+    Returns:
+        An OMapDocument backed by memory-mapped arrays, or None if there is no
+        valid cache.
+    """
+    omap_path = Path(omap_path)
+    cache_file = Path(cache_file)
+    if not cache_file.exists():
+        return None
+
+    with open(cache_file, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+        if header.get("format") != FORMAT_VERSION:
+            return None
+
+        source = header["source"]
+        stat = omap_path.stat()
+        if stat.st_size != source["size"]:
+            return None
+        if stat.st_mtime_ns != source["mtime_ns"]:
+            if file_sha256(omap_path) != source["sha256"]:
+                return None
+            source["mtime_ns"] = stat.st_mtime_ns
+            _rewrite_header(cache_file, header, header_len)
+
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data_start = _align(len(MAGIC) + 8 + header_len)
+
+    arrays = {}
+    for name in _ARRAYS:
+        spec = header["arrays"][name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        offset = data_start + spec["offset"]
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(
+            spec["shape"]
+        )
+
+    colors = {}
+    for c in header["colors"]:
+        colors[c["priority"]] = Color(c["priority"], c["name"], tuple(c["rgb"]))
+    symbols = {s["id"]: Symbol(**s) for s in header["symbols"]}
+    store = ObjectStore(**arrays)
+    return OMapDocument.from_parsed(
+        omap_path, header["version"], colors, symbols, header["part_names"], store
+    )
+
+
+def _rewrite_header(cache_file: Path, header: dict[str, Any], header_len: int) -> None:
+    """
+    Rewrites the header of a cache file in place.
+
+    The header is padded with spaces to its old length, so the arrays stay
+    where they are. A header that grew, or a cache that cannot be written, is
+    left as it is; the cache stays valid either way.
+    """
+    header_bytes = json.dumps(header).encode("utf-8")
+    if len(header_bytes) > header_len:
+        return
+    try:
+        fd = os.open(cache_file, os.O_WRONLY)
+    except OSError:
+        return
+    try:
+        os.pwrite(fd, header_bytes.ljust(header_len), len(MAGIC) + 8)
+    finally:
+        os.close(fd)
@@ -0,0 +1,68 @@
+"""Vectorized parsing of OMap ``<coords>`` text."""
+
+from collections.abc import Sequence
+
+import numpy as np
+
+_SEMICOLON = ord(";")
+_SPACE = ord(" ")
+
+
+def parse_coords(texts: Sequence[str | None]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parses the ``<coords>`` text of many objects in one vectorized pass.
+
+    Each text looks like ``"x1 y1;x2 y2 flags;..."``. The optional third number of a
+    vertex carries the OMap coordinate flags (curve start, close point, hole point, ...).
+    Empty vertices and vertices with fewer than two numbers are skipped.
+
+    Args:
+        texts: One coords text per object; None or empty for objects without coords.
+
+    Returns:
+        A tuple (vertices, flags, counts): an (N, 2) float64 array of vertices, an (N,)
+        uint8 array of per-vertex flags and an (M,) int64 array with the number of
+        vertices of each of the M objects.
+    """
+    m = len(texts)
+    chunks = []
+    seg_counts = np.zeros(m, dtype=np.int64)
+    for i, text in enumerate(texts):
+        text = (text or "").strip()
+        if text and not text.endswith(";"):
+            text += ";"
+        seg_counts[i] = text.count(";")
+        chunks.append(text)
+    joined = "".join(chunks)
+
+    if not joined:
+        return np.empty((0, 2), dtype=np.float64), np.empty(0, dtype=np.uint8), seg_counts
+
+    data = np.frombuffer(joined.encode("utf-8"), dtype=np.uint8)
+    is_sep = (data <= _SPACE) | (data == _SEMICOLON)
+    token_start = ~is_sep
+    token_start[1:] &= is_sep[:-1]
+
+    # Number of tokens in each ';'-terminated vertex segment and index of its first token
+    tokens_before = np.cumsum(token_start)
+    tokens_at_semi = tokens_before[data == _SEMICOLON]
+    seg_tokens = np.diff(tokens_at_semi, prepend=0)
+    seg_first = tokens_at_semi - seg_tokens
+
+    values = np.fromstring(joined.replace(";", " "), sep=" ")
+    if len(values) != int(tokens_before[-1]):
+        raise ValueError("Malformed coords: every vertex component must be a number")
+
+    keep = seg_tokens >= 2
+    first = seg_first[keep]
+    vertices = np.empty((len(first), 2), dtype=np.float64)
+    vertices[:, 0] = values[first]
+    vertices[:, 1] = values[first + 1]
+
+    has_flags = seg_tokens[keep] >= 3
+    flags = np.zeros(len(first), dtype=np.uint8)
+    flags[has_flags] = values[first[has_flags] + 2].astype(np.uint8)
+
+    seg_object = np.repeat(np.arange(m), seg_counts)
+    counts = np.bincount(seg_object[keep], minlength=m).astype(np.int64)
+    return vertices, flags, counts
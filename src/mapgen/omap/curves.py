@@ -0,0 +1,107 @@
+"""Flattening of the cubic Bezier curves in object coordinates.
+
+A vertex flagged COORD_CURVE_START begins a cubic Bezier segment: it and the next
+three vertices are the start point, two control points and the end point. The end
+point is an ordinary vertex again and may start the next curve.
+"""
+
+import math
+
+import numpy as np
+
+from .model import COORD_CURVE_START, ObjectStore
+
+# Maximum distance between a curve and its polyline, in output pixels
+FLATTEN_TOLERANCE_PX = 0.25
+
+
+def curve_level(tolerance: float) -> int:
+    """
+    Quantizes a tolerance or pixel size to a power-of-two level.
+
+    Renders whose pixel sizes are within a factor of two share a level, so each
+    zoom of a tile pyramid prepares its geometry exactly once.
+    """
+    return math.floor(math.log2(tolerance))
+
+
+def flatten_curves(
+    vertices: np.ndarray, flags: np.ndarray, offsets: np.ndarray, tolerance: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Replaces the Bezier segments of many objects by polylines, all segments at once.
+
+    A segment is split into ``n = ceil(sqrt(0.75 * M / tolerance))`` pieces, where M
+    is the larger norm of its two second differences; that bounds the distance
+    between the curve and the polyline by ``tolerance``.
+
+    Args:
+        vertices: (N, 2) vertices in map units.
+        flags: (N,) OMap vertex flags.
+        offsets: (M + 1,) object vertex offsets.
+        tolerance: Maximum deviation in map units.
+
+    Returns:
+        A tuple (vertices, flags, offsets) of the flattened objects, without curve
+        flags. The inputs are returned unchanged if there are no curves.
+    """
+    n = len(vertices)
+    is_curve = (flags & COORD_CURVE_START) != 0
+    if not is_curve.any():
+        return vertices, flags, offsets
+
+    # A curve needs its control points and end point within the same object
+    index = np.arange(n, dtype=np.int64)
+    object_end = np.repeat(offsets[1:], np.diff(offsets))
+    is_curve &= index + 3 < object_end
+    # Control points never start a curve themselves
+    control = np.zeros(n, dtype=bool)
+    control[np.flatnonzero(is_curve) + 1] = True
+    control[np.flatnonzero(is_curve) + 2] = True
+    is_curve &= ~control
+    starts = np.flatnonzero(is_curve)
+
+    p0, p1, p2, p3 = (vertices[starts + k] for k in range(4))
+    m = np.maximum(
+        np.linalg.norm(p0 - 2 * p1 + p2, axis=1), np.linalg.norm(p1 - 2 * p2 + p3, axis=1)
+    )
+    segments = np.maximum(1, np.ceil(np.sqrt(0.75 * m / tolerance))).astype(np.int64)
+
+    # Every vertex emits itself, a curve start emits its polyline up to (not
+    # including) the end point, and control points emit nothing
+    counts = np.ones(n, dtype=np.int64)
+    counts[starts] = segments
+    counts[starts + 1] = 0
+    counts[starts + 2] = 0
+    ends = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=ends[1:])
+    source = np.repeat(index, counts)
+    k = np.arange(ends[-1], dtype=np.int64) - np.repeat(ends[:-1], counts)
+
+    out_vertices = vertices[source]
+    out_flags = np.where(k == 0, flags[source] & ~np.uint8(COORD_CURVE_START), 0).astype(np.uint8)
+
+    inner = np.flatnonzero(k > 0)
+    s = source[inner]
+    t = (k[inner] / counts[s])[:, None]
+    mt = 1.0 - t
+    out_vertices[inner] = (
+        mt**3 * vertices[s]
+        + 3 * mt**2 * t * vertices[s + 1]
+        + 3 * mt * t**2 * vertices[s + 2]
+        + t**3 * vertices[s + 3]
+    )
+    return out_vertices, out_flags, ends[offsets]
+
+
+def flatten_store(store: ObjectStore, tolerance: float) -> ObjectStore:
+    """
+    Flattens the curves of every object in a store.
+
+    Object order and attributes are kept, so indices into ``store`` (e.g. from the
+    spatial index) remain valid. Returns ``store`` itself if it has no curves.
+    """
+    vertices, flags, offsets = flatten_curves(store.vertices, store.flags, store.offsets, tolerance)
+    if vertices is store.vertices:
+        return store
+    return ObjectStore(vertices, flags, offsets, store.symbol_ids, store.types, store.part_ids)
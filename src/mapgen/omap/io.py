@@ -1,41 +1,174 @@
 import xml.etree.ElementTree as ET
+from collections.abc import Iterable, Iterator
 from pathlib import Path
-from .model import OMapDocument
 
-# OpenOrienteering Mapper XML namespace
-OMAP_NAMESPACE = "http://openorienteering.org/apps/mapper/xml/v2"
+from .cache import cache_path, read_cache
+from .cache import write_cache as write_cache_file
+from .model import Color, Object, OMapDocument, Symbol, parse_color, parse_objects, parse_symbol
+from .parts import load_parts_parallel
+from .writer import OMAP_NAMESPACE, write_omap
 
 
-def load_omap(path: str | Path) -> OMapDocument:
+def load_omap(
+    path: str | Path,
+    workers: int | None = None,
+    cache_dir: str | Path | None = None,
+    write_cache: bool = False,
+) -> OMapDocument:
     """
     Loads an .omap file into an OMapDocument.
 
+    If a compiled cache of the file exists and still matches it, the document is
+    served from the cache instead: colors and symbols come from its header and the
+    coordinate buffers are memory-mapped. The XML is then only parsed if the
+    document's ``root`` is accessed.
+
     Args:
         path: Path to the .omap file.
+        workers: If set, parse the objects of the map parts right away in a
+            process pool of this size. The XML tree is then, as for a cached
+            document, only parsed if the document's ``root`` is accessed.
+        cache_dir: Directory holding compiled caches. Defaults to a sidecar file
+            next to the .omap file.
+        write_cache: Compile a cache after parsing when none was usable.
 
     Returns:
         An OMapDocument instance.
     """
-    tree = ET.parse(path)
-    return OMapDocument(tree.getroot())
+    cache_file = cache_path(path, cache_dir)
+    cached = read_cache(path, cache_file)
+    if cached is not None:
+        return cached
+
+    doc = None
+    if workers is not None and workers > 1:
+        doc = load_parts_parallel(path, workers)
+    if doc is None:
+        doc = OMapDocument(ET.parse(path).getroot(), Path(path))
+        if workers is not None:
+            doc.get_object_store(workers=workers)
+    if write_cache:
+        write_cache_file(doc, path, cache_file)
+    return doc
+
+
+def iter_omap(path: str | Path, batch_size: int = 4096) -> Iterator[Color | Symbol | Object]:
+    """
+    Streams Color, Symbol and Object records from an .omap file.
+
+    The file is read with ``iterparse`` and every element is released as soon as it
+    has been consumed, so peak memory does not grow with the number of objects.
+    Records are yielded in document order and cover the same elements as
+    OMapDocument.get_colors/get_symbols/get_objects.
+
+    Objects are parsed in batches of ``batch_size`` elements so their coordinates
+    can be decoded in one vectorized pass; each batch shares one ObjectStore and
+    never spans two map parts.
+
+    Args:
+        path: Path to the .omap file.
+        batch_size: Maximum number of <object> elements held before parsing.
+
+    Yields:
+        Color, Symbol and Object records.
+    """
+    ns = {"omap": OMAP_NAMESPACE}
+    map_tag, barrier_tag, colors_tag, symbols_tag, parts_tag, part_tag, objects_tag = (
+        f"{{{OMAP_NAMESPACE}}}{tag}"
+        for tag in ("map", "barrier", "colors", "symbols", "parts", "part", "objects")
+    )
+    colors_path = [map_tag, colors_tag]
+    symbols_paths = ([map_tag, symbols_tag], [map_tag, barrier_tag, symbols_tag])
+    parts_paths = ([map_tag, parts_tag], [map_tag, barrier_tag, parts_tag])
+    objects_paths = (
+        [map_tag],
+        [map_tag, parts_tag, part_tag, objects_tag],
+        [map_tag, barrier_tag, parts_tag, part_tag, objects_tag],
+    )
+    color_tag = f"{{{OMAP_NAMESPACE}}}color"
+    symbol_tag = f"{{{OMAP_NAMESPACE}}}symbol"
+    object_tag = f"{{{OMAP_NAMESPACE}}}object"
+
+    stack: list[ET.Element] = []
+    tags: list[str] = []
+    pending: list[ET.Element] = []
+    part_id = 0
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            tags.append(elem.tag)
+            continue
+
+        stack.pop()
+        tags.pop()
+        if not stack:
+            break
+        parent = stack[-1]
+
+        consumed = True
+        if elem.tag == object_tag and tags in objects_paths:
+            pending.append(elem)
+            parent.remove(elem)
+            if len(pending) >= batch_size:
+                yield from _flush_objects(pending, ns, part_id)
+            continue
+        elif elem.tag == part_tag and tags in parts_paths:
+            yield from _flush_objects(pending, ns, part_id)
+            part_id += 1
+        elif elem.tag == color_tag and tags == colors_path:
+            yield from _flush_objects(pending, ns, part_id)
+            color = parse_color(elem, ns)
+            if color is not None:
+                yield color
+        elif elem.tag == symbol_tag and tags in symbols_paths:
+            yield from _flush_objects(pending, ns, part_id)
+            yield parse_symbol(elem, ns)
+        else:
+            # Anything else is only dropped once its whole top-level section is done,
+            # so records nested inside it are still seen with their children intact.
+            consumed = len(stack) == 1
+
+        if consumed:
+            elem.clear()
+            parent.remove(elem)
+
+    yield from _flush_objects(pending, ns, part_id)
 
 
-def save_omap(doc: OMapDocument, path: str | Path) -> None:
+def _flush_objects(pending: list[ET.Element], ns: dict[str, str], part_id: int) -> Iterator[Object]:
+    """Parses the buffered <object> elements and empties the buffer."""
+    if not pending:
+        return
+    objects = parse_objects(pending, ns, part_id)
+    for elem in pending:
+        elem.clear()
+    pending.clear()
+    yield from objects
+
+
+def save_omap(
+    doc: OMapDocument, path: str | Path, objects: Iterable[ET.Element | Object] | None = None
+) -> None:
     """
     Writes an OMapDocument to disk.
 
+    The document is serialized element by element into a buffered file,
+    indented with one space per level; the tree is not modified.
+
     Args:
         doc: The OMapDocument instance.
         path: Path where to save the .omap file.
+        objects: Further objects to write after those of the first map part, or
+            after the root's objects in a document without parts: <object>
+            elements or Object records such as iter_omap yields. They can come
+            from a generator and are written as they are produced.
     """
-    ET.register_namespace("", OMAP_NAMESPACE)
-    tree = ET.ElementTree(doc.root)
-
-    # Note: xml.etree.ElementTree.write doesn't support attribute sorting natively in all versions
-    # but we can try to achieve some level of determinism.
-    # We will use indent for better readability and structure preservation.
-    ET.indent(tree, space=" ", level=0)
-
-    with open(path, "wb") as f:
-        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-        tree.write(f, encoding="utf-8", xml_declaration=False)
+    section = None
+    if objects is not None:
+        section = doc.root
+        for prefix in ("", "omap:barrier/"):
+            found = doc.root.find(f"{prefix}omap:parts/omap:part/omap:objects", doc.ns)
+            if found is not None:
+                section = found
+                break
+    write_omap(doc.root, path, objects, section)
@@ -1,34 +1,219 @@
 import xml.etree.ElementTree as ET
+from collections.abc import Iterator, Sequence
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Tuple
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .coords import parse_coords
+
+if TYPE_CHECKING:
+    from .spatial import GridIndex
+
+# Per-vertex flags stored as the optional third number of a <coords> vertex
+COORD_CURVE_START = 1
+COORD_CLOSE_POINT = 2
+COORD_GAP_POINT = 4
+COORD_HOLE_POINT = 16
+COORD_DASH_POINT = 32
 
 
 @dataclass
 class Color:
     """Represents an OMap color."""
+
     priority: int
     name: str
-    rgb: Tuple[float, float, float]  # 0.0 to 1.0
+    rgb: tuple[float, float, float]  # 0.0 to 1.0
 
 
 @dataclass
 class Symbol:
     """Represents an OMap symbol."""
+
     id: int
     code: str
     name: str
     type: int  # 1: point, 2: line, 4: area
-    line_width: Optional[int] = None  # in 1/10 mm? No, actually OMap uses weird units.
-    color_id: Optional[int] = None
-    fill_color_id: Optional[int] = None
+    line_width: int | None = None  # in 1/10 mm? No, actually OMap uses weird units.
+    color_id: int | None = None
+    fill_color_id: int | None = None
+
+
+class ObjectStore:
+    """
+    Compact columnar storage for map objects.
+
+    All vertices live in one contiguous (N, 2) float64 buffer. Object i owns the
+    vertex range ``offsets[i]:offsets[i + 1]``; its symbol, type and map part are
+    kept in parallel per-object arrays, and the OMap vertex flags in a per-vertex array.
+    """
+
+    def __init__(
+        self,
+        vertices: np.ndarray,
+        flags: np.ndarray,
+        offsets: np.ndarray,
+        symbol_ids: np.ndarray,
+        types: np.ndarray,
+        part_ids: np.ndarray | None = None,
+    ):
+        """
+        Initializes the store from its buffers.
+
+        Args:
+            vertices: (N, 2) float64 vertex buffer in map units.
+            flags: (N,) uint8 OMap coordinate flags.
+            offsets: (M + 1,) int64 vertex offsets, starting at 0.
+            symbol_ids: (M,) int32 symbol ids.
+            types: (M,) int8 object types.
+            part_ids: (M,) int32 index of the map part holding each object;
+                all zeros when omitted.
+        """
+        self.vertices = vertices
+        self.flags = flags
+        self.offsets = offsets
+        self.symbol_ids = symbol_ids
+        self.types = types
+        self.part_ids = (
+            part_ids if part_ids is not None else np.zeros(len(symbol_ids), dtype=np.int32)
+        )
+
+    @classmethod
+    def empty(cls) -> "ObjectStore":
+        """Returns a store without objects."""
+        return cls(
+            np.empty((0, 2), dtype=np.float64),
+            np.empty(0, dtype=np.uint8),
+            np.zeros(1, dtype=np.int64),
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.int8),
+        )
+
+    @classmethod
+    def from_elements(
+        cls, elems: Sequence[ET.Element], ns: dict[str, str], part_id: int = 0
+    ) -> "ObjectStore":
+        """
+        Builds a store from <object> elements, parsing all coordinates in one pass.
+        """
+        symbol_ids = np.empty(len(elems), dtype=np.int32)
+        types = np.empty(len(elems), dtype=np.int8)
+        texts: list[str | None] = []
+        for i, obj_elem in enumerate(elems):
+            symbol_ids[i] = int(obj_elem.get("symbol", "-1"))
+            types[i] = int(obj_elem.get("type", "0"))
+            coords_elem = obj_elem.find("omap:coords", ns)
+            texts.append(coords_elem.text if coords_elem is not None else None)
+
+        vertices, flags, counts = parse_coords(texts)
+        offsets = np.zeros(len(elems) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        part_ids = np.full(len(elems), part_id, dtype=np.int32)
+        return cls(vertices, flags, offsets, symbol_ids, types, part_ids)
+
+    @classmethod
+    def concatenate(cls, stores: Sequence["ObjectStore"]) -> "ObjectStore":
+        """
+        Merges stores into one, keeping their objects in the given order.
+        """
+        if not stores:
+            return cls.empty()
+        if len(stores) == 1:
+            return stores[0]
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for store in stores:
+            offsets.append(store.offsets[1:] + base)
+            base += int(store.offsets[-1])
+        return cls(
+            np.concatenate([store.vertices for store in stores]),
+            np.concatenate([store.flags for store in stores]),
+            np.concatenate(offsets),
+            np.concatenate([store.symbol_ids for store in stores]),
+            np.concatenate([store.types for store in stores]),
+            np.concatenate([store.part_ids for store in stores]),
+        )
+
+    def subset(self, indices: np.ndarray) -> "ObjectStore":
+        """
+        Gathers the given objects, in the given order, into a new compact store.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices]
+        counts = self.offsets[indices + 1] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # Source index of every gathered vertex
+        vertex_index = np.arange(offsets[-1], dtype=np.int64) + np.repeat(
+            starts - offsets[:-1], counts
+        )
+        return ObjectStore(
+            self.vertices[vertex_index],
+            self.flags[vertex_index],
+            offsets,
+            self.symbol_ids[indices],
+            self.types[indices],
+            self.part_ids[indices],
+        )
+
+    def __len__(self) -> int:
+        return len(self.symbol_ids)
+
+    def __getitem__(self, index: int) -> "Object":
+        if not -len(self) <= index < len(self):
+            raise IndexError("object index out of range")
+        return Object(self, index % len(self))
+
+    def __iter__(self) -> Iterator["Object"]:
+        return (Object(self, i) for i in range(len(self)))
 
 
-@dataclass
 class Object:
-    """Represents an OMap map object."""
-    symbol_id: int
-    coords: List[Tuple[float, float]]
-    type: int  # 1: point, 2: line, 3: area (in <object type="...">)
+    """
+    Represents an OMap map object as a lightweight view into an ObjectStore.
+    """
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: ObjectStore, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def symbol_id(self) -> int:
+        return int(self.store.symbol_ids[self.index])
+
+    @property
+    def type(self) -> int:
+        """1: point, 2: line, 3: area (in <object type="...">)"""
+        return int(self.store.types[self.index])
+
+    @property
+    def coords(self) -> np.ndarray:
+        """(n, 2) view of the object's vertices in map units."""
+        offsets = self.store.offsets
+        return self.store.vertices[offsets[self.index] : offsets[self.index + 1]]
+
+    @property
+    def flags(self) -> np.ndarray:
+        """(n,) view of the object's per-vertex OMap flags."""
+        offsets = self.store.offsets
+        return self.store.flags[offsets[self.index] : offsets[self.index + 1]]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Object):
+            return NotImplemented
+        return (
+            self.symbol_id == other.symbol_id
+            and self.type == other.type
+            and np.array_equal(self.coords, other.coords)
+            and np.array_equal(self.flags, other.flags)
+        )
+
+    def __repr__(self) -> str:
+        return f"Object(symbol_id={self.symbol_id}, type={self.type}, vertices={len(self.coords)})"
 
 
 class OMapDocument:
@@ -36,93 +221,294 @@ class OMapDocument:
     A thin wrapper around an XML tree representing an .omap document.
     """
 
-    def __init__(self, root: ET.Element):
+    def __init__(self, root: ET.Element | None, path: Path | None = None):
         """
         Initializes the OMapDocument with an XML root element.
 
         Args:
-            root: The root element of the .omap XML tree.
+            root: The root element of the .omap XML tree, or None to parse ``path``
+                lazily on first access to ``root``.
+            path: File the document was loaded from, if any. Enables parsing
+                map parts in parallel straight from the file.
         """
-        self.root = root
+        if root is None and path is None:
+            raise ValueError("OMapDocument needs an XML root or a path to parse it from")
+        self._root = root
+        self.path = path
         self.ns = {"omap": "http://openorienteering.org/apps/mapper/xml/v2"}
+        self._version: str | None = None
+        self._colors: dict[int, Color] | None = None
+        self._symbols: dict[int, Symbol] | None = None
+        self._part_names: list[str] | None = None
+        self._object_store: ObjectStore | None = None
+        self._spatial_index: GridIndex | None = None
+        self._flattened_stores: dict[int, ObjectStore] = {}
+        self._lod_stores: dict[int, ObjectStore] = {}
+
+    @classmethod
+    def from_parsed(
+        cls,
+        path: Path,
+        version: str | None,
+        colors: dict[int, Color],
+        symbols: dict[int, Symbol],
+        part_names: list[str],
+        object_store: ObjectStore,
+    ) -> "OMapDocument":
+        """
+        Creates a document from already extracted content, e.g. a compiled cache.
+
+        The XML tree is only parsed from ``path`` if ``root`` is accessed.
+        """
+        doc = cls(None, path)
+        doc._version = version
+        doc._colors = colors
+        doc._symbols = symbols
+        doc._part_names = part_names
+        doc._object_store = object_store
+        return doc
+
+    @property
+    def root(self) -> ET.Element:
+        """
+        Returns the root element of the XML tree, parsing the file if needed.
+        """
+        if self._root is None:
+            assert self.path is not None
+            self._root = ET.parse(self.path).getroot()
+        return self._root
 
     @property
-    def version(self) -> Optional[str]:
+    def has_tree(self) -> bool:
+        """Whether the XML tree is in memory; see root."""
+        return self._root is not None
+
+    @property
+    def version(self) -> str | None:
         """
         Returns the version of the .omap format.
         """
+        if self._root is None and self._version is not None:
+            return self._version
         return self.root.get("version")
 
-    def get_colors(self) -> Dict[int, Color]:
+    def get_colors(self) -> dict[int, Color]:
         """
         Extracts colors from the document.
         """
+        if self._colors is not None:
+            return dict(self._colors)
         colors = {}
         # Find <colors> tag
         colors_elem = self.root.find("omap:colors", self.ns)
         if colors_elem is not None:
             for color_elem in colors_elem.findall("omap:color", self.ns):
-                priority = int(color_elem.get("priority", "0"))
-                name = color_elem.get("name", "")
-                # Get RGB from <rgb r="..." g="..." b="..."/>
-                rgb_elem = color_elem.find("omap:rgb", self.ns)
-                if rgb_elem is not None:
-                    r = float(rgb_elem.get("r", "0"))
-                    g = float(rgb_elem.get("g", "0"))
-                    b = float(rgb_elem.get("b", "0"))
-                    colors[priority] = Color(priority, name, (r, g, b))
+                color = parse_color(color_elem, self.ns)
+                if color is not None:
+                    colors[color.priority] = color
         return colors
 
-    def get_symbols(self) -> Dict[int, Symbol]:
+    def get_symbols(self) -> dict[int, Symbol]:
         """
         Extracts symbols from the document.
         """
+        if self._symbols is not None:
+            return dict(self._symbols)
         symbols = {}
-        # Find <symbols> tag
-        symbols_elem = self.root.find("omap:symbols", self.ns)
-        if symbols_elem is not None:
+        # Find <symbols> tag; Mapper files wrap it in a <barrier> element
+        for symbols_elem in self._find_sections("omap:symbols"):
             for symbol_elem in symbols_elem.findall("omap:symbol", self.ns):
-                s_id = int(symbol_elem.get("id", "0"))
-                code = symbol_elem.get("code", "")
-                name = symbol_elem.get("name", "")
-                s_type = int(symbol_elem.get("type", "0"))
-                
-                symbol = Symbol(id=s_id, code=code, name=name, type=s_type)
-                
-                # Check for line_symbol
-                line_elem = symbol_elem.find("omap:line_symbol", self.ns)
-                if line_elem is not None:
-                    symbol.line_width = int(line_elem.get("line_width", "0"))
-                    symbol.color_id = int(line_elem.get("color", "0"))
-                
-                # Check for area_symbol
-                area_elem = symbol_elem.find("omap:area_symbol", self.ns)
-                if area_elem is not None:
-                    symbol.fill_color_id = int(area_elem.get("inner_color", "0"))
-                
-                symbols[s_id] = symbol
+                symbol = parse_symbol(symbol_elem, self.ns)
+                symbols[symbol.id] = symbol
         return symbols
 
-    def get_objects(self) -> List[Object]:
+    def get_objects(self) -> list[Object]:
         """
         Extracts objects from the document.
         """
-        objects = []
-        for obj_elem in self.root.findall("omap:object", self.ns):
-            symbol_id = int(obj_elem.get("symbol", "-1"))
-            obj_type = int(obj_elem.get("type", "0"))
-            
-            coords_elem = obj_elem.find("omap:coords", self.ns)
-            coords = []
-            if coords_elem is not None and coords_elem.text:
-                # coords are like "x1 y1;x2 y2;..."
-                raw_coords = coords_elem.text.strip().split(";")
-                for raw_coord in raw_coords:
-                    if not raw_coord.strip():
-                        continue
-                    parts = raw_coord.strip().split()
-                    if len(parts) >= 2:
-                        coords.append((float(parts[0]), float(parts[1])))
-            
-            objects.append(Object(symbol_id=symbol_id, coords=coords, type=obj_type))
-        return objects
+        return list(self.get_object_store())
+
+    def get_object_store(self, workers: int | None = None) -> ObjectStore:
+        """
+        Returns the objects of the document in columnar form.
+
+        Objects are collected in document order from the root (flat files) and from
+        every <parts>/<part>/<objects> block. The store is parsed once and cached on
+        the document.
+
+        Args:
+            workers: Parse map parts in a process pool of this size. Only used for
+                documents loaded from a file that have more than one part.
+        """
+        if self._object_store is None:
+            groups = self._object_groups()
+            store = None
+            if workers is not None and workers > 1 and self.path is not None and len(groups) > 1:
+                from .parts import parse_parts_parallel
+
+                store = parse_parts_parallel(self.path, len(groups), workers)
+            if store is None:
+                store = ObjectStore.concatenate(
+                    [
+                        ObjectStore.from_elements(elems, self.ns, part_id=i)
+                        for i, elems in enumerate(groups)
+                    ]
+                )
+            self._object_store = store
+        return self._object_store
+
+    def get_spatial_index(self) -> "GridIndex":
+        """
+        Returns a grid index over the object extents, built once per document.
+        """
+        if self._spatial_index is None:
+            from .spatial import GridIndex, compute_bounds
+
+            self._spatial_index = GridIndex(compute_bounds(self.get_object_store()))
+        return self._spatial_index
+
+    def get_flattened_store(self, tolerance: float) -> ObjectStore:
+        """
+        Returns the object store with Bezier curves replaced by polylines.
+
+        The result is cached per power-of-two tolerance level, so renders at the
+        same zoom share it. Objects keep their indices, so spatial index queries
+        apply to it unchanged.
+
+        Args:
+            tolerance: Maximum deviation from the true curves in map units.
+        """
+        from .curves import curve_level, flatten_store
+
+        level = curve_level(tolerance)
+        if level not in self._flattened_stores:
+            self._flattened_stores[level] = flatten_store(self.get_object_store(), 2.0**level)
+        return self._flattened_stores[level]
+
+    def get_lod_store(self, pixel_size: float) -> ObjectStore:
+        """
+        Returns the object store prepared for rendering at a given pixel size.
+
+        Curves are flattened and outlines simplified to the pixel grid, so small
+        renders of large maps draw few vertices. Levels are cached per power of
+        two of the pixel size; objects keep their indices.
+
+        Args:
+            pixel_size: Size of an output pixel in map units.
+        """
+        from .curves import FLATTEN_TOLERANCE_PX, curve_level
+        from .simplify import SIMPLIFY_TOLERANCE_PX, simplify_store
+
+        level = curve_level(pixel_size)
+        if level not in self._lod_stores:
+            scale = 2.0**level
+            flattened = self.get_flattened_store(FLATTEN_TOLERANCE_PX * scale)
+            self._lod_stores[level] = simplify_store(flattened, SIMPLIFY_TOLERANCE_PX * scale)
+        return self._lod_stores[level]
+
+    def store_bytes(self) -> int:
+        """
+        Memory of the object store and of the flattened and LOD stores built
+        from it so far. Arrays shared between stores are counted once.
+        """
+        stores = [
+            self.get_object_store(),
+            *self._flattened_stores.values(),
+            *self._lod_stores.values(),
+        ]
+        arrays = {
+            id(a): a
+            for s in stores
+            for a in (s.vertices, s.flags, s.offsets, s.symbol_ids, s.types, s.part_ids)
+        }
+        return sum(a.nbytes for a in arrays.values())
+
+    def query_bbox(self, bbox: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Finds the objects whose extent intersects a bounding box.
+
+        Args:
+            bbox: (xmin, ymin, xmax, ymax) in map units.
+
+        Returns:
+            Sorted indices into the object store, i.e. in document order.
+        """
+        return self.get_spatial_index().query(bbox)
+
+    def get_part_names(self) -> list[str]:
+        """
+        Returns the names of the map parts (layers) in document order.
+        """
+        if self._part_names is not None:
+            return list(self._part_names)
+        return [part.get("name", "") for part in self._find_sections("omap:parts/omap:part")]
+
+    def _find_sections(self, path: str) -> list[ET.Element]:
+        """Finds elements at ``path`` below the root or below a <barrier> wrapper."""
+        return self.root.findall(path, self.ns) + self.root.findall(f"omap:barrier/{path}", self.ns)
+
+    def _object_groups(self) -> list[list[ET.Element]]:
+        """
+        Returns the <object> elements grouped by map part, in document order.
+
+        Objects placed directly under the root form a single group of their own.
+        """
+        groups = []
+        flat = self.root.findall("omap:object", self.ns)
+        if flat:
+            groups.append(flat)
+        for part in self._find_sections("omap:parts/omap:part"):
+            groups.append(part.findall("omap:objects/omap:object", self.ns))
+        return groups
+
+
+def parse_color(color_elem: ET.Element, ns: dict[str, str]) -> Color | None:
+    """
+    Builds a Color from a <color> element.
+
+    Returns None for colors without an <rgb> child, which cannot be rendered.
+    """
+    priority = int(color_elem.get("priority", "0"))
+    name = color_elem.get("name", "")
+    # Get RGB from <rgb r="..." g="..." b="..."/>
+    rgb_elem = color_elem.find("omap:rgb", ns)
+    if rgb_elem is None:
+        return None
+    r = float(rgb_elem.get("r", "0"))
+    g = float(rgb_elem.get("g", "0"))
+    b = float(rgb_elem.get("b", "0"))
+    return Color(priority, name, (r, g, b))
+
+
+def parse_symbol(symbol_elem: ET.Element, ns: dict[str, str]) -> Symbol:
+    """
+    Builds a Symbol from a <symbol> element.
+    """
+    s_id = int(symbol_elem.get("id", "0"))
+    code = symbol_elem.get("code", "")
+    name = symbol_elem.get("name", "")
+    s_type = int(symbol_elem.get("type", "0"))
+
+    symbol = Symbol(id=s_id, code=code, name=name, type=s_type)
+
+    # Check for line_symbol
+    line_elem = symbol_elem.find("omap:line_symbol", ns)
+    if line_elem is not None:
+        symbol.line_width = int(line_elem.get("line_width", "0"))
+        symbol.color_id = int(line_elem.get("color", "0"))
+
+    # Check for area_symbol
+    area_elem = symbol_elem.find("omap:area_symbol", ns)
+    if area_elem is not None:
+        symbol.fill_color_id = int(area_elem.get("inner_color", "0"))
+
+    return symbol
+
+
+def parse_objects(
+    obj_elems: Sequence[ET.Element], ns: dict[str, str], part_id: int = 0
+) -> list[Object]:
+    """
+    Builds Objects from <object> elements, sharing one ObjectStore between them.
+    """
+    return list(ObjectStore.from_elements(obj_elems, ns, part_id))
@@ -0,0 +1,164 @@
+"""Parallel parsing of the map parts (layers) of an .omap file."""
+
+import codecs
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .model import ObjectStore, OMapDocument
+from .writer import OMAP_NAMESPACE
+
+# <parts> blocks hold the map layers; <part> elements also occur inside combined
+# symbols, so part elements are only searched for within these blocks.
+_PARTS_RE = re.compile(rb"<parts[\s>].*?</parts>", re.DOTALL)
+_PART_RE = re.compile(rb"<part(?:\s[^>]*)?(?:/>|>.*?</part>)", re.DOTALL)
+_PART_START_RE = re.compile(rb"<part(?:\s[^>]*)?>")
+# Parts are cut out of the raw bytes and parsed as UTF-8 in the default
+# namespace; files with another encoding or with prefixed tags are not split
+_ENCODING_RE = re.compile(rb"<\?xml[^>]*?\sencoding\s*=\s*[\"']([^\"']*)[\"']")
+_PREFIXED_TAG_RE = re.compile(rb"</?[A-Za-z_][\w.-]*:")
+
+_StoreArrays = tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def split_parts(data: bytes) -> list[bytes]:
+    """
+    Cuts the raw bytes of every map <part> element out of an .omap file.
+
+    Args:
+        data: Contents of the .omap file.
+
+    Returns:
+        The serialized <part> elements in document order.
+    """
+    return strip_parts(data)[1]
+
+
+def strip_parts(data: bytes) -> tuple[bytes, list[bytes]]:
+    """
+    Cuts the contents of every map <part> element out of an .omap file.
+
+    Returns:
+        The file with each part reduced to an empty element that keeps its
+        attributes, and the serialized <part> elements in document order.
+    """
+    spans: list[bytes] = []
+
+    def empty_part(match: "re.Match[bytes]") -> bytes:
+        spans.append(match.group(0))
+        start = _PART_START_RE.match(match.group(0))
+        assert start is not None
+        tag = start.group(0)
+        return tag if tag.endswith(b"/>") else tag[:-1] + b"/>"
+
+    def empty_parts(match: "re.Match[bytes]") -> bytes:
+        return _PART_RE.sub(empty_part, match.group(0))
+
+    return _PARTS_RE.sub(empty_parts, data), spans
+
+
+def parse_part(blob: bytes) -> _StoreArrays:
+    """
+    Parses the objects of one serialized <part> element.
+
+    The part is cut out of its document, so the default OMap namespace is declared
+    on it again before parsing.
+
+    Returns:
+        The buffers of an ObjectStore (vertices, flags, offsets, symbol_ids, types).
+    """
+    ns = {"omap": OMAP_NAMESPACE}
+    part = ET.fromstring(blob.replace(b"<part", f'<part xmlns="{OMAP_NAMESPACE}"'.encode(), 1))
+    store = ObjectStore.from_elements(part.findall("omap:objects/omap:object", ns), ns)
+    return store.vertices, store.flags, store.offsets, store.symbol_ids, store.types
+
+
+def parse_parts_parallel(path: str | Path, expected_parts: int, workers: int) -> ObjectStore | None:
+    """
+    Parses every map part of an .omap file in a process pool.
+
+    Results are merged in document order, so the store is identical to the one
+    built from the DOM.
+
+    Args:
+        path: Path to the .omap file.
+        expected_parts: Number of parts found in the DOM, used to validate the split.
+        workers: Size of the process pool.
+
+    Returns:
+        The merged ObjectStore, or None if the file could not be split into exactly
+        ``expected_parts`` parts and must be parsed serially.
+    """
+    data = Path(path).read_bytes()
+    if not _splittable(data):
+        return None
+    blobs = split_parts(data)
+    if len(blobs) != expected_parts:
+        return None
+    return _parse_blobs(blobs, workers)
+
+
+def load_parts_parallel(path: str | Path, workers: int) -> OMapDocument | None:
+    """
+    Loads an .omap file, parsing its map parts in a process pool.
+
+    Only the file without the contents of its parts is parsed here, for the
+    colors, symbols and part names; the full XML tree is parsed if the
+    document's ``root`` is accessed.
+
+    Args:
+        path: Path to the .omap file.
+        workers: Size of the process pool.
+
+    Returns:
+        The document, or None if it has fewer than two parts, has objects
+        outside its parts or could not be split, and must be parsed serially.
+    """
+    data = Path(path).read_bytes()
+    if not _splittable(data):
+        return None
+    skeleton, blobs = strip_parts(data)
+    if len(blobs) < 2:
+        return None
+    try:
+        doc = OMapDocument(ET.fromstring(skeleton), Path(path))
+    except ET.ParseError:
+        return None
+    if doc.root.find("omap:object", doc.ns) is not None or len(doc.get_part_names()) != len(blobs):
+        return None
+
+    store = _parse_blobs(blobs, workers)
+    return OMapDocument.from_parsed(
+        Path(path), doc.version, doc.get_colors(), doc.get_symbols(), doc.get_part_names(), store
+    )
+
+
+def _splittable(data: bytes) -> bool:
+    """
+    Checks that the parts of a file can be cut out of its bytes: the file is
+    UTF-8 and has no prefixed tags, so every part parses on its own.
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        data = data[len(codecs.BOM_UTF8) :]
+    # UTF-16 and UTF-32 files start with a byte order mark or a NUL byte
+    if not data.startswith(b"<"):
+        return False
+    match = _ENCODING_RE.match(data)
+    if match is not None and match.group(1).lower() not in (b"utf-8", b"utf8"):
+        return False
+    return _PREFIXED_TAG_RE.search(data) is None
+
+
+def _parse_blobs(blobs: list[bytes], workers: int) -> ObjectStore:
+    """Parses serialized <part> elements in a process pool and merges them in order."""
+    with ProcessPoolExecutor(max_workers=min(workers, len(blobs))) as pool:
+        results = list(pool.map(parse_part, blobs))
+
+    stores = []
+    for part_id, (vertices, flags, offsets, symbol_ids, types) in enumerate(results):
+        part_ids = np.full(len(symbol_ids), part_id, dtype=np.int32)
+        stores.append(ObjectStore(vertices, flags, offsets, symbol_ids, types, part_ids))
+    return ObjectStore.concatenate(stores)
@@ -0,0 +1,119 @@
+"""Level-of-detail simplification of object geometry."""
+
+import numpy as np
+
+from .model import ObjectStore
+
+# Maximum distance between an object and its simplified outline, in output pixels
+SIMPLIFY_TOLERANCE_PX = 0.5
+
+
+def simplify_polylines(
+    vertices: np.ndarray, flags: np.ndarray, offsets: np.ndarray, tolerance: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Simplifies the outlines of many objects to a given tolerance.
+
+    A grid prefilter first drops runs of consecutive vertices within one cell of
+    half the tolerance, which removes most vertices of dense outlines in a single
+    pass. The rest is simplified with the Douglas-Peucker algorithm, run breadth-first: every
+    round handles the open vertex ranges of all objects at once, so the number of
+    Python-level steps is the recursion depth rather than the number of vertices.
+    First and last vertices of every object are always kept. Curves must have been
+    flattened beforehand.
+
+    Args:
+        vertices: (N, 2) vertices in map units.
+        flags: (N,) OMap vertex flags.
+        offsets: (M + 1,) object vertex offsets.
+        tolerance: Maximum deviation in map units.
+
+    Returns:
+        A tuple (vertices, flags, offsets) of the kept vertices. The inputs are
+        returned unchanged if no vertex can be dropped.
+    """
+    if len(vertices) == 0:
+        return vertices, flags, offsets
+    counts = np.diff(offsets)
+    non_empty = counts > 0
+    object_first = offsets[:-1][non_empty]
+    object_last = offsets[1:][non_empty] - 1
+
+    # Grid prefilter; a dropped vertex lies within a cell diagonal of a kept one
+    cell = tolerance / (2 * np.sqrt(2))
+    cells = np.floor(vertices / cell).astype(np.int64)
+    keep = np.ones(len(vertices), dtype=bool)
+    keep[1:] = (cells[1:] != cells[:-1]).any(axis=1)
+    keep[object_first] = True
+    keep[object_last] = True
+    candidates = np.flatnonzero(keep)
+    cand_offsets = np.searchsorted(candidates, offsets)
+
+    # Douglas-Peucker over the prefiltered candidates, with the rest of the budget
+    x = vertices[candidates, 0]
+    y = vertices[candidates, 1]
+    tolerance2 = (tolerance - cell * np.sqrt(2)) ** 2
+    kept = np.zeros(len(candidates), dtype=bool)
+    kept[cand_offsets[:-1][non_empty]] = True
+    kept[cand_offsets[1:][non_empty] - 1] = True
+    long = np.diff(cand_offsets) > 2
+    start = cand_offsets[:-1][long]
+    end = cand_offsets[1:][long] - 1
+    while len(start):
+        # Interior vertices of every open range, grouped by range
+        inner = end - start - 1
+        first = np.zeros(len(inner), dtype=np.int64)
+        np.cumsum(inner[:-1], out=first[1:])
+        rng = np.repeat(np.arange(len(inner)), inner)
+        points = np.repeat(start + 1 - first, inner) + np.arange(int(inner.sum()), dtype=np.int64)
+
+        a, b = start[rng], end[rng]
+        distance2 = _segment_distance2(x[points], y[points], x[a], y[a], x[b], y[b])
+        largest = np.maximum.reduceat(distance2, first)
+        # First vertex reaching the range's largest distance
+        at_max = np.flatnonzero(distance2 == largest[rng])
+        _, first_max = np.unique(rng[at_max], return_index=True)
+        split = points[at_max[first_max]]
+
+        far = largest > tolerance2
+        kept[split[far]] = True
+        start, split, end = start[far], split[far], end[far]
+        start, end = np.concatenate([start, split]), np.concatenate([split, end])
+        open_ranges = end - start > 1
+        start, end = start[open_ranges], end[open_ranges]
+
+    if kept.all() and len(candidates) == len(vertices):
+        return vertices, flags, offsets
+    keep = candidates[kept]
+    return vertices[keep], flags[keep], np.searchsorted(keep, offsets)
+
+
+def simplify_store(store: ObjectStore, tolerance: float) -> ObjectStore:
+    """
+    Simplifies every object of a store.
+
+    Object order and attributes are kept, so indices into ``store`` remain valid.
+    Returns ``store`` itself if nothing could be simplified.
+    """
+    vertices, flags, offsets = simplify_polylines(
+        store.vertices, store.flags, store.offsets, tolerance
+    )
+    if vertices is store.vertices:
+        return store
+    return ObjectStore(vertices, flags, offsets, store.symbol_ids, store.types, store.part_ids)
+
+
+def _segment_distance2(
+    px: np.ndarray, py: np.ndarray, ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray
+) -> np.ndarray:
+    """Squared distances of points ``p`` to the segments ``a``-``b``, element by element."""
+    abx = bx - ax
+    aby = by - ay
+    apx = px - ax
+    apy = py - ay
+    length2 = abx * abx + aby * aby
+    t = np.clip((apx * abx + apy * aby) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    dx = apx - t * abx
+    dy = apy - t * aby
+    distance2: np.ndarray = dx * dx + dy * dy
+    return distance2
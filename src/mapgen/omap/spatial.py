@@ -0,0 +1,141 @@
+"""Spatial index over the extents of map objects."""
+
+import math
+
+import numpy as np
+
+from .model import ObjectStore
+
+# Objects overlapping more grid cells than this are kept in a separate list that is
+# checked on every query, so a few huge areas do not blow up the cell table.
+MAX_CELLS_PER_OBJECT = 64
+
+# Upper bound for the number of cells along one axis
+MAX_GRID_SIDE = 4096
+
+
+def compute_bounds(store: ObjectStore) -> np.ndarray:
+    """
+    Computes the bounding box of every object in a store.
+
+    Args:
+        store: Object store.
+
+    Returns:
+        An (M, 4) float64 array of (xmin, ymin, xmax, ymax) rows; rows of objects
+        without vertices are NaN.
+    """
+    m = len(store)
+    bounds = np.full((m, 4), np.nan, dtype=np.float64)
+    counts = np.diff(store.offsets)
+    non_empty = np.flatnonzero(counts > 0)
+    if len(non_empty):
+        starts = store.offsets[non_empty]
+        bounds[non_empty, :2] = np.minimum.reduceat(store.vertices, starts, axis=0)
+        bounds[non_empty, 2:] = np.maximum.reduceat(store.vertices, starts, axis=0)
+    return bounds
+
+
+class GridIndex:
+    """
+    Uniform grid over object extents, answering bounding-box queries.
+
+    Every object is registered in each cell its bounding box overlaps. The cell
+    table is stored in CSR form: the objects of cell ``c`` are
+    ``cell_objects[cell_start[c]:cell_start[c + 1]]``, in ascending object order.
+    """
+
+    def __init__(self, bounds: np.ndarray, cell_size: float | None = None):
+        """
+        Builds the grid.
+
+        Args:
+            bounds: (M, 4) object bounds as returned by compute_bounds.
+            cell_size: Cell edge length in map units. Chosen from the data when omitted.
+        """
+        self.bounds = bounds
+        ids = np.flatnonzero(~np.isnan(bounds[:, 0]))
+
+        if len(ids) == 0:
+            self.origin = (0.0, 0.0)
+            self.cell_size = 1.0
+            self.shape = (1, 1)
+            self.cell_start = np.zeros(2, dtype=np.int64)
+            self.cell_objects = np.empty(0, dtype=np.int64)
+            self.oversized = np.empty(0, dtype=np.int64)
+            return
+
+        b = bounds[ids]
+        xmin, ymin = float(b[:, 0].min()), float(b[:, 1].min())
+        xmax, ymax = float(b[:, 2].max()), float(b[:, 3].max())
+        width = max(xmax - xmin, 1e-9)
+        height = max(ymax - ymin, 1e-9)
+        if cell_size is None:
+            # About one cell per object, but never smaller than a typical object
+            extents = np.maximum(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1])
+            cell_size = max(math.sqrt(width * height / len(ids)), float(np.median(extents)))
+        cell_size = max(cell_size, width / MAX_GRID_SIDE, height / MAX_GRID_SIDE, 1e-9)
+
+        nx = int(width // cell_size) + 1
+        ny = int(height // cell_size) + 1
+        self.origin = (xmin, ymin)
+        self.cell_size = cell_size
+        self.shape = (ny, nx)
+
+        cx0, cy0, cx1, cy1 = self._cell_range(b)
+        n_cells = (cx1 - cx0 + 1) * (cy1 - cy0 + 1)
+        large = n_cells > MAX_CELLS_PER_OBJECT
+        self.oversized = ids[large]
+
+        small = ~large
+        ids, cx0, cy0, cx1, n_cells = ids[small], cx0[small], cy0[small], cx1[small], n_cells[small]
+        # Expand every object into the list of cells it covers
+        total = int(n_cells.sum())
+        first = np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        k = np.arange(total, dtype=np.int64) - first
+        row_len = np.repeat(cx1 - cx0 + 1, n_cells)
+        cells = (
+            (np.repeat(cy0, n_cells) + k // row_len) * nx + np.repeat(cx0, n_cells) + k % row_len
+        )
+        objects = np.repeat(ids, n_cells)
+
+        order = np.argsort(cells, kind="stable")
+        self.cell_objects = objects[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(nx * ny + 1)).astype(np.int64)
+
+    def _cell_range(self, b: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the clipped (cx0, cy0, cx1, cy1) cell ranges covered by bounds rows."""
+        ny, nx = self.shape
+        ox, oy = self.origin
+        cx0 = np.clip(np.floor((b[:, 0] - ox) / self.cell_size), 0, nx - 1).astype(np.int64)
+        cy0 = np.clip(np.floor((b[:, 1] - oy) / self.cell_size), 0, ny - 1).astype(np.int64)
+        cx1 = np.clip(np.floor((b[:, 2] - ox) / self.cell_size), 0, nx - 1).astype(np.int64)
+        cy1 = np.clip(np.floor((b[:, 3] - oy) / self.cell_size), 0, ny - 1).astype(np.int64)
+        return cx0, cy0, cx1, cy1
+
+    def query(self, bbox: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Finds the objects whose bounding box intersects ``bbox``.
+
+        Args:
+            bbox: (xmin, ymin, xmax, ymax) in map units.
+
+        Returns:
+            Sorted int64 array of object indices.
+        """
+        xmin, ymin, xmax, ymax = bbox
+        candidates = [self.oversized]
+        if len(self.cell_objects):
+            cx0, cy0, cx1, cy1 = (
+                int(v[0]) for v in self._cell_range(np.array([bbox], dtype=np.float64))
+            )
+            nx = self.shape[1]
+            for cy in range(cy0, cy1 + 1):
+                start = self.cell_start[cy * nx + cx0]
+                end = self.cell_start[cy * nx + cx1 + 1]
+                candidates.append(self.cell_objects[start:end])
+
+        found = np.unique(np.concatenate(candidates))
+        b = self.bounds[found]
+        hit = (b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin)
+        return found[hit]
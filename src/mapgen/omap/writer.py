@@ -0,0 +1,372 @@
+"""Incremental serialization of .omap documents.
+
+The output is byte for byte what ElementTree writes after ``ET.indent(tree,
+space=" ")``, with the declaration save_omap has always written in front. The
+indentation is computed while writing, so the tree is neither walked twice nor
+modified, and the text goes through one buffered file.
+
+Further objects can be streamed into an objects section from any iterable,
+e.g. a generator. They are serialized to a spool file as they are consumed,
+so the section's ``count`` attribute is exact before its children are written.
+"""
+
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from collections.abc import Iterable
+from itertools import chain
+from operator import attrgetter
+from pathlib import Path
+from typing import IO
+
+import numpy as np
+
+from .model import Object
+
+# OpenOrienteering Mapper XML namespace
+OMAP_NAMESPACE = "http://openorienteering.org/apps/mapper/xml/v2"
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+# Serialized text is encoded and written once this many fragments are pending
+_CHUNK_PARTS = 1 << 16
+# Distinct attribute sets whose serialization is kept
+_ATTRIBUTE_CACHE_SIZE = 1 << 16
+
+
+def write_omap(
+    root: ET.Element,
+    path: str | Path,
+    objects: Iterable[ET.Element | Object] | None = None,
+    section: ET.Element | None = None,
+    space: str = " ",
+) -> None:
+    """
+    Writes an .omap XML tree to a file, element by element.
+
+    Args:
+        root: Root element of the document.
+        path: Output file.
+        objects: Further <object> elements or Object records, written after
+            the children of ``section``. Object records are written with their
+            type, symbol and coordinates; coordinates are rounded to whole map
+            units.
+        section: Element of ``root`` that receives ``objects``; its ``count``
+            attribute, if any, is raised by the number of streamed objects.
+        space: Indentation of one level.
+
+    Raises:
+        ValueError: If objects are given without a section of ``root``, or use
+            a namespace the document does not declare.
+    """
+    path = Path(path)
+    qnames, namespaces = _collect_qnames(root)
+    with open(path, "wb") as f:
+        out = _Output(f)
+        out.write(XML_DECLARATION)
+        serializer = _Serializer(out, qnames, space)
+        if objects is None:
+            serializer.element(root, 0, _tail(root), namespaces)
+        else:
+            depth = _depth(root, section)
+            if section is None or depth is None:
+                raise ValueError("Streamed objects need a section of the document to go into")
+            with tempfile.TemporaryFile(dir=path.parent) as spool:
+                count, last_tail = _spool_objects(spool, objects, qnames, space, depth + 1)
+                spool.seek(0)
+                serializer.streamed = (section, count, spool, last_tail)
+                serializer.element(root, 0, _tail(root), namespaces)
+        out.flush()
+
+
+def object_element(obj: Object) -> ET.Element:
+    """Builds the <object> element of an Object record."""
+    elem = ET.Element(f"{{{OMAP_NAMESPACE}}}object", type=str(obj.type), symbol=str(obj.symbol_id))
+    coords = np.rint(obj.coords).astype(np.int64)
+    ET.SubElement(elem, f"{{{OMAP_NAMESPACE}}}coords", count=str(len(coords))).text = coords_text(
+        coords, obj.flags
+    )
+    return elem
+
+
+def coords_text(coords: np.ndarray, flags: np.ndarray) -> str:
+    """Formats vertices and their flags as the text of a <coords> element."""
+    return "".join(
+        f"{x} {y} {f};" if f else f"{x} {y};"
+        for (x, y), f in zip(coords.tolist(), flags.tolist(), strict=True)
+    )
+
+
+class _Output:
+    """Collects text fragments and writes them to a binary file in UTF-8 chunks."""
+
+    def __init__(self, f: IO[bytes]):
+        self.f = f
+        self.parts: list[str] = []
+        self.write = self.parts.append
+
+    def flush(self) -> None:
+        # Same error handling as ElementTree's writer
+        self.f.write("".join(self.parts).encode("utf-8", "xmlcharrefreplace"))
+        self.parts.clear()
+
+    def copy(self, src: IO[bytes]) -> None:
+        """Appends the rest of an already encoded file."""
+        self.flush()
+        shutil.copyfileobj(src, self.f, 1 << 20)
+
+
+class _Serializer:
+    """Writes elements like ElementTree, indenting like ET.indent."""
+
+    def __init__(self, out: _Output, qnames: dict[str, str], space: str):
+        self.out = out
+        self.qnames = qnames
+        self.space = space
+        self.indentations = ["\n"]
+        self.attribute_cache: dict[tuple[tuple[str, str], ...], str] = {}
+        # (section, object count, spool file, tail of the last object)
+        self.streamed: tuple[ET.Element, int, IO[bytes], str | None] | None = None
+
+    def indentation(self, level: int) -> str:
+        while len(self.indentations) <= level:
+            self.indentations.append(self.indentations[-1] + self.space)
+        return self.indentations[level]
+
+    def element(
+        self,
+        elem: ET.Element,
+        level: int,
+        tail: str | None,
+        namespaces: dict[str, str] | None = None,
+    ) -> None:
+        """Writes an element at ``level`` followed by an already escaped ``tail``."""
+        write = self.out.write
+        tag = elem.tag
+        if not isinstance(tag, str):
+            if tag is ET.Comment:
+                write(f"<!--{elem.text}-->")
+            elif tag is ET.ProcessingInstruction:
+                write(f"<?{elem.text}?>")
+        else:
+            n_streamed = 0
+            if self.streamed is not None and self.streamed[0] is elem:
+                n_streamed = self.streamed[1]
+            qname = self.qnames[tag]
+            start = "<" + qname
+            if namespaces:
+                for uri, prefix in sorted(namespaces.items(), key=lambda item: item[1]):
+                    start += f' xmlns{":" + prefix if prefix else ""}="{_escape_attrib(uri)}"'
+            if n_streamed and "count" in elem.attrib:
+                attrib = dict(elem.attrib, count=str(int(elem.attrib["count"]) + n_streamed))
+                start += "".join(
+                    f' {self.qnames[k]}="{_escape_attrib(v)}"' for k, v in attrib.items()
+                )
+            elif elem.attrib:
+                start += self.attributes(elem.attrib)
+            text = elem.text
+            n_children = len(elem)
+            if n_children or n_streamed:
+                indentations = self.indentations
+                if len(indentations) <= level + 1:
+                    self.indentation(level + 1)
+                child_indentation = indentations[level + 1]
+                if not text or text.isspace():
+                    write(start + ">" + child_indentation)
+                else:
+                    write(start + ">" + _escape_cdata(text))
+                last = n_children - 1 if not n_streamed else -1
+                parts = self.out.parts
+                qnames = self.qnames
+                attributes = self.attributes
+                section = self.streamed[0] if self.streamed is not None else None
+                for i, child in enumerate(elem):
+                    child_tail = child.tail
+                    if not child_tail or child_tail.isspace():
+                        child_tail = indentations[level] if i == last else child_indentation
+                    else:
+                        child_tail = _escape_cdata(child_tail)
+                    if len(child) or not isinstance(child.tag, str) or child is section:
+                        self.element(child, level + 1, child_tail)
+                    else:
+                        # Indenting leaves elements without children as they are
+                        child_qname = qnames[child.tag]
+                        child_start = "<" + child_qname
+                        if child.attrib:
+                            child_start += attributes(child.attrib)
+                        child_text = child.text
+                        if child_text:
+                            child_text = _escape_cdata(child_text)
+                            write(f"{child_start}>{child_text}</{child_qname}>{child_tail}")
+                        else:
+                            write(child_start + " />" + child_tail)
+                    if len(parts) >= _CHUNK_PARTS:
+                        self.out.flush()
+                if n_streamed:
+                    assert self.streamed is not None
+                    self.splice(self.streamed[2], self.streamed[3], level)
+                write("</" + qname + ">")
+            elif text:
+                write(start + ">" + _escape_cdata(text) + "</" + qname + ">")
+            else:
+                write(start + " />")
+        if tail:
+            write(tail)
+
+    def attributes(self, attrib: dict[str, str]) -> str:
+        """Serializes attributes; maps repeat the same few, so they are cached."""
+        key = tuple(attrib.items())
+        text = self.attribute_cache.get(key)
+        if text is None:
+            text = "".join(f' {self.qnames[k]}="{_escape_attrib(v)}"' for k, v in key)
+            if len(self.attribute_cache) < _ATTRIBUTE_CACHE_SIZE:
+                self.attribute_cache[key] = text
+        return text
+
+    def splice(self, spool: IO[bytes], last_tail: str | None, level: int) -> None:
+        """Copies the streamed objects into the output."""
+        self.out.copy(spool)
+        self.out.write(_escape_cdata(last_tail) if last_tail else self.indentation(level))
+
+
+def _spool_objects(
+    spool: IO[bytes],
+    objects: Iterable[ET.Element | Object],
+    qnames: dict[str, str],
+    space: str,
+    level: int,
+) -> tuple[int, str | None]:
+    """
+    Serializes streamed objects at ``level``, separated by the indentation of
+    that level. The tail of the last object depends on where the section ends,
+    so it is returned rather than written: None if it is only whitespace.
+    """
+    out = _Output(spool)
+    serializer = _Serializer(out, _QNames(qnames), space)
+    separator = serializer.indentation(level)
+    count = 0
+    tail: str | None = None
+    for obj in objects:
+        elem = obj if isinstance(obj, ET.Element) else object_element(obj)
+        if count:
+            out.write(_escape_cdata(tail) if tail else separator)
+        serializer.element(elem, level, None)
+        tail = elem.tail if elem.tail and not elem.tail.isspace() else None
+        count += 1
+        if len(out.parts) >= _CHUNK_PARTS:
+            out.flush()
+    out.flush()
+    return count, tail
+
+
+class _QNames(dict[str, str]):
+    """Qualified names of streamed elements, in the namespaces of the document."""
+
+    def __init__(self, qnames: dict[str, str]):
+        super().__init__(qnames)
+        self.prefixes: dict[str, str] = {}
+        for key, qname in qnames.items():
+            if key.startswith("{"):
+                uri = key[1:].rsplit("}", 1)[0]
+                self.prefixes[uri] = qname.split(":")[0] if ":" in qname else ""
+
+    def __missing__(self, key: str) -> str:
+        if key.startswith("{"):
+            uri, name = key[1:].rsplit("}", 1)
+            if uri not in self.prefixes:
+                raise ValueError(f"Namespace {uri} is not declared by the document")
+            prefix = self.prefixes[uri]
+            self[key] = f"{prefix}:{name}" if prefix else name
+        else:
+            self[key] = key
+        return self[key]
+
+
+def _collect_qnames(root: ET.Element) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Maps the tags and attribute names of a tree to qualified names, like
+    ElementTree's serializer.
+
+    Returns:
+        A tuple (qnames, namespaces): the qualified name of every tag and
+        attribute name, and the prefix of every namespace URI used.
+    """
+    qnames: dict[str, str] = {}
+    namespaces: dict[str, str] = {}
+    # Prefixes registered with ElementTree, and the map namespace as the default
+    registered: dict[str, str] = dict(ET._namespace_map)  # type: ignore[attr-defined]
+    registered[OMAP_NAMESPACE] = ""
+
+    def add(name: str) -> None:
+        if name[:1] == "{":
+            uri, local = name[1:].rsplit("}", 1)
+            prefix = namespaces.get(uri)
+            if prefix is None:
+                prefix = registered.get(uri)
+                if prefix is None:
+                    prefix = f"ns{len(namespaces)}"
+                if prefix != "xml":
+                    namespaces[uri] = prefix
+            qnames[name] = f"{prefix}:{local}" if prefix else local
+        else:
+            qnames[name] = name
+
+    # Distinct names in order of first use, without a Python-level step per element
+    tags = dict.fromkeys(map(attrgetter("tag"), root.iter()))
+    keys = dict.fromkeys(chain.from_iterable(map(attrgetter("attrib"), root.iter())))
+    for name in chain(tags, keys):
+        if isinstance(name, str):
+            add(name)
+    if any(uri not in registered for uri in namespaces):
+        # Other namespaces are numbered in document order, attributes after their tag
+        qnames.clear()
+        namespaces.clear()
+        for elem in root.iter():
+            for name in chain((elem.tag,), elem.attrib):
+                if isinstance(name, str) and name not in qnames:
+                    add(name)
+    return qnames, namespaces
+
+
+def _depth(root: ET.Element, target: ET.Element | None) -> int | None:
+    """Depth of ``target`` below ``root``, or None if it is not in the tree."""
+    level = [root]
+    depth = 0
+    while level:
+        for elem in level:
+            if elem is target:
+                return depth
+        level = [child for elem in level for child in elem if len(child) or child is target]
+        depth += 1
+    return None
+
+
+def _tail(elem: ET.Element) -> str | None:
+    return _escape_cdata(elem.tail) if elem.tail else None
+
+
+def _escape_cdata(text: str) -> str:
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def _escape_attrib(text: str) -> str:
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    if "\t" in text:
+        text = text.replace("\t", "&#09;")
+    return text
@@ -1,6 +1,16 @@
 """Raster processing pipeline."""
 
-from mapgen.raster.config import RasterConfig
-from mapgen.raster.cli import register_raster_commands, handle_raster_command
+from typing import Any
+
+from mapgen.raster.cli import handle_raster_command, register_raster_commands
 
 __all__ = ["RasterConfig", "register_raster_commands", "handle_raster_command"]
+
+
+def __getattr__(name: str) -> Any:
+    # RasterConfig needs pydantic, which the CLI only loads for raster commands
+    if name == "RasterConfig":
+        from mapgen.raster.config import RasterConfig
+
+        return RasterConfig
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,11 @@
-"""Raster processing pipeline commands."""
+"""Raster processing pipeline commands.
+
+Building the parser imports nothing beyond the standard library; the pipeline
+is imported when a raster command runs.
+"""
 
 import argparse
 from pathlib import Path
-from typing import Sequence
-
-from mapgen.raster.config import RasterConfig
 
 
 def register_raster_commands(subparsers: argparse._SubParsersAction) -> None:
@@ -14,30 +15,52 @@ def register_raster_commands(subparsers: argparse._SubParsersAction) -> None:
         subparsers: The subparsers object from the main parser.
     """
     raster_parser = subparsers.add_parser("raster", help="Raster pipeline operations")
-    raster_subparsers = raster_parser.add_subparsers(dest="raster_command", help="Available raster commands")
+    raster_subparsers = raster_parser.add_subparsers(
+        dest="raster_command", help="Available raster commands"
+    )
 
     # Shared arguments for raster commands
     def add_common_args(parser: argparse.ArgumentParser) -> None:
         parser.add_argument("--aoi", required=True, help="AOI name")
         parser.add_argument(
-            "--cache-dir", 
-            default="cache/raster", 
-            help="Directory for intermediate raster artifacts"
+            "--cache-dir",
+            default="cache/raster",
+            help="Directory for intermediate raster artifacts",
+        )
+        # Defaults to DEFAULT_BLOCK_SIZE of the raster engine, which is not imported here
+        parser.add_argument(
+            "--block-size", type=int, help="Process rasters in blocks of this size (default: 1024)"
+        )
+        parser.add_argument("--workers", type=int, help="Process blocks in this many processes")
+        parser.add_argument(
+            "--force", action="store_true", help="Recompute artifacts even if they are up to date"
         )
 
+    def add_input_args(parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            "--input", help="Source raster (.npy or image) to ingest into the cache"
+        )
+        parser.add_argument("--window", help="AOI pixel box x0,y0,x1,y1 of the source raster")
+        # Reports option errors with the usage of the command
+        parser.set_defaults(input_parser=parser)
+
     # Process command (orchestrator)
     process_parser = raster_subparsers.add_parser("process", help="Process raster data for an AOI")
     add_common_args(process_parser)
+    add_input_args(process_parser)
 
     # Individual step commands
     denoise_parser = raster_subparsers.add_parser("denoise", help="Apply denoising filter")
     add_common_args(denoise_parser)
+    add_input_args(denoise_parser)
 
     binarize_parser = raster_subparsers.add_parser("binarize", help="Binarize raster image")
     add_common_args(binarize_parser)
     binarize_parser.add_argument("--thresholds", help="Comma-separated thresholds")
 
-    morphology_parser = raster_subparsers.add_parser("morphology", help="Apply morphological operations")
+    morphology_parser = raster_subparsers.add_parser(
+        "morphology", help="Apply morphological operations"
+    )
     add_common_args(morphology_parser)
     morphology_parser.add_argument("--iterations", type=int, help="Number of iterations")
 
@@ -51,79 +74,57 @@ def handle_raster_command(args: argparse.Namespace) -> int:
     Returns:
         Exit code.
     """
+    from mapgen.raster.commands import (
+        run_binarize,
+        run_denoise,
+        run_ingest,
+        run_morphology,
+        run_raster_process,
+    )
+    from mapgen.raster.config import RasterConfig
+    from mapgen.raster.engine import DEFAULT_BLOCK_SIZE
+
     aoi = args.aoi
     cache_dir = Path(args.cache_dir)
     config = RasterConfig()
+    block_size = args.block_size or DEFAULT_BLOCK_SIZE
+    options = {"block_size": block_size, "workers": args.workers, "force": args.force}
+    if args.raster_command in ("process", "denoise"):
+        if args.window is not None and args.input is None:
+            args.input_parser.error("--window requires --input")
+        try:
+            window = _parse_window(args.window)
+        except ValueError as e:
+            print(f"Error: Invalid window format: {e}")
+            return 1
+        if args.input is not None:
+            input_path = Path(args.input)
+            try:
+                run_ingest(aoi, cache_dir, config, input_path, window, block_size)
+            except (OSError, ValueError) as e:
+                print(f"Error: Cannot read input raster: {e}")
+                return 1
 
     if args.raster_command == "process":
-        return run_raster_process(aoi, cache_dir, config)
+        return run_raster_process(aoi, cache_dir, config, **options)
     elif args.raster_command == "denoise":
-        return run_denoise(aoi, cache_dir, config)
+        return run_denoise(aoi, cache_dir, config, **options)
     elif args.raster_command == "binarize":
         if args.thresholds:
             config.thresholds = [float(t) for t in args.thresholds.split(",")]
-        return run_binarize(aoi, cache_dir, config)
+        return run_binarize(aoi, cache_dir, config, **options)
     elif args.raster_command == "morphology":
         if args.iterations:
             config.morphology_iterations = args.iterations
-        return run_morphology(aoi, cache_dir, config)
-    
-    return 0
-
-
-def run_raster_process(aoi_name: str, cache_dir: Path, config: RasterConfig) -> int:
-    """Run the complete raster processing pipeline for a given AOI.
+        return run_morphology(aoi, cache_dir, config, **options)
 
-    Args:
-        aoi_name: Name of the AOI.
-        cache_dir: Directory for artifacts.
-        config: Pipeline configuration.
-
-    Returns:
-        Exit code.
-    """
-    target_dir = cache_dir / aoi_name
-    target_dir.mkdir(parents=True, exist_ok=True)
-    
-    print(f"Processing raster for AOI: {aoi_name}")
-    print(f"  Artifacts: {target_dir}")
-    print(f"  Config: {config.model_dump()}")
-    
-    # Step 1: Denoise
-    ret = run_denoise(aoi_name, cache_dir, config)
-    if ret != 0:
-        return ret
-        
-    # Step 2: Binarize
-    ret = run_binarize(aoi_name, cache_dir, config)
-    if ret != 0:
-        return ret
-        
-    # Step 3: Morphology
-    ret = run_morphology(aoi_name, cache_dir, config)
-    if ret != 0:
-        return ret
-    
-    print("  Status: SUCCESS")
-    return 0
-
-
-def run_denoise(aoi_name: str, cache_dir: Path, config: RasterConfig) -> int:
-    """Run denoising step."""
-    print(f"  [1/3] Denoising (denoise={config.denoise})...")
-    # TODO: Implement actual denoising
-    return 0
-
-
-def run_binarize(aoi_name: str, cache_dir: Path, config: RasterConfig) -> int:
-    """Run binarization step."""
-    print(f"  [2/3] Binarizing (thresholds={config.thresholds})...")
-    # TODO: Implement actual binarization
     return 0
 
 
-def run_morphology(aoi_name: str, cache_dir: Path, config: RasterConfig) -> int:
-    """Run morphology step."""
-    print(f"  [3/3] Morphology (iterations={config.morphology_iterations})...")
-    # TODO: Implement actual morphology
-    return 0
+def _parse_window(text: str | None) -> tuple[int, int, int, int] | None:
+    if text is None:
+        return None
+    parts = [int(v) for v in text.split(",")]
+    if len(parts) != 4:
+        raise ValueError("window must have 4 components")
+    return (parts[0], parts[1], parts[2], parts[3])
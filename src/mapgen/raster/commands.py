@@ -0,0 +1,140 @@
+"""Raster pipeline steps as run by the raster commands.
+
+These need the pipeline and its configuration, so mapgen.raster.cli imports
+this module only when a raster command runs.
+"""
+
+from collections.abc import Callable
+from pathlib import Path
+
+from mapgen.raster import pipeline
+from mapgen.raster.config import RasterConfig
+from mapgen.raster.engine import DEFAULT_BLOCK_SIZE
+
+
+def run_raster_process(
+    aoi_name: str,
+    cache_dir: Path,
+    config: RasterConfig,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+    force: bool = False,
+) -> int:
+    """Run the complete raster processing pipeline for a given AOI.
+
+    Args:
+        aoi_name: Name of the AOI.
+        cache_dir: Directory for artifacts.
+        config: Pipeline configuration.
+        block_size: Edge length of the blocks processed at once.
+        workers: Process blocks in a process pool of this size.
+        force: Recompute every stage even if its cached output is up to date.
+
+    Returns:
+        Exit code.
+    """
+    target_dir = cache_dir / aoi_name
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Processing raster for AOI: {aoi_name}")
+    print(f"  Artifacts: {target_dir}")
+    print(f"  Config: {config.model_dump()}")
+
+    # Step 1: Denoise
+    ret = run_denoise(aoi_name, cache_dir, config, block_size, workers, force)
+    if ret != 0:
+        return ret
+
+    # Step 2: Binarize
+    ret = run_binarize(aoi_name, cache_dir, config, block_size, workers, force)
+    if ret != 0:
+        return ret
+
+    # Step 3: Morphology
+    ret = run_morphology(aoi_name, cache_dir, config, block_size, workers, force)
+    if ret != 0:
+        return ret
+
+    print("  Status: SUCCESS")
+    return 0
+
+
+def run_denoise(
+    aoi_name: str,
+    cache_dir: Path,
+    config: RasterConfig,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+    force: bool = False,
+) -> int:
+    """Run denoising step."""
+    print(f"  [1/3] Denoising (denoise={config.denoise})...")
+    return _run_stage(
+        lambda target: pipeline.denoise(target, config.denoise, block_size, workers, force),
+        cache_dir / aoi_name,
+    )
+
+
+def run_binarize(
+    aoi_name: str,
+    cache_dir: Path,
+    config: RasterConfig,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+    force: bool = False,
+) -> int:
+    """Run binarization step."""
+    print(f"  [2/3] Binarizing (thresholds={config.thresholds})...")
+    return _run_stage(
+        lambda target: pipeline.binarize(target, config.thresholds, block_size, workers, force),
+        cache_dir / aoi_name,
+    )
+
+
+def run_morphology(
+    aoi_name: str,
+    cache_dir: Path,
+    config: RasterConfig,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+    force: bool = False,
+) -> int:
+    """Run morphology step."""
+    print(f"  [3/3] Morphology (iterations={config.morphology_iterations})...")
+    return _run_stage(
+        lambda target: pipeline.morphology(
+            target, config.morphology_iterations, block_size, workers, force
+        ),
+        cache_dir / aoi_name,
+    )
+
+
+def _run_stage(stage: Callable[[Path], pipeline.StageOutput], target_dir: Path) -> int:
+    """Runs a pipeline stage and reports whether its output was reused; an AOI
+    without an ingested raster has nothing to process."""
+    try:
+        output = stage(target_dir)
+    except FileNotFoundError as e:
+        print(f"    Skipped: {e}")
+        return 0
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    if output.cached:
+        print(f"    Cache hit: {output.path}")
+    else:
+        print(f"    Wrote {output.path}")
+    return 0
+
+
+def run_ingest(
+    aoi_name: str,
+    cache_dir: Path,
+    config: RasterConfig,
+    input_path: Path,
+    window: tuple[int, int, int, int] | None,
+    block_size: int,
+) -> None:
+    """Copies the AOI's window of a source raster into its cache directory."""
+    path = pipeline.ingest(input_path, cache_dir / aoi_name, window, config.margin_px, block_size)
+    print(f"Ingested {input_path} -> {path}")
@@ -0,0 +1,158 @@
+"""Block-wise processing of memory-mapped rasters.
+
+Rasters are stored as .npy files and memory-mapped, so a stage never holds more
+than one block of its input and output in memory. A block is read together
+with a halo of neighbouring pixels; where the halo reaches past the raster edge
+it is filled by mirroring the raster (NumPy's "symmetric" padding, SciPy's
+"reflect" mode). A filter whose reach is at most the halo therefore gives the
+same result as on the whole raster with reflected borders, whatever the block
+size. Blocks are independent, so they can be spread over a process pool.
+
+Boolean rasters can be stored bit-packed along the last axis (np.packbits, 8
+pixels per byte, first pixel in the high bit); their width is then passed
+separately, since the packed shape rounds it up to a whole byte.
+"""
+
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Edge length of the blocks a stage processes at once
+DEFAULT_BLOCK_SIZE = 1024
+
+Block = tuple[int, int, int, int]
+BlockFunction = Callable[[np.ndarray], np.ndarray]
+
+
+def open_raster(path: str | Path) -> np.ndarray:
+    """Memory-maps a raster read-only."""
+    raster: np.memmap = np.load(path, mmap_mode="r")
+    return raster
+
+
+def create_raster(path: str | Path, shape: Sequence[int], dtype: np.dtype | type) -> np.memmap:
+    """Creates a raster file and memory-maps it for writing."""
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(shape))
+
+
+def raster_blocks(height: int, width: int, block_size: int) -> list[Block]:
+    """Splits a raster into (row0, row1, col0, col1) blocks."""
+    if block_size < 1:
+        raise ValueError(f"block_size must be positive, got {block_size}")
+    return [
+        (r, min(r + block_size, height), c, min(c + block_size, width))
+        for r in range(0, height, block_size)
+        for c in range(0, width, block_size)
+    ]
+
+
+def packed_width(width: int) -> int:
+    """Bytes per row of a bit-packed raster ``width`` pixels wide."""
+    return -(-width // 8)
+
+
+def read_block(src: np.ndarray, block: Block, halo: int, width: int | None = None) -> np.ndarray:
+    """
+    Reads a block of the last two axes of a raster with a halo of ``halo``
+    pixels, mirroring the raster where the halo leaves it.
+
+    A bit-packed raster is given with its ``width`` in pixels and is unpacked
+    into a boolean block.
+    """
+    h = src.shape[-2]
+    w = src.shape[-1] if width is None else width
+    r0, r1, c0, c1 = block
+    a0, a1 = max(r0 - halo, 0), min(r1 + halo, h)
+    b0, b1 = max(c0 - halo, 0), min(c1 + halo, w)
+    if width is None:
+        data = np.asarray(src[..., a0:a1, b0:b1])
+    else:
+        packed = np.asarray(src[..., a0:a1, b0 // 8 : packed_width(b1)])
+        start = b0 - b0 // 8 * 8
+        data = np.unpackbits(packed, axis=-1)[..., start : start + b1 - b0].view(bool)
+    pad = [(a0 - (r0 - halo), r1 + halo - a1), (b0 - (c0 - halo), c1 + halo - b1)]
+    if any(before or after for before, after in pad):
+        data = np.pad(data, [(0, 0)] * (src.ndim - 2) + pad, mode="symmetric")
+    return data
+
+
+def process_raster(
+    fn: BlockFunction,
+    src_path: str | Path,
+    dst_path: str | Path,
+    shape: Sequence[int],
+    dtype: np.dtype | type,
+    halo: int = 0,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+    src_width: int | None = None,
+    pack: bool = False,
+) -> None:
+    """
+    Applies a function to a raster block by block and writes the result.
+
+    Args:
+        fn: Maps a block with its halo, shaped (..., h + 2 * halo, w + 2 * halo),
+            to an output of the same height and width; the halo is cropped off.
+            It must be picklable to run in a pool, e.g. a functools.partial of
+            a module-level function.
+        src_path: Input .npy raster; blocks split its last two axes.
+        dst_path: Output .npy raster. It is written under a temporary name and
+            renamed once complete, so it never exists half-written.
+        shape: Shape of the output in pixels; its last two axes must match the
+            input.
+        dtype: Data type of the output; bool if ``pack``.
+        halo: Pixels of context each block needs on every side.
+        block_size: Edge length of the blocks.
+        workers: Process blocks in a process pool of this size.
+        src_width: Width in pixels of a bit-packed input.
+        pack: Store the boolean output bit-packed.
+    """
+    dst_path = Path(dst_path)
+    tmp_path = dst_path.with_name(dst_path.name + ".tmp.npy")
+    h = open_raster(src_path).shape[-2]
+    w = open_raster(src_path).shape[-1] if src_width is None else src_width
+    if tuple(shape[-2:]) != (h, w):
+        raise ValueError(f"Output shape {tuple(shape)} does not match the input's {(h, w)}")
+    if pack:
+        shape = (*shape[:-1], packed_width(shape[-1]))
+        dtype = np.uint8
+        # Blocks must start on whole bytes so that they never share one
+        block_size = -(-block_size // 8) * 8
+    dst = create_raster(tmp_path, shape, dtype)
+    del dst  # Flushes the header; blocks write through their own maps
+
+    blocks = raster_blocks(h, w, block_size)
+    args = (fn, str(src_path), str(tmp_path), halo, src_width, pack)
+    if workers is None or workers <= 1 or len(blocks) <= 1:
+        _process_blocks(*args, blocks)
+    else:
+        chunks = [blocks[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_process_blocks, *([arg] * len(chunks) for arg in args), chunks))
+    tmp_path.replace(dst_path)
+
+
+def _process_blocks(
+    fn: BlockFunction,
+    src_path: str,
+    dst_path: str,
+    halo: int,
+    src_width: int | None,
+    pack: bool,
+    blocks: list[Block],
+) -> None:
+    src = open_raster(src_path)
+    dst = np.load(dst_path, mmap_mode="r+")
+    for block in blocks:
+        r0, r1, c0, c1 = block
+        out = fn(read_block(src, block, halo, src_width))
+        if halo:
+            out = out[..., halo:-halo, halo:-halo]
+        if pack:
+            dst[..., r0:r1, c0 // 8 : packed_width(c1)] = np.packbits(out, axis=-1)
+        else:
+            dst[..., r0:r1, c0:c1] = out
+    dst.flush()
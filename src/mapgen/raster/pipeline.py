@@ -0,0 +1,352 @@
+"""Raster pipeline stages.
+
+Each stage reads the previous stage's raster from an AOI's cache directory and
+writes its own, block by block (see mapgen.raster.engine):
+
+``input.npy``
+    The 8-bit grayscale AOI raster, written by ingest.
+``denoised.npy``
+    The input after a median filter.
+``binary.npy``
+    One mask per threshold; a pixel is set where the raster is darker than the
+    threshold. Masks are bit-packed planes of shape (thresholds, H, ceil(W / 8));
+    ``binary.json`` records the width and the threshold of each plane.
+``morphology.npy``
+    The masks after removing salt and pepper noise, stored like binary.npy.
+
+Every stage output has a JSON sidecar holding its cache key, and a stage is
+skipped while the key of its existing output is unchanged (see _run_cached).
+
+load_planes reads selected planes of a mask raster.
+"""
+
+import hashlib
+import json
+from collections.abc import Callable, Sequence
+from functools import cache, partial
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+from scipy import ndimage
+
+from mapgen.images import load_image
+from mapgen.omap.cache import file_sha256
+from mapgen.raster import engine
+from mapgen.raster.engine import DEFAULT_BLOCK_SIZE, create_raster, open_raster, process_raster
+
+INPUT_FILE = "input.npy"
+INPUT_META_FILE = "input.json"
+DENOISED_FILE = "denoised.npy"
+BINARY_FILE = "binary.npy"
+MORPHOLOGY_FILE = "morphology.npy"
+
+# Compare-exchange steps of a sorting network that puts the median of 9 values
+# at index 4 (Paeth, Graphics Gems); pixels are numbered row by row in a 3x3
+# neighbourhood
+_MEDIAN9_NETWORK = (
+    (1, 2),
+    (4, 5),
+    (7, 8),
+    (0, 1),
+    (3, 4),
+    (6, 7),
+    (1, 2),
+    (4, 5),
+    (7, 8),
+    (0, 3),
+    (5, 8),
+    (4, 7),
+    (3, 6),
+    (1, 4),
+    (2, 5),
+    (4, 7),
+    (4, 2),
+    (6, 4),
+    (4, 2),
+)
+
+Window = tuple[int, int, int, int]
+
+
+class StageOutput(NamedTuple):
+    """The output raster of a stage and whether it was reused from the cache."""
+
+    path: Path
+    cached: bool
+
+
+def ingest(
+    source: str | Path,
+    target_dir: Path,
+    window: Window | None = None,
+    margin_px: int = 0,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Path:
+    """
+    Copies the AOI's part of a source raster into the cache as ``input.npy``.
+
+    The SHA-256 of the copied pixels is recorded in ``input.json``; the cache
+    keys of the later stages derive from it.
+
+    Args:
+        source: An 8-bit grayscale .npy raster, which is memory-mapped and copied
+            in strips, or an image file PIL can read, which is decoded whole.
+        target_dir: The AOI's cache directory.
+        window: The AOI as an (x0, y0, x1, y1) pixel box of the source; defaults
+            to the whole raster.
+        margin_px: Pixels of context kept around the window, clipped to the
+            source, so later stages have no edge effects inside the AOI.
+        block_size: Strips of about ``block_size`` squared pixels are copied at
+            once.
+
+    Returns:
+        Path of the ingested raster.
+    """
+    source = Path(source)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    src = open_raster(source) if source.suffix == ".npy" else load_image(str(source), "L")
+    if src.ndim != 2 or src.dtype != np.uint8:
+        raise ValueError(f"Input raster must be 8-bit grayscale, got {src.dtype} {src.shape}")
+
+    h, w = src.shape
+    x0, y0, x1, y1 = window if window is not None else (0, 0, w, h)
+    if not (0 <= x0 < x1 <= w and 0 <= y0 < y1 <= h):
+        raise ValueError(f"Window {(x0, y0, x1, y1)} is not inside the {w}x{h} raster")
+    x0, y0 = max(x0 - margin_px, 0), max(y0 - margin_px, 0)
+    x1, y1 = min(x1 + margin_px, w), min(y1 + margin_px, h)
+
+    path = target_dir / INPUT_FILE
+    tmp_path = target_dir / (INPUT_FILE + ".tmp.npy")
+    dst = create_raster(tmp_path, (y1 - y0, x1 - x0), np.uint8)
+    # Whole rows are hashed in order, so the key does not depend on block_size
+    digest = hashlib.sha256(f"{y1 - y0}x{x1 - x0}\0".encode())
+    rows = max(1, block_size * block_size // (x1 - x0))
+    for r in range(y0, y1, rows):
+        strip = np.ascontiguousarray(src[r : min(r + rows, y1), x0:x1])
+        dst[r - y0 : r - y0 + len(strip)] = strip
+        digest.update(strip.data)
+    dst.flush()
+    del dst
+    # The old key must not vouch for the new pixels if we stop before writing
+    # the new one
+    (target_dir / INPUT_META_FILE).unlink(missing_ok=True)
+    tmp_path.replace(path)
+
+    meta = {
+        "source": str(source),
+        "window": window,
+        "extent": [x0, y0, x1, y1],
+        "key": digest.hexdigest(),
+    }
+    with open(target_dir / INPUT_META_FILE, "w") as f:
+        json.dump(meta, f, indent=2)
+    return path
+
+
+def denoise(
+    target_dir: Path,
+    enabled: bool = True,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+    force: bool = False,
+) -> StageOutput:
+    """
+    Median-filters ``input.npy`` with a 3x3 window into ``denoised.npy``;
+    copies it if not enabled.
+    """
+
+    def run(src: Path, dst: Path) -> dict[str, Any]:
+        fn, halo = (_median3x3_block, 1) if enabled else (np.asarray, 0)
+        process_raster(fn, src, dst, open_raster(src).shape, np.uint8, halo, block_size, workers)
+        return {}
+
+    return _run_cached(target_dir, DENOISED_FILE, INPUT_FILE, {"denoise": enabled}, run, force)
+
+
+def binarize(
+    target_dir: Path,
+    thresholds: Sequence[float],
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+    force: bool = False,
+) -> StageOutput:
+    """
+    Thresholds ``denoised.npy`` into the bit planes of ``binary.npy``.
+
+    Thresholds are fractions of full intensity; all of them are applied in one
+    pass over the raster, and each block is packed before it is written.
+    """
+    levels = _levels(thresholds)
+
+    def run(src: Path, dst: Path) -> dict[str, Any]:
+        h, w = open_raster(src).shape
+        fn = partial(_threshold_block, levels=levels)
+        process_raster(
+            fn, src, dst, (len(thresholds), h, w), bool, 0, block_size, workers, pack=True
+        )
+        return {"width": w, "thresholds": list(thresholds)}
+
+    params = {"thresholds": list(thresholds)}
+    return _run_cached(target_dir, BINARY_FILE, DENOISED_FILE, params, run, force)
+
+
+def morphology(
+    target_dir: Path,
+    iterations: int,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+    force: bool = False,
+) -> StageOutput:
+    """
+    Removes salt and pepper noise from the masks of ``binary.npy`` into
+    ``morphology.npy``.
+
+    Each mask is opened, removing set specks, then closed, filling holes, with
+    ``iterations`` steps of a 3x3 square each, like SciPy's binary_opening and
+    binary_closing with that structure.
+    """
+
+    def run(src: Path, dst: Path) -> dict[str, Any]:
+        meta = read_mask_meta(src)
+        shape = (*open_raster(src).shape[:-1], meta["width"])
+        fn = partial(_open_close_block, iterations=iterations)
+        # Opening and closing each erode and dilate ``iterations`` times
+        halo = 4 * max(iterations, 0)
+        process_raster(
+            fn, src, dst, shape, bool, halo, block_size, workers, src_width=meta["width"], pack=True
+        )
+        return {"width": meta["width"], "thresholds": meta["thresholds"]}
+
+    params = {"iterations": iterations}
+    return _run_cached(target_dir, MORPHOLOGY_FILE, BINARY_FILE, params, run, force)
+
+
+def load_planes(path: str | Path, planes: Sequence[int] | None = None) -> np.ndarray:
+    """
+    Loads planes of a mask raster, such as binary.npy, as booleans.
+
+    Args:
+        path: The mask raster.
+        planes: Indices of the planes to load, e.g. of the thresholds in
+            read_mask_meta; defaults to all. Only these planes are read.
+
+    Returns:
+        A (len(planes), H, W) boolean array.
+    """
+    width = read_mask_meta(path)["width"]
+    packed = open_raster(path)
+    if planes is not None:
+        packed = packed[list(planes)]
+    return np.unpackbits(packed, axis=-1, count=width).view(bool)
+
+
+def read_mask_meta(path: str | Path) -> dict[str, Any]:
+    """Reads the width and per-plane thresholds of a mask raster."""
+    with open(Path(path).with_suffix(".json")) as f:
+        meta: dict[str, Any] = json.load(f)
+    return meta
+
+
+def _run_cached(
+    target_dir: Path,
+    name: str,
+    input_name: str,
+    params: dict[str, Any],
+    run: Callable[[Path, Path], dict[str, Any]],
+    force: bool,
+) -> StageOutput:
+    """
+    Runs a stage unless its output is up to date.
+
+    The stage key hashes the key of the input raster, the parameters the stage
+    depends on and the pipeline code. Keys chain back to the content hash of
+    the ingested raster, so a stage runs again exactly when something it
+    derives from has changed. ``run`` writes the output and returns the rest of
+    its sidecar.
+    """
+    src = _stage_input(target_dir, input_name)
+    dst = target_dir / name
+    key = _stage_key(name, _artifact_key(src), params)
+    if not force and dst.exists() and _read_sidecar(dst).get("key") == key:
+        return StageOutput(dst, True)
+
+    # Drop the old key first, so an interrupted run cannot leave it vouching
+    # for a new output
+    dst.with_suffix(".json").unlink(missing_ok=True)
+    meta = run(src, dst)
+    meta["key"] = key
+    with open(dst.with_suffix(".json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return StageOutput(dst, False)
+
+
+def _stage_key(name: str, input_key: str, params: dict[str, Any]) -> str:
+    key = {"stage": name, "input": input_key, "params": params, "code": _code_fingerprint()}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _artifact_key(path: Path) -> str:
+    """The recorded key of a raster, or its file hash if it has none."""
+    key = _read_sidecar(path).get("key")
+    return key if isinstance(key, str) else file_sha256(path)
+
+
+@cache
+def _code_fingerprint() -> str:
+    """Hashes the source of the pipeline stages and the block engine."""
+    digest = hashlib.sha256()
+    for module in (__file__, engine.__file__):
+        digest.update(Path(module).read_bytes() + b"\0")
+    return digest.hexdigest()
+
+
+def _read_sidecar(path: Path) -> dict[str, Any]:
+    try:
+        with open(path.with_suffix(".json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def _stage_input(target_dir: Path, name: str) -> Path:
+    path = target_dir / name
+    if not path.exists():
+        raise FileNotFoundError(f"No {name} in {target_dir}")
+    return path
+
+
+def _levels(thresholds: Sequence[float]) -> list[float]:
+    for t in thresholds:
+        if not 0 <= t <= 1:
+            raise ValueError(f"Thresholds must be between 0 and 1, got {t}")
+    return [t * 255 for t in thresholds]
+
+
+def _threshold_block(block: np.ndarray, levels: list[float]) -> np.ndarray:
+    return block[None] < np.array(levels)[:, None, None]
+
+
+def _median3x3_block(block: np.ndarray) -> np.ndarray:
+    """3x3 median of the interior of a block; the border is left as it is."""
+    h, w = block.shape[0] - 2, block.shape[1] - 2
+    p = [block[dy : dy + h, dx : dx + w] for dy in range(3) for dx in range(3)]
+    for i, j in _MEDIAN9_NETWORK:
+        p[i], p[j] = np.minimum(p[i], p[j]), np.maximum(p[i], p[j])
+    out = block.copy()
+    out[1:-1, 1:-1] = p[4]
+    return out
+
+
+def _open_close_block(block: np.ndarray, iterations: int) -> np.ndarray:
+    if iterations < 1:
+        return block
+    # n steps of a 3x3 square erode or dilate like one (2n + 1)-square, and a
+    # square min or max filter is separable
+    size = 2 * iterations + 1
+    out = np.empty_like(block)
+    for i, mask in enumerate(block.view(np.uint8)):
+        mask = ndimage.maximum_filter(ndimage.minimum_filter(mask, size), size)
+        out[i] = ndimage.minimum_filter(ndimage.maximum_filter(mask, size), size)
+    return out
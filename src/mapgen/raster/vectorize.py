@@ -0,0 +1,529 @@
+"""Vectorization of mask rasters into OMap area and line objects.
+
+Boundaries are traced along pixel edges: every edge between a set and an unset
+pixel is a unit segment, directed so that the set pixel is on its left, and the
+raster is unset outside. Every boundary is then a closed ring. Rings around set
+regions (outer rings) and rings around their holes have opposite orientations.
+Set pixels touching at a corner belong to the same region (8-connectivity).
+
+A mask is traced in tiles, which are independent and can be spread over a
+process pool. A tile links its edges into chains with vectorized pointer
+jumping. A chain that leaves the tile is stitched to the chain continuing it in
+the neighbouring tile, which is identified by the next edge of the boundary.
+"""
+
+import xml.etree.ElementTree as ET
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from mapgen.omap.model import COORD_CLOSE_POINT, COORD_HOLE_POINT, Object, ObjectStore, OMapDocument
+from mapgen.omap.simplify import simplify_polylines
+from mapgen.omap.writer import OMAP_NAMESPACE, object_element
+from mapgen.raster.engine import DEFAULT_BLOCK_SIZE, Block, open_raster, raster_blocks, read_block
+from mapgen.raster.pipeline import read_mask_meta
+
+# Default simplification tolerance, in pixels; removes the staircase of
+# pixel edges along slanted boundaries
+DEFAULT_TOLERANCE_PX = 1.0
+
+OBJECT_KINDS = ("areas", "lines", "both")
+
+# Unit steps of the edge directions east, south, west and north, with y down
+_DX = np.array([1, 0, -1, 0])
+_DY = np.array([0, 1, 0, -1])
+# (row, col) offset from a vertex to the pixel ahead and to the left when
+# arriving in each direction; the pixel ahead and to the right is that of the
+# next direction clockwise
+_AHEAD_LEFT = np.array([[-1, 0], [0, 0], [0, -1], [-1, -1]])
+
+
+class Rings(NamedTuple):
+    """
+    Boundary rings of one mask.
+
+    Ring ``i`` has the pixel-corner vertices ``vertices[offsets[i]:offsets[i + 1]]``,
+    without repeating the first one. ``owner[i]`` is ``i`` for an outer ring and
+    the outer ring of the enclosing region for a hole.
+    """
+
+    vertices: np.ndarray
+    offsets: np.ndarray
+    owner: np.ndarray
+
+
+class _Chains(NamedTuple):
+    """Traced chains of a tile; open chains also end with their last vertex."""
+
+    vertices: np.ndarray
+    offsets: np.ndarray
+    closed: np.ndarray
+    start_keys: np.ndarray  # Key of the first edge of each open chain
+    end_keys: np.ndarray  # Key of the edge continuing each open chain
+
+
+def trace_rings(
+    path: str,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+) -> list[Rings]:
+    """
+    Traces the boundaries of every plane of a mask raster, e.g. morphology.npy.
+
+    Args:
+        path: A bit-packed mask raster written by the raster pipeline.
+        block_size: Edge length of the tiles traced at once.
+        workers: Trace tiles in a process pool of this size.
+
+    Returns:
+        The rings of each plane. They do not depend on block_size or workers.
+    """
+    width = read_mask_meta(path)["width"]
+    n_planes, height = open_raster(path).shape[:2]
+    tasks = [
+        (plane, block)
+        for plane in range(n_planes)
+        for block in raster_blocks(height, width, block_size)
+    ]
+    if workers is None or workers <= 1 or len(tasks) <= 1:
+        traced = _trace_tiles(str(path), width, tasks)
+    else:
+        chunks = [tasks[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_trace_tiles, [str(path)] * workers, [width] * workers, chunks))
+        slots: list[_Chains | None] = [None] * len(tasks)
+        for i, result in enumerate(results):
+            slots[i::workers] = result
+        traced = [t for t in slots if t is not None]
+
+    tiles_per_plane = len(tasks) // n_planes
+    return [
+        _find_holes(*_stitch(traced[p * tiles_per_plane : (p + 1) * tiles_per_plane]), width)
+        for p in range(n_planes)
+    ]
+
+
+def vectorize(
+    path: str,
+    bbox: tuple[float, float, float, float] | None = None,
+    objects: str = "both",
+    tolerance_px: float = DEFAULT_TOLERANCE_PX,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+) -> OMapDocument:
+    """
+    Turns a mask raster into an OMap document.
+
+    Each plane gets an area symbol, filled with a gray of its threshold, and a
+    line symbol for its contours. Regions become area objects with their holes;
+    contours are closed lines along every ring.
+
+    Args:
+        path: A bit-packed mask raster written by the raster pipeline.
+        bbox: (xmin, ymin, xmax, ymax) of the raster in map units, with y up.
+            Defaults to one map unit per pixel.
+        objects: "areas", "lines" or "both".
+        tolerance_px: Maximum deviation of the simplified outlines, in pixels.
+        block_size: Edge length of the tiles traced at once.
+        workers: Trace tiles in a process pool of this size.
+
+    Returns:
+        A document with one map part holding all objects.
+    """
+    doc, records = vectorize_stream(path, bbox, objects, tolerance_px, block_size, workers)
+    objects_elem = doc.root.find("omap:parts/omap:part/omap:objects", doc.ns)
+    assert objects_elem is not None
+    objects_elem.extend(map(object_element, records))
+    objects_elem.set("count", str(len(objects_elem)))
+    return doc
+
+
+def vectorize_stream(
+    path: str,
+    bbox: tuple[float, float, float, float] | None = None,
+    objects: str = "both",
+    tolerance_px: float = DEFAULT_TOLERANCE_PX,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int | None = None,
+) -> tuple[OMapDocument, Iterator[Object]]:
+    """
+    Like vectorize, but yields the objects instead of adding them.
+
+    The masks are traced up front; the objects are built as they are consumed,
+    so they can go straight to ``save_omap(doc, path, objects)``.
+
+    Returns:
+        A tuple (doc, objects): the document with its colors and symbols and
+        an empty map part, and the Object records of that part.
+    """
+    if objects not in OBJECT_KINDS:
+        raise ValueError(f"objects must be one of {', '.join(OBJECT_KINDS)}, got {objects!r}")
+    thresholds = read_mask_meta(path)["thresholds"]
+    height, width = open_raster(path).shape[1], read_mask_meta(path)["width"]
+    xmin, ymin, xmax, ymax = bbox if bbox is not None else (0, 0, width, height)
+    scale = np.array([(xmax - xmin) / width, -(ymax - ymin) / height])
+    origin = np.array([xmin, ymax])
+
+    root = ET.Element(_tag("map"), version="9")
+    colors = ET.SubElement(root, _tag("colors"), count=str(len(thresholds)))
+    symbols = ET.SubElement(root, _tag("symbols"), count=str(2 * len(thresholds)))
+    parts = ET.SubElement(root, _tag("parts"), count="1", current="0")
+    ET.SubElement(ET.SubElement(parts, _tag("part"), name="default"), _tag("objects"), count="0")
+    line_width = max(1, round(abs(scale[0])))
+    for plane, threshold in enumerate(thresholds):
+        _add_plane_symbols(colors, symbols, plane, threshold, line_width)
+    planes = [_simplify(rings, tolerance_px) for rings in trace_rings(path, block_size, workers)]
+
+    def records() -> Iterator[Object]:
+        # Contours are drawn over the areas
+        for kind in ("areas", "lines"):
+            if objects not in (kind, "both"):
+                continue
+            for plane, (vertices, flags, offsets, owner) in enumerate(planes):
+                coords = np.rint(vertices * scale + origin)
+                if kind == "areas":
+                    store = _area_store(coords, flags, offsets, owner, 2 * plane)
+                else:
+                    store = _line_store(coords, flags, offsets, 2 * plane + 1)
+                for i in range(len(store.types)):
+                    yield Object(store, i)
+
+    return OMapDocument(root), records()
+
+
+def _trace_tiles(path: str, width: int, tasks: Sequence[tuple[int, Block]]) -> list[_Chains]:
+    src = open_raster(path)
+    return [_trace_tile(src[plane], width, block) for plane, block in tasks]
+
+
+def _trace_tile(src: np.ndarray, width: int, block: Block) -> _Chains:
+    """Traces the boundary edges owned by a tile into chains."""
+    height = src.shape[0]
+    r0, r1, c0, c1 = block
+    h, w = r1 - r0, c1 - c0
+    px = read_block(src, block, 1, width)
+    # Outside the raster is unset, so the halo is not mirrored there
+    if r0 == 0:
+        px[0] = False
+    if r1 == height:
+        px[-1] = False
+    if c0 == 0:
+        px[:, 0] = False
+    if c1 == width:
+        px[:, -1] = False
+
+    # A tile owns the edges starting its rows and columns of pixel corners; the
+    # last tiles also own the corners on the far raster edges
+    nh, nw = h + (r1 == height), w + (c1 == width)
+    above, below = px[:nh, 1 : w + 1], px[1 : nh + 1, 1 : w + 1]
+    left, right = px[1 : h + 1, :nw], px[1 : h + 1, 1 : nw + 1]
+    xs: list[np.ndarray] = []
+    ys: list[np.ndarray] = []
+    ds: list[np.ndarray] = []
+    # Edge mask, start vertex relative to the corner of its index, direction
+    for mask, sx, sy, direction in (
+        (above & ~below, 0, 0, 0),
+        (right & ~left, 0, 0, 1),
+        (below & ~above, 1, 0, 2),
+        (left & ~right, 0, 1, 3),
+    ):
+        i, j = np.nonzero(mask)
+        xs.append(c0 + j + sx)
+        ys.append(r0 + i + sy)
+        ds.append(np.full(len(i), direction))
+    x, y, d = np.concatenate(xs), np.concatenate(ys), np.concatenate(ds)
+    keys = _edge_keys(x, y, d, width)
+    order = np.argsort(keys, kind="stable")
+    x, y, d, keys = x[order], y[order], d[order], keys[order]
+
+    # The next edge turns right if the pixel ahead on the right is set, goes
+    # straight if only the one on the left is, and turns left otherwise
+    ex, ey = x + _DX[d], y + _DY[d]
+    ahead_left = px[ey + _AHEAD_LEFT[d, 0] - r0 + 1, ex + _AHEAD_LEFT[d, 1] - c0 + 1]
+    right_d = (d + 1) % 4
+    ahead_right = px[ey + _AHEAD_LEFT[right_d, 0] - r0 + 1, ex + _AHEAD_LEFT[right_d, 1] - c0 + 1]
+    next_d = np.where(ahead_right, right_d, np.where(ahead_left, d, (d + 3) % 4))
+    next_keys = _edge_keys(ex, ey, next_d, width)
+    pos = np.minimum(np.searchsorted(keys, next_keys), max(len(keys) - 1, 0))
+    succ = np.where(keys[pos] == next_keys, pos, -1) if len(keys) else pos
+
+    seq, chain_offsets, closed = _order_chains(succ)
+    n_chains = len(closed)
+    chain = np.repeat(np.arange(n_chains), np.diff(chain_offsets))
+    heads, tails = seq[chain_offsets[:-1]], seq[chain_offsets[1:] - 1]
+    # Only corners are kept, plus the first vertex of every chain
+    keep = np.ones(len(seq), dtype=bool)
+    keep[1:] = d[seq[1:]] != d[seq[:-1]]
+    keep[chain_offsets[:-1]] = True
+    kept = seq[keep]
+    open_ids = np.flatnonzero(~closed)
+    vertices = np.concatenate(
+        [
+            np.stack([x[kept], y[kept]], axis=1),
+            np.stack([ex[tails[open_ids]], ey[tails[open_ids]]], axis=1),
+        ]
+    )
+    vertex_chain = np.concatenate([chain[keep], open_ids])
+    order = np.argsort(vertex_chain, kind="stable")
+    counts = np.bincount(vertex_chain, minlength=n_chains)
+    return _Chains(
+        vertices[order],
+        np.concatenate([[0], np.cumsum(counts)]),
+        closed,
+        keys[heads[open_ids]],
+        next_keys[tails[open_ids]],
+    )
+
+
+def _edge_keys(x: np.ndarray, y: np.ndarray, d: np.ndarray, width: int) -> np.ndarray:
+    """Identifies edges by their start vertex and direction."""
+    keys: np.ndarray = (y.astype(np.int64) * (width + 1) + x) * 4 + d
+    return keys
+
+
+def _order_chains(succ: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Orders the edges of a successor graph into chains.
+
+    ``succ`` maps every edge to the next one, or to -1 at the end of an open
+    chain. Cycles are opened after their smallest edge. All steps are pointer
+    jumping passes, so the number of Python-level steps is logarithmic in the
+    chain length.
+
+    Returns:
+        A tuple (seq, offsets, closed): the edges chain by chain, the offsets
+        of the chains in ``seq``, and whether each chain is a cycle.
+    """
+    n = len(succ)
+    idx = np.arange(n)
+    steps = max(n.bit_length(), 1)
+    nxt = np.where(succ >= 0, succ, idx)
+    for _ in range(steps):
+        nxt = nxt[nxt]
+    on_cycle = succ[nxt] >= 0 if n else np.zeros(0, dtype=bool)
+
+    low = idx.copy()
+    jump = np.where(on_cycle, succ, idx)
+    for _ in range(steps):
+        low = np.minimum(low, low[jump])
+        jump = jump[jump]
+    succ = np.where(on_cycle & (succ == low), -1, succ)
+
+    # Distance of every edge to the end of its chain
+    nxt = np.where(succ >= 0, succ, idx)
+    dist = (succ >= 0).astype(np.int64)
+    for _ in range(steps):
+        dist = dist + dist[nxt]
+        nxt = nxt[nxt]
+    seq = np.lexsort((-dist, nxt))
+    tails = nxt[seq]
+    if n:
+        starts = np.flatnonzero(np.r_[True, tails[1:] != tails[:-1]])
+    else:
+        starts = np.zeros(0, dtype=np.int64)
+    offsets = np.concatenate([starts, [n]])
+    return seq, offsets, on_cycle[seq[starts]]
+
+
+def _stitch(tiles: Sequence[_Chains]) -> tuple[np.ndarray, np.ndarray]:
+    """Joins the chains of neighbouring tiles into rings."""
+    rings: list[np.ndarray] = []
+    open_chains: dict[int, tuple[int, np.ndarray]] = {}
+    for tile in tiles:
+        counts = np.diff(tile.offsets)
+        rings.append(tile.vertices[np.repeat(tile.closed, counts)])
+        for i, chain in enumerate(np.flatnonzero(~tile.closed)):
+            vertices = tile.vertices[tile.offsets[chain] : tile.offsets[chain + 1]]
+            open_chains[int(tile.start_keys[i])] = (int(tile.end_keys[i]), vertices)
+    ring_counts = [np.diff(tile.offsets)[tile.closed] for tile in tiles]
+
+    # Every open chain ends where the chain continuing it starts
+    while open_chains:
+        first, (end, vertices) = open_chains.popitem()
+        parts = [vertices[:-1]]
+        while end != first:
+            end, vertices = open_chains.pop(end)
+            parts.append(vertices[:-1])
+        ring = np.concatenate(parts)
+        rings.append(ring)
+        ring_counts.append(np.array([len(ring)]))
+
+    counts = np.concatenate(ring_counts) if ring_counts else np.zeros(0, dtype=np.int64)
+    vertices = np.concatenate(rings) if rings else np.zeros((0, 2), dtype=np.int64)
+    return vertices.astype(np.int64), np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def _find_holes(vertices: np.ndarray, offsets: np.ndarray, width: int) -> Rings:
+    """
+    Drops the vertices left between collinear edges at chain joins and finds
+    the outer ring of every hole.
+
+    The pixel left of a hole's leftmost vertical edge is set; the first edge on
+    its left in the same row bounds the same region, as its outer ring or as a
+    hole further left. Following these links from hole to hole ends at the
+    region's outer ring.
+    """
+    n_rings = len(offsets) - 1
+    nxt, prev = _ring_neighbours(offsets)
+    d1, d2 = vertices - vertices[prev], vertices[nxt] - vertices
+    keep = d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0] != 0
+    if n_rings:
+        counts = np.add.reduceat(keep.astype(np.int64), offsets[:-1])
+    else:
+        counts = np.zeros(0, dtype=np.int64)
+    vertices = vertices[keep]
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    nxt, _ = _ring_neighbours(offsets)
+    ring = np.repeat(np.arange(n_rings), counts)
+
+    x, y = vertices[:, 0], vertices[:, 1]
+    area2 = x * y[nxt] - x[nxt] * y
+    is_hole = (np.add.reduceat(area2, offsets[:-1]) > 0) if n_rings else np.zeros(0, dtype=bool)
+
+    # Unit vertical edges of all rings by row, sorted by (row, x)
+    vertical = np.flatnonzero(x == x[nxt])
+    top = np.minimum(y[vertical], y[nxt][vertical])
+    lengths = np.abs(y[nxt][vertical] - y[vertical])
+    first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    rows = np.repeat(top, lengths) + np.arange(int(lengths.sum())) - first
+    row_keys = rows * (width + 1) + np.repeat(x[vertical], lengths)
+    order = np.argsort(row_keys, kind="stable")
+    row_keys, row_rings = row_keys[order], np.repeat(ring[vertical], lengths)[order]
+
+    # Leftmost vertical edge of every hole
+    hole_edges = vertical[is_hole[ring[vertical]]]
+    hole_edges = hole_edges[np.lexsort((x[hole_edges], ring[hole_edges]))]
+    leftmost = hole_edges
+    if len(hole_edges):
+        hole_rings = ring[hole_edges]
+        leftmost = hole_edges[np.r_[True, hole_rings[1:] != hole_rings[:-1]]]
+    query = np.minimum(y[leftmost], y[nxt][leftmost]) * (width + 1) + x[leftmost]
+    owner = np.arange(n_rings)
+    owner[ring[leftmost]] = row_rings[np.searchsorted(row_keys, query) - 1]
+    for _ in range(max(n_rings.bit_length(), 1)):
+        owner = owner[owner]
+    return Rings(vertices, offsets, owner)
+
+
+def _ring_neighbours(offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Indices of the next and previous vertex of every ring vertex."""
+    n = int(offsets[-1])
+    nxt, prev = np.arange(1, n + 1), np.arange(-1, n - 1)
+    nxt[offsets[1:] - 1] = offsets[:-1]
+    prev[offsets[:-1]] = offsets[1:] - 1
+    return nxt, prev
+
+
+def _simplify(
+    rings: Rings, tolerance_px: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Closes and simplifies rings, dropping those too small to keep an area.
+
+    Returns:
+        A tuple (vertices, flags, offsets, owner) of the kept rings, with owner
+        indexing the kept rings.
+    """
+    counts = np.diff(rings.offsets)
+    starts = rings.offsets[:-1]
+    # Repeat the first vertex of every ring at its end
+    index = np.insert(np.arange(len(rings.vertices)), rings.offsets[1:], starts)
+    closed_offsets = rings.offsets + np.arange(len(rings.offsets))
+    vertices = rings.vertices[index].astype(np.float64)
+    flags = np.zeros(len(vertices), dtype=np.uint8)
+    if tolerance_px > 0:
+        vertices, flags, closed_offsets = simplify_polylines(
+            vertices, flags, closed_offsets, tolerance_px
+        )
+        counts = np.diff(closed_offsets) - 1
+
+    keep = counts >= 3
+    keep &= keep[rings.owner]
+    new_index = np.cumsum(keep) - 1
+    vertex_keep = np.repeat(keep, np.diff(closed_offsets))
+    kept_counts = np.diff(closed_offsets)[keep]
+    offsets = np.concatenate([[0], np.cumsum(kept_counts)]).astype(np.int64)
+    flags = flags[vertex_keep]
+    flags[offsets[1:] - 1] |= COORD_CLOSE_POINT
+    return vertices[vertex_keep], flags, offsets, new_index[rings.owner[keep]]
+
+
+def _area_store(
+    coords: np.ndarray, flags: np.ndarray, offsets: np.ndarray, owner: np.ndarray, symbol: int
+) -> ObjectStore:
+    """One area object per outer ring, followed by its holes."""
+    ring_order = np.lexsort((owner != np.arange(len(owner)), owner))
+    sizes = np.diff(offsets)[ring_order]
+    ends = np.cumsum(sizes)
+    # Vertex ranges of the rings, concatenated in ring_order
+    total = ends[-1] if len(ends) else 0
+    index = np.arange(total) - np.repeat(ends - sizes - offsets[ring_order], sizes)
+    object_flags = flags[index]
+    owners = owner[ring_order]
+    last_ring = np.append(owners[1:] != owners[:-1], True)
+    # Every ring but the last of an object is followed by a hole
+    object_flags[ends[~last_ring] - 1] |= COORD_HOLE_POINT
+    return _store(coords[index], object_flags, np.concatenate([[0], ends[last_ring]]), symbol, 3)
+
+
+def _line_store(
+    coords: np.ndarray, flags: np.ndarray, offsets: np.ndarray, symbol: int
+) -> ObjectStore:
+    """One closed line object per ring."""
+    return _store(coords, flags, offsets, symbol, 2)
+
+
+def _store(
+    coords: np.ndarray, flags: np.ndarray, offsets: np.ndarray, symbol: int, obj_type: int
+) -> ObjectStore:
+    n = len(offsets) - 1
+    return ObjectStore(
+        coords.astype(np.float64),
+        flags,
+        offsets.astype(np.int64),
+        np.full(n, symbol, dtype=np.int32),
+        np.full(n, obj_type, dtype=np.int8),
+    )
+
+
+def _add_plane_symbols(
+    colors: ET.Element, symbols: ET.Element, plane: int, threshold: float, line_width: int
+) -> None:
+    """Adds the color, area symbol and contour symbol of a mask plane."""
+    gray = f"{threshold:g}"
+    color = ET.SubElement(
+        colors,
+        _tag("color"),
+        priority=str(plane),
+        name=f"Threshold {gray}",
+        c="0",
+        m="0",
+        y="0",
+        k=f"{1 - threshold:g}",
+        opacity="1",
+    )
+    ET.SubElement(color, _tag("rgb"), r=gray, g=gray, b=gray)
+    area = ET.SubElement(
+        symbols,
+        _tag("symbol"),
+        type="4",
+        id=str(2 * plane),
+        code=f"{plane + 1}01",
+        name=f"Area < {gray}",
+    )
+    ET.SubElement(area, _tag("area_symbol"), inner_color=str(plane))
+    line = ET.SubElement(
+        symbols,
+        _tag("symbol"),
+        type="2",
+        id=str(2 * plane + 1),
+        code=f"{plane + 1}02",
+        name=f"Contour {gray}",
+    )
+    ET.SubElement(line, _tag("line_symbol"), color=str(plane), line_width=str(line_width))
+
+
+def _tag(name: str) -> str:
+    return f"{{{OMAP_NAMESPACE}}}{name}"
@@ -0,0 +1,361 @@
+"""XYZ tile pyramid export.
+
+The pyramid covers a square extent in map units anchored at its top-left corner.
+Zoom level ``z`` splits it into ``2**z`` by ``2**z`` tiles; tile ``(x, y)`` counts
+from the left and from the top, as in slippy maps. The deepest level is rendered
+from the document, every lower level is built by downsampling its four children,
+and tiles without content are not written.
+"""
+
+import io
+import sqlite3
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from ..omap.model import Color, ObjectStore, OMapDocument, Symbol
+from ..omap.spatial import GridIndex
+from .renderer import Viewport, prepared_store, render_store
+from .style import RenderStyle
+
+DEFAULT_TILE_SIZE = 256
+
+TileKey = tuple[int, int, int]
+
+# Tiles of the deepest level handed to a worker process at once
+_CHUNK_TILES = 16
+
+# Tile renderer of a worker process, set once per process by _init_worker
+_tile_renderer: Optional["_PyramidTileRenderer"] = None
+
+
+class DirectoryTileStore:
+    """Stores tiles as ``<root>/<z>/<x>/<y>.png``."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def put(self, z: int, x: int, y: int, data: bytes) -> None:
+        path = self.root / str(z) / str(x) / f"{y}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def get(self, z: int, x: int, y: int) -> bytes | None:
+        path = self.root / str(z) / str(x) / f"{y}.png"
+        return path.read_bytes() if path.exists() else None
+
+    def close(self) -> None:
+        pass
+
+
+class MBTilesStore:
+    """
+    Stores tiles in an MBTiles-style SQLite file.
+
+    MBTiles numbers rows from the bottom (TMS), so ``y`` is flipped on the way in
+    and out.
+    """
+
+    def __init__(self, path: str | Path, metadata: dict[str, str]):
+        self.path = Path(path)
+        if self.path.exists():
+            self.path.unlink()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE tiles "
+            "(zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)"
+        )
+        self.conn.execute(
+            "CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)"
+        )
+        self.conn.executemany("INSERT INTO metadata VALUES (?, ?)", sorted(metadata.items()))
+
+    def put(self, z: int, x: int, y: int, data: bytes) -> None:
+        self.conn.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)", (z, x, (1 << z) - 1 - y, data))
+
+    def get(self, z: int, x: int, y: int) -> bytes | None:
+        row = self.conn.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+def pyramid_extent(omap_doc: OMapDocument) -> tuple[float, float, float, float]:
+    """
+    Returns the square extent covering all objects of a document.
+
+    Returns:
+        (xmin, ymin, xmax, ymax) in map units, with xmax - xmin == ymax - ymin.
+    """
+    bounds = omap_doc.get_spatial_index().bounds
+    if np.isnan(bounds[:, 0]).all():
+        raise ValueError("Document has no objects to build a tile pyramid from")
+    return square_extent(
+        (
+            float(np.nanmin(bounds[:, 0])),
+            float(np.nanmin(bounds[:, 1])),
+            float(np.nanmax(bounds[:, 2])),
+            float(np.nanmax(bounds[:, 3])),
+        )
+    )
+
+
+def square_extent(bbox: tuple[float, float, float, float]) -> tuple[float, float, float, float]:
+    """Grows a bbox to a square, keeping its top-left corner."""
+    xmin, ymin, xmax, ymax = bbox
+    side = max(xmax - xmin, ymax - ymin, 1e-9)
+    return xmin, ymax - side, xmin + side, ymax
+
+
+def tile_bbox(
+    extent: tuple[float, float, float, float], z: int, x: int, y: int
+) -> tuple[float, float, float, float]:
+    """Returns the map-unit bbox of tile ``(z, x, y)`` of a pyramid extent."""
+    xmin, _, xmax, ymax = extent
+    size = (xmax - xmin) / (1 << z)
+    return (xmin + x * size, ymax - (y + 1) * size, xmin + (x + 1) * size, ymax - y * size)
+
+
+def render_pyramid(
+    omap_doc: OMapDocument,
+    out: str | Path,
+    zoom_min: int,
+    zoom_max: int,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    extent: tuple[float, float, float, float] | None = None,
+    workers: int | None = None,
+) -> dict[int, int]:
+    """
+    Renders an XYZ tile pyramid of a document.
+
+    Args:
+        omap_doc: The document to render. It is parsed and indexed once for all tiles.
+        out: Output directory, or a ``.mbtiles`` file.
+        zoom_min: Lowest zoom level to write.
+        zoom_max: Highest zoom level; rendered directly from the document.
+        tile_size: Tile edge length in pixels.
+        extent: Pyramid extent in map units, grown to a square. Defaults to the
+            document extent.
+        workers: Render the deepest level in a process pool of this size.
+
+    Returns:
+        Number of tiles written per zoom level.
+    """
+    if not 0 <= zoom_min <= zoom_max:
+        raise ValueError(f"Invalid zoom range {zoom_min}..{zoom_max}")
+    extent = pyramid_extent(omap_doc) if extent is None else square_extent(extent)
+
+    out = Path(out)
+    tiles: DirectoryTileStore | MBTilesStore
+    if out.suffix == ".mbtiles":
+        metadata = {
+            "name": out.stem,
+            "format": "png",
+            "minzoom": str(zoom_min),
+            "maxzoom": str(zoom_max),
+            "extent": ",".join(repr(v) for v in extent),
+        }
+        tiles = MBTilesStore(out, metadata)
+    else:
+        tiles = DirectoryTileStore(out)
+
+    counts: dict[int, int] = {}
+    try:
+        # Deepest level: only tiles that contain objects are rendered at all
+        index = omap_doc.get_spatial_index()
+        style = RenderStyle(omap_doc.get_colors(), omap_doc.get_symbols())
+        pixel_size = (extent[2] - extent[0]) / (tile_size << zoom_max)
+        # Strokes reach beyond an object's extent; same slack as Viewport.query_box
+        margin = (style.max_line_width_px() / 2 + 2) * pixel_size
+        keys = ((zoom_max, x, y) for x, y in _occupied_tiles(index, extent, zoom_max, margin))
+        # Every tile of the level shares one simplified copy of the geometry
+        viewport = Viewport(tile_bbox(extent, zoom_max, 0, 0), (tile_size, tile_size))
+        objects = prepared_store(omap_doc, viewport, lod=True)
+        initargs = (style.colors, style.symbols, objects, index, extent, tile_size)
+        if workers is None or workers <= 1:
+            renderer = _PyramidTileRenderer(*initargs)
+            rendered: Iterator[tuple[TileKey, bytes | None]] = (
+                (key, renderer.render(key)) for key in keys
+            )
+            children = _store_tiles(tiles, rendered)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=initargs
+            ) as pool:
+                children = _store_tiles(tiles, _render_in_pool(pool, keys, workers))
+        counts[zoom_max] = len(children)
+
+        # Lower levels are downsampled from the level below
+        for z in range(zoom_max - 1, zoom_min - 1, -1):
+            parents = sorted({(x // 2, y // 2) for x, y in children})
+            written = []
+            for x, y in parents:
+                data = _downsample(tiles, z, x, y, tile_size)
+                if data is not None:
+                    tiles.put(z, x, y, data)
+                    written.append((x, y))
+            counts[z] = len(written)
+            children = set(written)
+    finally:
+        tiles.close()
+    return dict(sorted(counts.items()))
+
+
+def _occupied_tiles(
+    index: GridIndex, extent: tuple[float, float, float, float], z: int, margin: float
+) -> Iterator[tuple[int, int]]:
+    """
+    Yields the tiles of level ``z`` that an object's bounding box, grown by
+    ``margin`` map units, reaches; ordered row by row.
+
+    The rows are swept in order, merging the column ranges of the objects that
+    reach each row. Memory grows with the number of objects, not with the tiles
+    they cover, which at deep levels is up to 4**z for a single large area.
+    """
+    xmin, _, xmax, ymax = extent
+    n = 1 << z
+    size = (xmax - xmin) / n
+    b = index.bounds[~np.isnan(index.bounds[:, 0])]
+    tx0 = np.clip(np.floor((b[:, 0] - margin - xmin) / size), 0, n - 1).astype(np.int64)
+    tx1 = np.clip(np.floor((b[:, 2] + margin - xmin) / size), 0, n - 1).astype(np.int64)
+    ty0 = np.clip(np.floor((ymax - b[:, 3] - margin) / size), 0, n - 1).astype(np.int64)
+    ty1 = np.clip(np.floor((ymax - b[:, 1] + margin) / size), 0, n - 1).astype(np.int64)
+
+    # Objects in order of their first row; ``active`` holds those reaching row y
+    order = np.argsort(ty0, kind="stable")
+    tx0, tx1, ty0, ty1 = tx0[order], tx1[order], ty0[order], ty1[order]
+    active = np.empty(0, dtype=np.int64)
+    started = 0
+    y = int(ty0[0]) if len(ty0) else n
+    while y < n:
+        stop = int(np.searchsorted(ty0, y, side="right"))
+        active = np.concatenate([active[ty1[active] >= y], np.arange(started, stop)])
+        started = stop
+        if not len(active):
+            if started == len(ty0):
+                break
+            y = int(ty0[started])
+            continue
+        # Merge the column ranges: a range starts a new run unless an earlier
+        # range reaches it
+        by_start = np.argsort(tx0[active], kind="stable")
+        lo, hi = tx0[active][by_start], tx1[active][by_start]
+        reach = np.maximum.accumulate(hi)
+        new_run = np.ones(len(lo), dtype=bool)
+        new_run[1:] = lo[1:] > reach[:-1] + 1
+        ends = np.append(np.flatnonzero(new_run)[1:] - 1, len(lo) - 1)
+        for first, last in zip(lo[new_run].tolist(), reach[ends].tolist(), strict=True):
+            for x in range(first, last + 1):
+                yield x, y
+        y += 1
+
+
+def _render_in_pool(
+    pool: ProcessPoolExecutor, keys: Iterator[TileKey], workers: int
+) -> Iterator[tuple[TileKey, bytes | None]]:
+    """
+    Renders tiles in a process pool, in chunks of _CHUNK_TILES. A bounded number
+    of chunks is in flight, so the keys are consumed as the tiles are written.
+    """
+    pending: deque[tuple[list[TileKey], Future[list[bytes | None]]]] = deque()
+    while True:
+        chunk = list(islice(keys, _CHUNK_TILES))
+        if not chunk:
+            break
+        if len(pending) >= 2 * workers:
+            done, future = pending.popleft()
+            yield from zip(done, future.result(), strict=True)
+        pending.append((chunk, pool.submit(_render_tiles, chunk)))
+    while pending:
+        done, future = pending.popleft()
+        yield from zip(done, future.result(), strict=True)
+
+
+def _store_tiles(
+    store: DirectoryTileStore | MBTilesStore, rendered: Iterator[tuple[TileKey, bytes | None]]
+) -> set[tuple[int, int]]:
+    """Writes the non-empty rendered tiles and returns their (x, y) keys."""
+    written = set()
+    for (z, x, y), data in rendered:
+        if data is not None:
+            store.put(z, x, y, data)
+            written.add((x, y))
+    return written
+
+
+def _downsample(
+    store: DirectoryTileStore | MBTilesStore, z: int, x: int, y: int, tile_size: int
+) -> bytes | None:
+    """Builds tile ``(z, x, y)`` from its four children, or returns None if they are all empty."""
+    canvas = Image.new("RGB", (2 * tile_size, 2 * tile_size), (255, 255, 255))
+    found = False
+    for dy in (0, 1):
+        for dx in (0, 1):
+            data = store.get(z + 1, 2 * x + dx, 2 * y + dy)
+            if data is not None:
+                with Image.open(io.BytesIO(data)) as child:
+                    canvas.paste(child.convert("RGB"), (dx * tile_size, dy * tile_size))
+                found = True
+    if not found:
+        return None
+    return _encode_png(canvas.reduce(2))
+
+
+def _encode_png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class _PyramidTileRenderer:
+    """Renders single pyramid tiles from a shared object store."""
+
+    def __init__(
+        self,
+        colors: dict[int, Color],
+        symbols: dict[int, Symbol],
+        store: ObjectStore,
+        index: GridIndex,
+        extent: tuple[float, float, float, float],
+        tile_size: int,
+    ):
+        self.style = RenderStyle(colors, symbols)
+        self.store = store
+        self.index = index
+        self.extent = extent
+        self.tile_size = tile_size
+
+    def render(self, key: TileKey) -> bytes | None:
+        """Renders a tile to PNG bytes; returns None if nothing is drawn on it."""
+        viewport = Viewport(tile_bbox(self.extent, *key), (self.tile_size, self.tile_size))
+        visible = self.index.query(viewport.query_box(self.style, 0, self.tile_size))
+        if not len(visible):
+            return None
+        img = render_store(self.store.subset(visible), self.style, viewport, 0, self.tile_size)
+        # Objects reaching the tile by their extent only, e.g. a tile inside
+        # the bounding box of a large polygon but outside the polygon itself
+        if img.getextrema() == ((255, 255),) * 3:
+            return None
+        return _encode_png(img)
+
+
+def _init_worker(*args: object) -> None:
+    global _tile_renderer
+    _tile_renderer = _PyramidTileRenderer(*args)  # type: ignore[arg-type]
+
+
+def _render_tiles(keys: list[TileKey]) -> list[bytes | None]:
+    assert _tile_renderer is not None
+    return [_tile_renderer.render(key) for key in keys]
@@ -1,15 +1,28 @@
+from collections.abc import Callable, Iterator
 from pathlib import Path
-from typing import Tuple, List
+
+import numpy as np
 from PIL import Image, ImageDraw
-from ..omap.io import load_omap
-from .style import RenderStyle
+
+from ..omap.curves import FLATTEN_TOLERANCE_PX, curve_level, flatten_curves
+from ..omap.io import iter_omap, load_omap
+from ..omap.model import Color, ObjectStore, OMapDocument, Symbol
+from ..omap.simplify import SIMPLIFY_TOLERANCE_PX, simplify_polylines
+from .style import RenderStyle, StyleTable
 
 
 def render_omap_to_png(
     omap_path: str | Path,
     out_png_path: str | Path,
-    bbox: Tuple[float, float, float, float],
-    size_px: Tuple[int, int],
+    bbox: tuple[float, float, float, float],
+    size_px: tuple[int, int],
+    streaming: bool = False,
+    parse_workers: int | None = None,
+    cache_dir: str | Path | None = None,
+    tile_rows: int | None = None,
+    workers: int | None = None,
+    lod: bool = False,
+    load_document: Callable[[str | Path], OMapDocument] | None = None,
 ) -> None:
     """
     Renders a subset of .omap objects to a PNG.
@@ -19,66 +32,365 @@ def render_omap_to_png(
         out_png_path: Path to save the PNG.
         bbox: (xmin, ymin, xmax, ymax) in map units.
         size_px: (width, height) in pixels.
+        streaming: Draw objects while the file is being parsed instead of loading
+            the whole XML tree first. Output is identical; only the geometry of
+            visible objects is held in memory. Cannot be combined with
+            parse_workers, cache_dir, tile_rows or workers.
+        parse_workers: Parse the map parts in a process pool of this size.
+        cache_dir: Directory for compiled .omap caches. When set, a cache is
+            written on the first render and reused by later ones.
+        tile_rows: Render in horizontal tiles of this many pixel rows and stream
+            them into the PNG, so the full canvas is never held in memory.
+        workers: Render tiles in a process pool of this size. Implies tiling.
+        lod: Simplify outlines to the pixel grid before drawing (see
+            OMapDocument.get_lod_store). Overview renders then draw far fewer
+            vertices; edges may move by up to half a pixel.
+        load_document: Loads the document in place of load_omap, e.g. from a
+            cache of parsed documents; parse_workers and cache_dir are then
+            not used. Not used when streaming.
     """
-    omap_doc = load_omap(omap_path)
-    colors = omap_doc.get_colors()
-    symbols = omap_doc.get_symbols()
-    objects = omap_doc.get_objects()
+    if streaming:
+        _reject_with_streaming(tile_rows=tile_rows, workers=workers)
+    elif tile_rows is not None or workers is not None:
+        from .tiled import DEFAULT_TILE_ROWS, render_tiled
 
-    style = RenderStyle(colors, symbols)
+        omap_doc = _load_document(omap_path, parse_workers, cache_dir, load_document)
+        render_tiled(
+            omap_doc,
+            out_png_path,
+            bbox,
+            size_px,
+            tile_rows or DEFAULT_TILE_ROWS,
+            workers,
+            lod,
+        )
+        return
+
+    render_omap(
+        omap_path, bbox, size_px, streaming, parse_workers, cache_dir, lod, load_document
+    ).save(out_png_path, "PNG")
+
+
+def render_omap(
+    omap_path: str | Path,
+    bbox: tuple[float, float, float, float],
+    size_px: tuple[int, int],
+    streaming: bool = False,
+    parse_workers: int | None = None,
+    cache_dir: str | Path | None = None,
+    lod: bool = False,
+    load_document: Callable[[str | Path], OMapDocument] | None = None,
+) -> Image.Image:
+    """
+    Renders a subset of .omap objects into an in-memory RGB image.
+
+    Takes the arguments of render_omap_to_png, without the tiling options.
+    """
+    if streaming:
+        _reject_with_streaming(parse_workers=parse_workers, cache_dir=cache_dir)
+        return _render_streaming(omap_path, bbox, size_px, lod)
+
+    omap_doc = _load_document(omap_path, parse_workers, cache_dir, load_document)
+    return render_document(omap_doc, bbox, size_px, lod=lod)
+
+
+def _reject_with_streaming(**options: object) -> None:
+    """Raises for options that streaming renders have no use for."""
+    given = [name for name, value in options.items() if value is not None]
+    if given:
+        raise ValueError(f"streaming cannot be combined with {', '.join(given)}")
+
+
+def _load_document(
+    omap_path: str | Path,
+    parse_workers: int | None,
+    cache_dir: str | Path | None,
+    load_document: Callable[[str | Path], OMapDocument] | None,
+) -> OMapDocument:
+    if load_document is not None:
+        return load_document(omap_path)
+    return load_omap(
+        omap_path, workers=parse_workers, cache_dir=cache_dir, write_cache=cache_dir is not None
+    )
+
+
+def render_document(
+    omap_doc: OMapDocument,
+    bbox: tuple[float, float, float, float],
+    size_px: tuple[int, int],
+    rows: tuple[int, int] | None = None,
+    lod: bool = False,
+) -> Image.Image:
+    """
+    Renders a loaded document into an image.
+
+    Args:
+        omap_doc: The document to render.
+        bbox: (xmin, ymin, xmax, ymax) in map units.
+        size_px: (width, height) of the full output in pixels.
+        rows: Optional (first, end) pixel row range. Only these rows of the full
+            output are rendered; the result is identical to the same rows of a
+            full render.
+        lod: Simplify outlines to the pixel grid before drawing.
+
+    Returns:
+        An RGB image of ``size_px[0]`` by ``end - first`` pixels.
+    """
+    style = RenderStyle(omap_doc.get_colors(), omap_doc.get_symbols())
+    viewport = Viewport(bbox, size_px)
+    first, end = rows if rows is not None else (0, size_px[1])
+    store = prepared_store(omap_doc, viewport, lod).subset(
+        omap_doc.query_bbox(viewport.query_box(style, first, end))
+    )
+    return render_store(store, style, viewport, first, end)
+
+
+def render_store(
+    store: ObjectStore,
+    style: RenderStyle,
+    viewport: "Viewport",
+    first: int,
+    end: int,
+) -> Image.Image:
+    """
+    Draws the objects of a store into pixel rows ``first:end`` of a viewport.
 
+    Objects are drawn in Mapper's color priority order (see
+    StyleTable.draw_batches), in batches of one type and symbol.
+    """
     # Use white background as default
-    img = Image.new("RGB", size_px, (255, 255, 255))
+    img = Image.new("RGB", (viewport.w_px, end - first), (255, 255, 255))
     draw = ImageDraw.Draw(img)
+    table = style.table
+
+    # Gather the objects in draw order, then transform their vertices at once
+    # and hand out per-batch slices
+    order, bounds = table.draw_batches(store.types, store.symbol_ids)
+    store = store.subset(order)
+    px = viewport.to_px(store.vertices, first)
+    rows = table.rows(store.symbol_ids)
+    offsets = store.offsets
+    for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist(), strict=True):
+        batch_offsets = offsets[a : b + 1]
+        _draw_batch(
+            draw,
+            table,
+            int(store.types[a]),
+            int(rows[a]),
+            px[batch_offsets[0] : batch_offsets[-1]],
+            batch_offsets - batch_offsets[0],
+        )
+    return img
+
+
+class Viewport:
+    """Maps map coordinates to the pixel grid of an output image."""
+
+    def __init__(self, bbox: tuple[float, float, float, float], size_px: tuple[int, int]):
+        self.xmin, self.ymin, self.xmax, self.ymax = bbox
+        self.w_px, self.h_px = size_px
 
-    xmin, ymin, xmax, ymax = bbox
-    w_px, h_px = size_px
-    
-    # Avoid division by zero
-    dx = (xmax - xmin) if xmax != xmin else 1.0
-    dy = (ymax - ymin) if ymax != ymin else 1.0
+        # Avoid division by zero
+        self.dx = (self.xmax - self.xmin) if self.xmax != self.xmin else 1.0
+        self.dy = (self.ymax - self.ymin) if self.ymax != self.ymin else 1.0
 
-    def map_to_px(x: float, y: float) -> Tuple[float, float]:
+    @property
+    def lod_scale(self) -> float:
+        """
+        Pixel size in map units, rounded down to a power of two.
+
+        Geometry is flattened and simplified relative to this scale, so renders
+        at similar pixel sizes share the prepared geometry.
+        """
+        pixel_size = min(abs(self.dx / self.w_px), abs(self.dy / self.h_px))
+        return 2.0 ** curve_level(pixel_size)
+
+    def to_px(self, vertices: np.ndarray, first_row: int = 0) -> np.ndarray:
+        """
+        Converts (n, 2) map coordinates to pixels, relative to ``first_row``.
+
+        PIL truncates coordinates towards zero before rasterizing, so truncating
+        here first does not change the output. It does make the result exact under
+        a shift of whole rows, which lets tiles reproduce a full render.
+        """
         # x increases right, y increases up (map)
         # x increases right, y increases down (image)
-        px_x = (x - xmin) / dx * w_px
-        px_y = (ymax - y) / dy * h_px
-        return px_x, px_y
-
-    # For determinism, we should draw objects in a fixed order.
-    # OMap objects in XML are usually in draw order, or have a priority.
-    # For now, let's just use the XML order.
-    
-    for obj in objects:
-        if not obj.coords:
-            continue
-        
-        px_coords = [map_to_px(x, y) for (x, y) in obj.coords]
-        
-        # Determine symbol style
-        if obj.type == 2:  # Line
-            color, width = style.get_line_style(obj.symbol_id)
-            # Scale line width to pixels? 
-            # In OMap, line_width=140 means 0.14 mm. 
-            # If the map scale is 1:15000, 0.14 mm on paper is 2.1 m.
-            # But the renderer is deterministic with fixed DPI.
-            # Let's assume the bbox width matches W pixels.
-            # pixel_size_in_map_units = dx / w_px
-            # width_px = (width / 1000.0) / pixel_size_in_map_units ?
-            # No, let's use a simpler approach: line_width is in map units.
-            # Actually, line_width="140" is in 1/100 mm in many formats.
-            # Let's just use a fixed scaling factor for now to see anything.
-            
-            # TODO: Scientific scaling of line widths
-            draw.line(px_coords, fill=color, width=max(1, int(width / 50)))
-            
-        elif obj.type == 3:  # Area (polygon)
-            color = style.get_fill_style(obj.symbol_id)
-            if len(px_coords) >= 3:
-                draw.polygon(px_coords, fill=color)
-            
-            # Also draw the border if it has a line symbol
-            # (Note: OMap area symbols can have a border color defined)
-            # For simplicity, just fill for now.
-
-    img.save(out_png_path, "PNG")
+        px = np.empty_like(vertices)
+        px[:, 0] = (vertices[:, 0] - self.xmin) / self.dx * self.w_px
+        px[:, 1] = (self.ymax - vertices[:, 1]) / self.dy * self.h_px
+        np.trunc(px, out=px)
+        px[:, 1] -= first_row
+        return px
+
+    def query_box(
+        self, style: RenderStyle, first: int, end: int
+    ) -> tuple[float, float, float, float]:
+        """
+        Returns the map-unit box whose objects can touch pixel rows ``first:end``.
+        """
+        # Objects outside the view cannot touch a pixel, except for lines whose
+        # stroke reaches in, so grow the box by the widest stroke plus rounding slack.
+        margin_px = style.max_line_width_px() / 2 + 2
+        mx = abs(margin_px * self.dx / self.w_px)
+        my = abs(margin_px * self.dy / self.h_px)
+        y_top = self.ymax - first / self.h_px * self.dy
+        y_bottom = self.ymax - end / self.h_px * self.dy
+        return (
+            min(self.xmin, self.xmax) - mx,
+            min(y_top, y_bottom) - my,
+            max(self.xmin, self.xmax) + mx,
+            max(y_top, y_bottom) + my,
+        )
+
+
+def prepared_store(omap_doc: OMapDocument, viewport: "Viewport", lod: bool) -> ObjectStore:
+    """
+    Returns the document's objects with their geometry prepared for a viewport.
+
+    Curves are always flattened; with ``lod`` outlines are also simplified.
+    """
+    if lod:
+        return omap_doc.get_lod_store(viewport.lod_scale)
+    return omap_doc.get_flattened_store(FLATTEN_TOLERANCE_PX * viewport.lod_scale)
+
+
+def _render_streaming(
+    omap_path: str | Path,
+    bbox: tuple[float, float, float, float],
+    size_px: tuple[int, int],
+    lod: bool = False,
+) -> Image.Image:
+    """
+    Renders objects as they are streamed from the file.
+
+    Only the prepared geometry of visible objects is kept; it is drawn once the
+    file is read, since the draw order depends on the symbols' colors.
+    """
+    viewport = Viewport(bbox, size_px)
+    scale = viewport.lod_scale
+
+    # Colors and symbols precede the objects in an .omap file, so the style
+    # tables are complete by the time the first object arrives.
+    colors: dict[int, Color] = {}
+    symbols: dict[int, Symbol] = {}
+    style = RenderStyle(colors, symbols)
+    box: tuple[float, float, float, float] | None = None
+    parts: list[np.ndarray] = []
+    flag_parts: list[np.ndarray] = []
+    symbol_ids: list[int] = []
+    types: list[int] = []
+    for record in iter_omap(omap_path):
+        if isinstance(record, Color):
+            colors[record.priority] = record
+        elif isinstance(record, Symbol):
+            symbols[record.id] = record
+        else:
+            if box is None:
+                box = viewport.query_box(style, 0, viewport.h_px)
+            coords = record.coords
+            if len(coords) and not _intersects(coords, box):
+                continue
+            # Prepare the geometry like prepared_store does
+            offsets = np.array([0, len(coords)])
+            coords, flags, offsets = flatten_curves(
+                coords, record.flags, offsets, FLATTEN_TOLERANCE_PX * scale
+            )
+            if lod:
+                coords, flags, _ = simplify_polylines(
+                    coords, flags, offsets, SIMPLIFY_TOLERANCE_PX * scale
+                )
+            parts.append(coords)
+            flag_parts.append(flags)
+            symbol_ids.append(record.symbol_id)
+            types.append(record.type)
+
+    if not parts:
+        return render_store(ObjectStore.empty(), style, viewport, 0, viewport.h_px)
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(coords) for coords in parts], out=offsets[1:])
+    store = ObjectStore(
+        np.concatenate(parts),
+        np.concatenate(flag_parts),
+        offsets,
+        np.array(symbol_ids, dtype=np.int32),
+        np.array(types, dtype=np.int8),
+    )
+    return render_store(store, style, viewport, 0, viewport.h_px)
+
+
+def _draw_batch(
+    draw: ImageDraw.ImageDraw,
+    table: StyleTable,
+    obj_type: int,
+    row: int,
+    px: np.ndarray,
+    offsets: np.ndarray,
+) -> None:
+    """
+    Draws map objects of one type and symbol.
+
+    Object ``i`` has the pixel coordinates ``px[offsets[i]:offsets[i + 1]]``;
+    ``row`` is the symbol's row in the style table.
+    """
+    if not len(px):
+        return
+
+    # Determine symbol style
+    if obj_type == 2:  # Line
+        color = tuple(table.line_rgb[row].tolist())
+        _draw_lines(draw, px, offsets, color, int(table.line_width_px[row]))
+
+    elif obj_type == 3:  # Area (polygon)
+        color = tuple(table.fill_rgb[row].tolist())
+        counts = np.diff(offsets)
+        if (counts < 3).any():
+            keep = np.repeat(counts >= 3, counts)
+            px = px[keep]
+            offsets = np.concatenate([[0], np.cumsum(counts[counts >= 3])])
+        if len(px):
+            _draw_polygons(draw, px, offsets, color)
+
+        # Also draw the border if it has a line symbol
+        # (Note: OMap area symbols can have a border color defined)
+        # For simplicity, just fill for now.
+
+
+def _draw_lines(
+    draw: ImageDraw.ImageDraw,
+    px: np.ndarray,
+    offsets: np.ndarray,
+    color: tuple[int, ...],
+    width: int,
+) -> None:
+    """Draws polylines ``px[offsets[i]:offsets[i + 1]]``."""
+    for xy in _flat_objects(px, offsets):
+        if xy:
+            draw.line(xy, fill=color, width=width)
+
+
+def _draw_polygons(
+    draw: ImageDraw.ImageDraw, px: np.ndarray, offsets: np.ndarray, color: tuple[int, ...]
+) -> None:
+    """Fills polygons ``px[offsets[i]:offsets[i + 1]]``."""
+    for xy in _flat_objects(px, offsets):
+        draw.polygon(xy, fill=color)
+
+
+def _flat_objects(px: np.ndarray, offsets: np.ndarray) -> Iterator[list[float]]:
+    """
+    Yields the vertices of every object as a flat [x0, y0, x1, y1, ...] list.
+
+    The batch is converted to a Python list once; slicing it per object is
+    cheaper than converting every object's array.
+    """
+    flat = px.ravel().tolist()
+    bounds = (2 * offsets).tolist()
+    for a, b in zip(bounds[:-1], bounds[1:], strict=True):
+        yield flat[a:b]
+
+
+def _intersects(coords: np.ndarray, box: tuple[float, float, float, float]) -> bool:
+    """Checks whether the extent of (n, 2) map coordinates intersects a box."""
+    lo = coords.min(axis=0)
+    hi = coords.max(axis=0)
+    return bool(lo[0] <= box[2] and hi[0] >= box[0] and lo[1] <= box[3] and hi[1] >= box[1])
@@ -0,0 +1,162 @@
+"""Tiled, multi-process rendering for large output images.
+
+The output is split into horizontal tiles spanning the full image width. Each tile
+is rendered with its own bbox culling and written to the PNG as soon as it is
+ready, so neither the full canvas nor all tiles are ever held in memory. Tiles
+reproduce the same rows of a single-image render pixel for pixel (see
+Viewport.to_px).
+"""
+
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+from ..omap.model import Color, ObjectStore, OMapDocument, Symbol
+from ..omap.spatial import GridIndex
+from .renderer import Viewport, prepared_store, render_store
+from .style import RenderStyle
+
+DEFAULT_TILE_ROWS = 512
+
+# Tile renderer of a worker process, set once per process by _init_worker
+_tile_renderer: Optional["_TileRenderer"] = None
+
+
+def render_tiled(
+    omap_doc: OMapDocument,
+    out_png_path: str | Path,
+    bbox: tuple[float, float, float, float],
+    size_px: tuple[int, int],
+    tile_rows: int = DEFAULT_TILE_ROWS,
+    workers: int | None = None,
+    lod: bool = False,
+) -> None:
+    """
+    Renders a document tile by tile and streams the tiles into a PNG.
+
+    Args:
+        omap_doc: The document to render.
+        out_png_path: Path to save the PNG.
+        bbox: (xmin, ymin, xmax, ymax) in map units.
+        size_px: (width, height) in pixels.
+        tile_rows: Height of a tile in pixel rows.
+        workers: Render tiles in a process pool of this size; in-process if None or 1.
+        lod: Simplify outlines to the pixel grid before drawing.
+    """
+    if tile_rows < 1:
+        raise ValueError(f"tile_rows must be positive, got {tile_rows}")
+    w_px, h_px = size_px
+    tiles = [(first, min(first + tile_rows, h_px)) for first in range(0, h_px, tile_rows)]
+    initargs = (
+        omap_doc.get_colors(),
+        omap_doc.get_symbols(),
+        prepared_store(omap_doc, Viewport(bbox, size_px), lod),
+        omap_doc.get_spatial_index(),
+        bbox,
+        size_px,
+    )
+
+    with open(out_png_path, "wb") as f:
+        writer = PngStreamWriter(f, w_px, h_px)
+        if workers is None or workers <= 1:
+            renderer = _TileRenderer(*initargs)
+            for tile in tiles:
+                writer.write_rows(renderer.render(tile))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=initargs
+            ) as pool:
+                # Keep a bounded number of tiles in flight so finished tiles do not
+                # pile up while the writer catches up
+                pending: deque[Future[np.ndarray]] = deque()
+                for tile in tiles:
+                    if len(pending) >= 2 * workers:
+                        writer.write_rows(pending.popleft().result())
+                    pending.append(pool.submit(_render_tile, tile))
+                while pending:
+                    writer.write_rows(pending.popleft().result())
+        writer.close()
+
+
+class _TileRenderer:
+    """Renders tiles of one output image from a shared object store."""
+
+    def __init__(
+        self,
+        colors: dict[int, Color],
+        symbols: dict[int, Symbol],
+        store: ObjectStore,
+        index: GridIndex,
+        bbox: tuple[float, float, float, float],
+        size_px: tuple[int, int],
+    ):
+        self.style = RenderStyle(colors, symbols)
+        self.store = store
+        self.index = index
+        self.viewport = Viewport(bbox, size_px)
+
+    def render(self, tile: tuple[int, int]) -> np.ndarray:
+        """Renders pixel rows ``first:end`` of the output into an (rows, width, 3) array."""
+        first, end = tile
+        visible = self.store.subset(
+            self.index.query(self.viewport.query_box(self.style, first, end))
+        )
+        return np.asarray(render_store(visible, self.style, self.viewport, first, end))
+
+
+def _init_worker(*args: object) -> None:
+    global _tile_renderer
+    _tile_renderer = _TileRenderer(*args)  # type: ignore[arg-type]
+
+
+def _render_tile(tile: tuple[int, int]) -> np.ndarray:
+    assert _tile_renderer is not None
+    return _tile_renderer.render(tile)
+
+
+class PngStreamWriter:
+    """
+    Writes an 8-bit RGB PNG incrementally, a block of rows at a time.
+
+    Rows use the PNG "Up" filter, which suits the large flat areas of a map.
+    """
+
+    def __init__(self, f: BinaryIO, width: int, height: int):
+        self._f = f
+        self._width = width
+        self._height = height
+        self._rows_written = 0
+        self._prev_row = np.zeros(width * 3, dtype=np.uint8)
+        self._compressor = zlib.compressobj(6)
+        f.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """Appends an (n, width, 3) uint8 block of rows."""
+        rows = rows.reshape(len(rows), self._width * 3)
+        filtered = np.empty((len(rows), 1 + self._width * 3), dtype=np.uint8)
+        filtered[:, 0] = 2  # Up filter
+        filtered[0, 1:] = rows[0] - self._prev_row
+        filtered[1:, 1:] = rows[1:] - rows[:-1]
+        self._prev_row = rows[-1].copy()
+        self._rows_written += len(rows)
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self) -> None:
+        """Flushes the compressed stream and finishes the file."""
+        if self._rows_written != self._height:
+            raise ValueError(f"Expected {self._height} rows, got {self._rows_written}")
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+
+    def _chunk(self, tag: bytes, data: bytes) -> None:
+        self._f.write(struct.pack(">I", len(data)) + tag + data)
+        self._f.write(struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
@@ -0,0 +1,414 @@
+"""Long-lived worker for render, score and acceptance requests.
+
+``mapgen serve`` answers the requests of many jobs in one process, so they
+share one interpreter startup and the parsed documents and decoded reference
+images of earlier requests.
+
+Requests are JSON objects, one per line, read from stdin or from connections
+to a Unix socket. Each names an ``op`` and takes the options of the matching
+command, with underscores for dashes:
+
+    {"id": 1, "op": "render", "input": "a.omap", "output": "a.png",
+     "bbox": [0, 0, 1000, 1000], "size": [500, 500]}
+    {"id": 2, "op": "score", "ref": "ref.png", "cand": "a.png", "metric": "ssim"}
+    {"id": 3, "op": "acceptance", "aoi": "aoi_01", "force": true}
+    {"id": 4, "op": "stats"}
+    {"op": "shutdown"}
+
+Requests run concurrently in a thread pool, and every response is one line
+written as soon as it is ready, so responses can arrive out of order; they
+carry the ``id`` of their request. Since the pool already runs requests side
+by side, each request renders and scores serially: a ``workers`` option is
+ignored.
+
+    {"id": 1, "ok": true, "result": {"output": "a.png"}}
+    {"id": 2, "ok": false, "error": "FileNotFoundError: ..."}
+
+Cached documents and images are keyed by path, modification time and size, so
+an edited file is loaded again.
+"""
+
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, cast
+
+import numpy as np
+
+from mapgen.omap import load_omap
+from mapgen.omap.model import OMapDocument
+
+DEFAULT_CACHE_MB = 1024
+
+# Memory of a parsed XML tree per byte of .omap file, measured on our maps
+# (about 4 to 8); documents holding a tree are charged the upper end
+_TREE_BYTES_PER_FILE_BYTE = 8
+
+OPERATIONS = ("render", "score", "acceptance", "stats", "shutdown")
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache bounded by the memory of its values.
+
+    Loads of the same key by concurrent threads are done once; the other
+    threads wait for the result. A value larger than the whole cache is
+    returned without being kept.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._loading: dict[Hashable, Future[Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, load: Callable[[], tuple[Any, int]]) -> Any:
+        """
+        Returns the value of a key, loading it on a miss.
+
+        Args:
+            key: Cache key.
+            load: Returns the value and its size in bytes.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            future = self._loading.get(key)
+            if future is None:
+                self.misses += 1
+                future = self._loading[key] = Future()
+                owner = True
+            else:
+                self.hits += 1
+                owner = False
+        if not owner:
+            return future.result()
+
+        try:
+            value, size = load()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            if size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self.bytes += size
+                self._evict()
+        future.set_result(value)
+        return value
+
+    def resize(self, key: Hashable, value: Any, size: int) -> None:
+        """
+        Charges a kept value its new size, e.g. after it grew, evicting least
+        recently used entries to stay within the budget. Does nothing if the
+        key no longer holds ``value``.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not value:
+                return
+            self.bytes += size - entry[1]
+            if size > self.max_bytes:
+                del self._entries[key]
+                self.bytes -= size
+            else:
+                self._entries[key] = (value, size)
+                self._evict()
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class Worker:
+    """
+    Runs requests against a shared cache of documents and reference images.
+
+    Args:
+        cache_bytes: Memory budget of the cache.
+        jobs: Number of requests run at once.
+        omap_cache_dir: Directory for compiled .omap caches, as for the
+            commands' --cache-dir/--omap-cache-dir.
+    """
+
+    def __init__(
+        self,
+        cache_bytes: int = DEFAULT_CACHE_MB << 20,
+        jobs: int | None = None,
+        omap_cache_dir: str | Path | None = None,
+    ):
+        self.cache = LRUCache(cache_bytes)
+        self.pool = ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1)
+        self.omap_cache_dir = omap_cache_dir
+
+    def close(self) -> None:
+        self.pool.shutdown()
+
+    def load_document(self, path: str | Path) -> OMapDocument:
+        """Loads a document, or returns it from the cache."""
+
+        def load() -> tuple[OMapDocument, int]:
+            doc = load_omap(
+                path, cache_dir=self.omap_cache_dir, write_cache=self.omap_cache_dir is not None
+            )
+            # Build the lazily computed parts now, while no other thread sees
+            # the document
+            doc.get_object_store()
+            doc.get_spatial_index()
+            return doc, _document_bytes(doc, Path(path).stat().st_size)
+
+        doc: OMapDocument = self.cache.get(("omap", *_file_key(path)), load)
+        return doc
+
+    @contextmanager
+    def _documents(self) -> Iterator[Callable[[str | Path], OMapDocument]]:
+        """
+        Yields a load_document for one request. The request may add flattened
+        and LOD stores or the XML tree to the documents; they are charged to the
+        cache afterwards.
+        """
+        loaded: dict[tuple[str, str, int, int], OMapDocument] = {}
+
+        def load(path: str | Path) -> OMapDocument:
+            key = ("omap", *_file_key(path))
+            loaded[key] = self.load_document(path)
+            return loaded[key]
+
+        try:
+            yield load
+        finally:
+            for key, doc in loaded.items():
+                # The key ends with the file size
+                self.cache.resize(key, doc, _document_bytes(doc, key[-1]))
+
+    def load_reference(self, path: str, mode: str = "L") -> np.ndarray:
+        """Decodes an image like load_image, or returns it from the cache."""
+        from mapgen.images import load_image
+
+        def load() -> tuple[np.ndarray, int]:
+            image = load_image(path, mode)
+            # Shared between requests
+            image.flags.writeable = False
+            return image, image.nbytes
+
+        image: np.ndarray = self.cache.get(("image", *_file_key(path), mode), load)
+        return image
+
+    def handle(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Runs a request and returns its response; errors are reported, not raised."""
+        response: dict[str, Any] = {"id": request.get("id")}
+        try:
+            op = request.get("op")
+            if op not in OPERATIONS:
+                raise ValueError(f"Unknown op {op!r}, expected one of {', '.join(OPERATIONS)}")
+            result = getattr(self, f"_{op}")(request)
+        except KeyError as e:
+            response.update(ok=False, error=f"Missing parameter: {e.args[0]}")
+        except Exception as e:
+            response.update(ok=False, error=f"{type(e).__name__}: {e}")
+        else:
+            response.update(ok=True, result=result)
+        return response
+
+    def _render(self, request: dict[str, Any]) -> dict[str, Any]:
+        from mapgen.render.renderer import render_omap_to_png
+
+        bbox = _floats(request["bbox"], 4, "bbox")
+        size = _floats(request["size"], 2, "size")
+        with self._documents() as load_document:
+            render_omap_to_png(
+                request["input"],
+                request["output"],
+                (bbox[0], bbox[1], bbox[2], bbox[3]),
+                (int(size[0]), int(size[1])),
+                streaming=request.get("streaming", False),
+                tile_rows=request.get("tile_rows"),
+                lod=request.get("lod", False),
+                load_document=load_document,
+            )
+        return {"output": request["output"]}
+
+    def _score(self, request: dict[str, Any]) -> dict[str, Any]:
+        from mapgen.metrics import compute_metric
+
+        metric = request.get("metric", "ssim")
+        score = compute_metric(
+            metric,
+            request["ref"],
+            request["cand"],
+            tile_size=request.get("tile_size", 1024) or None,
+            load_reference=self.load_reference,
+        )
+        result = {
+            "metric": metric,
+            "score": score,
+            "reference": request["ref"],
+            "candidate": request["cand"],
+        }
+        threshold = request.get("threshold")
+        if threshold is not None:
+            result["threshold"] = threshold
+            result["pass"] = score >= threshold
+        if request.get("out"):
+            with open(request["out"], "w") as f:
+                json.dump(result, f, indent=2)
+        return result
+
+    def _acceptance(self, request: dict[str, Any]) -> dict[str, Any]:
+        from mapgen.acceptance.run import run_aoi
+
+        aoi = request["aoi"]
+        aoi_dir = Path(request.get("golden_dir", "tests/golden")) / aoi
+        if not aoi_dir.exists():
+            raise FileNotFoundError(f"AOI directory {aoi_dir} does not exist")
+        with self._documents() as load_document:
+            return run_aoi(
+                aoi_dir,
+                Path(request.get("artifacts", "artifacts/acceptance")) / aoi,
+                streaming=request.get("streaming", False),
+                omap_cache_dir=Path(self.omap_cache_dir) if self.omap_cache_dir else None,
+                force=request.get("force", False),
+                write_images=not request.get("no_images", False),
+                load_document=load_document,
+                load_reference=self.load_reference,
+            )
+
+    def _stats(self, request: dict[str, Any]) -> dict[str, Any]:
+        return self.cache.stats()
+
+    def _shutdown(self, request: dict[str, Any]) -> dict[str, Any]:
+        # Acted on by serve_stream, which stops reading
+        return {}
+
+
+def serve_stream(worker: Worker, lines: IO[str], out: IO[str]) -> bool:
+    """
+    Answers the requests read from a text stream.
+
+    Returns once the stream ends or a shutdown request arrives, after the
+    responses to all requests read so far are written.
+
+    Returns:
+        Whether a shutdown was requested.
+    """
+    lock = threading.Lock()
+
+    def respond(response: dict[str, Any]) -> None:
+        text = json.dumps(response) + "\n"
+        with lock:
+            out.write(text)
+            out.flush()
+
+    def run(request: dict[str, Any]) -> None:
+        respond(worker.handle(request))
+
+    pending: list[Future[None]] = []
+    shutdown = False
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+        except ValueError as e:
+            respond({"id": None, "ok": False, "error": f"Invalid request: {e}"})
+            continue
+        if request.get("op") == "shutdown":
+            shutdown = True
+            break
+        pending.append(worker.pool.submit(run, request))
+        pending = [f for f in pending if not f.done()]
+
+    for future in pending:
+        future.result()
+    if shutdown:
+        respond(worker.handle(request))
+    return shutdown
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, worker: Worker):
+        super().__init__(path, _Connection)
+        self.worker = worker
+
+
+class _Connection(socketserver.StreamRequestHandler):
+    server: _Server
+
+    def handle(self) -> None:
+        # Buffered binary streams of the socket
+        lines = io.TextIOWrapper(cast(IO[bytes], self.rfile), encoding="utf-8")
+        out = io.TextIOWrapper(cast(IO[bytes], self.wfile), encoding="utf-8", write_through=True)
+        if serve_stream(self.server.worker, lines, out):
+            # shutdown() waits for serve_forever, which runs in another thread
+            threading.Thread(target=self.server.shutdown).start()
+
+
+def serve_socket(worker: Worker, path: str | Path) -> None:
+    """Answers requests on a Unix socket until a shutdown request arrives."""
+    path = Path(path)
+    if path.is_socket():
+        # Left behind by a worker that did not exit cleanly
+        path.unlink()
+    with _Server(str(path), worker) as server:
+        try:
+            print(f"Listening on {path}", file=sys.stderr, flush=True)
+            server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def _document_bytes(doc: OMapDocument, file_size: int) -> int:
+    """
+    Memory charged for a document: its object stores, and its XML tree if it
+    has been parsed. Documents from a binary cache or the parallel part parser
+    have none until something needs it.
+    """
+    tree_bytes = file_size * _TREE_BYTES_PER_FILE_BYTE if doc.has_tree else 0
+    return doc.store_bytes() + tree_bytes
+
+
+def _file_key(path: str | Path) -> tuple[str, int, int]:
+    stat = Path(path).stat()
+    return (str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def _floats(value: Any, n: int, name: str) -> list[float]:
+    """Parses a list of ``n`` numbers, also accepted as a comma-separated string."""
+    if isinstance(value, str):
+        value = value.split(",")
+    values = [float(v) for v in value]
+    if len(values) != n:
+        raise ValueError(f"{name} must have {n} components")
+    return values
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+
+def _map_like(seed: int, shape: tuple) -> np.ndarray:
+    """A white image with random rectangles of flat color, like a rendered map."""
+    rng = np.random.default_rng(seed)
+    img = np.full(shape, 255, dtype=np.uint8)
+    for _ in range(40):
+        y, x = rng.integers(0, shape[0]), rng.integers(0, shape[1])
+        h, w = rng.integers(1, 40, size=2)
+        img[y : y + h, x : x + w] = rng.integers(0, 256, size=shape[2:])
+    return img
+
+
+@pytest.fixture
+def map_like():
+    """Makes map-like test images: map_like(seed, (H, W)) or map_like(seed, (H, W, 3))."""
+    return _map_like
@@ -1,36 +1,85 @@
-from mapgen.cli import main
 from pathlib import Path
 
+from mapgen.cli import main
+
+
 def test_acceptance_aoi_01(tmp_path):
     # Run acceptance for aoi_01
     # Use a temporary directory for artifacts to avoid polluting current dir
     artifacts_dir = tmp_path / "artifacts"
-    
+
     exit_code = main(["acceptance", "run", "--aoi", "aoi_01", "--artifacts", str(artifacts_dir)])
-    
+
     assert exit_code == 0
-    
+
     # Check if artifacts are produced
     result_json = artifacts_dir / "aoi_01" / "result.json"
     assert result_json.exists()
-    
+
     import json
-    with open(result_json, "r") as f:
+
+    with open(result_json) as f:
         result = json.load(f)
-        
+
     assert result["aoi"] == "aoi_01"
     assert result["score"] >= result["threshold"]
     assert result["pass"] is True
     assert Path(result["artifacts"]["candidate"]).exists()
     assert Path(result["artifacts"]["diff"]).exists()
 
+
 def test_acceptance_run_all(tmp_path):
     artifacts_dir = tmp_path / "artifacts"
-    
+
     # run-all should process both aoi_01 and any other folders in tests/golden
     exit_code = main(["acceptance", "run-all", "--artifacts", str(artifacts_dir)])
-    
+
     assert exit_code == 0
-    
+
     # Check if aoi_01 result exists
     assert (artifacts_dir / "aoi_01" / "result.json").exists()
+
+
+def test_acceptance_run_all_jobs(tmp_path, capsys):
+    import json
+
+    serial_dir = tmp_path / "serial"
+    assert main(["acceptance", "run-all", "--artifacts", str(serial_dir)]) == 0
+    serial_out = capsys.readouterr().out
+
+    parallel_dir = tmp_path / "parallel"
+    assert main(["acceptance", "run-all", "--artifacts", str(parallel_dir), "--jobs", "2"]) == 0
+    # Same lines in the same order, regardless of which worker finished first
+    assert capsys.readouterr().out == serial_out
+    assert serial_out.index("aoi_01") < serial_out.index("aoi_02")
+
+    summary = json.loads((parallel_dir / "summary.json").read_text())
+    assert summary["total"] == 2
+    assert summary["passed"] == 2
+    assert summary["failed"] == []
+    assert [r["aoi"] for r in summary["aois"]] == ["aoi_01", "aoi_02"]
+    assert all(r["seconds"] > 0 for r in summary["aois"])
+    serial = json.loads((serial_dir / "summary.json").read_text())
+    assert [r["score"] for r in serial["aois"]] == [r["score"] for r in summary["aois"]]
+
+
+def test_run_aoi_without_images(tmp_path):
+    import numpy as np
+    from PIL import Image
+
+    from mapgen.acceptance.run import run_aoi
+
+    aoi_dir = Path("tests/golden/aoi_01")
+    result = run_aoi(aoi_dir, tmp_path, write_images=False)
+    assert result["pass"] is True
+    assert result["artifacts"] == {}
+    assert not (tmp_path / "candidate.png").exists()
+
+    # A result without images is not reused when the images are wanted
+    result = run_aoi(aoi_dir, tmp_path)
+    assert result["cached"] is False
+    with Image.open(aoi_dir / "ref.png") as ref, Image.open(tmp_path / "candidate.png") as cand:
+        assert np.array_equal(np.asarray(ref.convert("RGB")), np.asarray(cand.convert("RGB")))
+    with Image.open(tmp_path / "diff.png") as diff:
+        assert not np.asarray(diff).any()
+    assert run_aoi(aoi_dir, tmp_path, write_images=False)["cached"] is True
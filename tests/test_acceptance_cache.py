@@ -0,0 +1,84 @@
+import json
+import shutil
+from pathlib import Path
+
+from mapgen.acceptance import cache
+from mapgen.cli import main
+
+GOLDEN = Path("tests/golden")
+
+
+def _run_all(golden: Path, artifacts: Path, *extra: str) -> dict:
+    assert (
+        main(
+            [
+                "acceptance",
+                "run-all",
+                "--golden-dir",
+                str(golden),
+                "--artifacts",
+                str(artifacts),
+                *extra,
+            ]
+        )
+        == 0
+    )
+    summary = json.loads((artifacts / "summary.json").read_text())
+    return {r["aoi"]: r["cached"] for r in summary["aois"]}
+
+
+def test_unchanged_aois_reuse_previous_results(tmp_path, monkeypatch):
+    golden = tmp_path / "golden"
+    for aoi in ("aoi_01", "aoi_02"):
+        shutil.copytree(GOLDEN / aoi, golden / aoi)
+    artifacts = tmp_path / "artifacts"
+
+    assert _run_all(golden, artifacts) == {"aoi_01": False, "aoi_02": False}
+    first = json.loads((artifacts / "aoi_01" / "result.json").read_text())
+    assert _run_all(golden, artifacts) == {"aoi_01": True, "aoi_02": True}
+    assert json.loads((artifacts / "aoi_01" / "result.json").read_text()) == first
+
+    # A changed input re-runs only its AOI
+    (golden / "aoi_02" / "threshold.txt").write_text("0.5\n")
+    assert _run_all(golden, artifacts) == {"aoi_01": True, "aoi_02": False}
+
+    # So does a missing artifact
+    (artifacts / "aoi_01" / "diff.png").unlink()
+    assert _run_all(golden, artifacts) == {"aoi_01": False, "aoi_02": True}
+
+    assert _run_all(golden, artifacts, "--force") == {"aoi_01": False, "aoi_02": False}
+
+    # Changed rendering code invalidates every result
+    monkeypatch.setattr(cache, "code_fingerprint", lambda: "changed")
+    assert _run_all(golden, artifacts) == {"aoi_01": False, "aoi_02": False}
+
+
+def test_code_fingerprint_covers_rendering_code():
+    assert len(cache.code_fingerprint()) == 64
+    assert "render" in cache.CODE_PACKAGES
+    assert cache.input_key(GOLDEN / "aoi_01") != cache.input_key(GOLDEN / "aoi_02")
+    assert cache.input_key(GOLDEN / "aoi_01") != cache.input_key(GOLDEN / "aoi_01", streaming=True)
+
+
+def test_code_fingerprint_covers_image_loading_and_skimage(monkeypatch):
+    cache.code_fingerprint.cache_clear()
+    before = cache.code_fingerprint()
+    version = cache.metadata.version
+    monkeypatch.setattr(
+        cache.metadata, "version", lambda name: "0.0" if name == "scikit-image" else version(name)
+    )
+    cache.code_fingerprint.cache_clear()
+    assert cache.code_fingerprint() != before
+    monkeypatch.undo()
+
+    read_bytes = Path.read_bytes
+    monkeypatch.setattr(
+        Path,
+        "read_bytes",
+        lambda path: read_bytes(path) + (b"#" if path.name == "images.py" else b""),
+    )
+    cache.code_fingerprint.cache_clear()
+    assert cache.code_fingerprint() != before
+    monkeypatch.undo()
+    cache.code_fingerprint.cache_clear()
+    assert cache.code_fingerprint() == before
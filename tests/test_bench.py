@@ -0,0 +1,113 @@
+"""Tests for the `mapgen bench` benchmark suite."""
+
+import json
+
+import pytest
+
+from mapgen.bench import (
+    BENCHMARKS,
+    BenchResult,
+    compare,
+    read_results,
+    run_benchmarks,
+    write_results,
+    write_synthetic_omap,
+)
+from mapgen.cli import main
+from mapgen.omap import load_omap
+from mapgen.omap.model import COORD_CLOSE_POINT, COORD_CURVE_START
+
+
+def test_synthetic_map_has_requested_shape(tmp_path):
+    path = tmp_path / "synthetic.omap"
+    extent = write_synthetic_omap(path, 5000, parts=3, curve_fraction=0.5)
+    doc = load_omap(path)
+    assert len(doc.root.findall(".//{*}part")) == 3
+
+    objects = doc.get_objects()
+    vertices = sum(len(o.coords) for o in objects)
+    assert 5000 <= vertices < 5100
+    assert {o.type for o in objects} == {2, 3}
+    curved = [o for o in objects if o.flags[0] & COORD_CURVE_START]
+    assert 0.3 < len(curved) / len(objects) < 0.7
+    for o in objects:
+        assert (o.coords.min(axis=0) >= extent[:2]).all() and (
+            o.coords.max(axis=0) <= extent[2:]
+        ).all()
+        if o.type == 3:
+            assert o.flags[-1] & COORD_CLOSE_POINT
+
+    # Seeded, so repeated runs time the same map
+    again = tmp_path / "again.omap"
+    write_synthetic_omap(again, 5000, parts=3, curve_fraction=0.5)
+    assert again.read_bytes() == path.read_bytes()
+
+
+def test_run_benchmarks_times_every_benchmark(tmp_path):
+    reported = []
+    results = run_benchmarks(
+        tmp_path, [300, 600], size_px=(64, 64), repeat=2, report=reported.append
+    )
+    assert [(r.name, r.vertices) for r in results] == [
+        (n, v) for v in (300, 600) for n in BENCHMARKS
+    ]
+    assert reported == results
+    assert all(len(r.runs) == 2 and r.seconds > 0 for r in results)
+
+    path = tmp_path / "results.json"
+    write_results(results, path)
+    assert read_results(path) == results
+    assert json.loads(path.read_text())["results"][0]["seconds"] == results[0].seconds
+
+    with pytest.raises(ValueError, match="Unknown benchmarks"):
+        run_benchmarks(tmp_path, [300], names=["load_omap", "nope"])
+
+
+def test_regressions_need_relative_and_absolute_slowdown():
+    baseline = [
+        BenchResult("a", 10, [1.0]),
+        BenchResult("b", 10, [0.001]),
+        BenchResult("c", 10, [1.0]),
+    ]
+    results = [
+        BenchResult("a", 10, [1.3, 1.1]),  # Best run within tolerance
+        BenchResult("b", 10, [0.002]),  # Twice as slow, but below the noise floor
+        BenchResult("c", 10, [1.5]),
+        BenchResult("c", 20, [9.0]),  # Not in the baseline
+    ]
+    comparisons = compare(results, baseline)
+    assert [(c.name, c.vertices) for c in comparisons] == [("a", 10), ("b", 10), ("c", 10)]
+    assert comparisons[0].change == pytest.approx(0.1)
+    assert [c.regressed(0.2) for c in comparisons] == [False, False, True]
+
+
+def test_bench_command_fails_on_regression(tmp_path, capsys, monkeypatch):
+    # These runs take less than the noise floor
+    monkeypatch.setattr("mapgen.bench._NOISE_SECONDS", 0.0)
+    args = [
+        "bench",
+        "--vertices",
+        "300",
+        "--size",
+        "32,32",
+        "--repeat",
+        "1",
+        "--only",
+        "load_omap,render_omap_to_png",
+        "--work-dir",
+        str(tmp_path),
+        "--out",
+        str(tmp_path / "results.json"),
+    ]
+    assert main(args) == 0
+    results = read_results(tmp_path / "results.json")
+    assert [r.name for r in results] == ["load_omap", "render_omap_to_png"]
+
+    fast = tmp_path / "fast.json"
+    write_results([BenchResult(r.name, r.vertices, [r.seconds / 100]) for r in results], fast)
+    capsys.readouterr()
+    assert main([*args, "--baseline", str(fast)]) == 2
+    assert "REGRESSION" in capsys.readouterr().out
+
+    assert main([*args, "--vertices", "many"]) == 1
+    assert main([*args, "--baseline", str(tmp_path / "missing.json")]) == 1
@@ -2,6 +2,9 @@
 
 import subprocess
 import sys
+from pathlib import Path
+
+import pytest
 
 
 def test_cli_help() -> None:
@@ -16,3 +19,44 @@ def test_cli_help() -> None:
     assert result.returncode == 0
     assert "usage: mapgen" in result.stdout
     assert "generate" in result.stdout  # Ensure our placeholder command is visible
+
+
+# Third-party packages that take long to import
+HEAVY_MODULES = {"numpy", "PIL", "pydantic", "scipy", "skimage"}
+
+
+def _modules_loaded_by(argv: list[str]) -> set[str]:
+    """Top-level packages the CLI imports for a command, in a fresh interpreter."""
+    code = (
+        "import sys\n"
+        "from mapgen.cli import main\n"
+        "try:\n"
+        f"    main({argv!r})\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(' '.join(sorted({m.split('.')[0] for m in sys.modules})))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return set(result.stdout.splitlines()[-1].split())
+
+
+@pytest.mark.parametrize(
+    "argv, needed",
+    [
+        (["--help"], set()),
+        (["omap", "roundtrip", "--help"], set()),
+        (["raster", "process", "--help"], set()),
+        (["acceptance", "run-all", "--help"], set()),
+        (
+            ["omap", "roundtrip", "--in", "tests/fixtures/minimal.omap", "--out", "{tmp}/out.omap"],
+            {"numpy"},
+        ),
+    ],
+)
+def test_commands_import_only_what_they_need(
+    tmp_path: Path, argv: list[str], needed: set[str]
+) -> None:
+    argv = [arg.format(tmp=tmp_path) for arg in argv]
+    assert _modules_loaded_by(argv) & HEAVY_MODULES == needed
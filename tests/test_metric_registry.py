@@ -0,0 +1,136 @@
+import json
+import math
+
+import numpy as np
+import pytest
+from PIL import Image
+from skimage.metrics import peak_signal_noise_ratio
+
+from mapgen.cli import main
+from mapgen.metrics import METRICS, compute_metric, get_metric, metric_names, register_metric
+from mapgen.metrics.fast import color_iou, psnr
+from mapgen.metrics.similarity import ms_ssim
+
+
+def test_builtin_metrics_are_registered():
+    assert metric_names()[:4] == ["ssim", "ms_ssim", "psnr", "color_iou"]
+    with pytest.raises(ValueError, match="Unknown metric 'mse'"):
+        get_metric("mse")
+
+
+@pytest.mark.parametrize("name", ["ssim", "ms_ssim", "psnr", "color_iou"])
+def test_metrics_rank_identical_above_shifted(tmp_path, name, map_like):
+    ref = map_like(0, (120, 90, 3))
+    paths = {}
+    for key, img in (
+        ("ref", ref),
+        ("shift1", np.roll(ref, 1, axis=1)),
+        ("shift5", np.roll(ref, 5, axis=1)),
+    ):
+        paths[key] = str(tmp_path / f"{key}.png")
+        Image.fromarray(img).save(paths[key])
+
+    same = compute_metric(name, paths["ref"], paths["ref"])
+    near = compute_metric(name, paths["ref"], paths["shift1"])
+    far = compute_metric(name, paths["ref"], paths["shift5"])
+    assert same > near > far
+    # Block layout and threads do not change the score
+    assert compute_metric(
+        name, paths["ref"], paths["shift1"], tile_size=16, workers=3
+    ) == pytest.approx(near, abs=1e-12)
+
+
+def test_psnr_matches_skimage(map_like):
+    ref = map_like(1, (64, 80, 3))
+    cand = np.roll(ref, 2, axis=0)
+    assert psnr(ref, cand, tile_size=7) == pytest.approx(
+        peak_signal_noise_ratio(ref, cand, data_range=255)
+    )
+    assert psnr(ref, ref) == pytest.approx(20 * math.log10(255) + 10 * math.log10(ref.size))
+    assert psnr(ref, ref) > psnr(ref, cand)
+
+
+def test_identical_psnr_is_written_as_standard_json(tmp_path, map_like):
+    img = tmp_path / "img.png"
+    Image.fromarray(map_like(4, (20, 20, 3))).save(img)
+    out = tmp_path / "score.json"
+    args = ["score", "--ref", str(img), "--cand", str(img), "--metric", "psnr", "--out", str(out)]
+    assert main(args) == 0
+
+    def reject(token):
+        raise ValueError(f"non-standard JSON constant {token}")
+
+    assert math.isfinite(json.loads(out.read_text(), parse_constant=reject)["score"])
+
+
+def test_color_iou_counts_color_classes():
+    ref = np.full((4, 4, 3), 255, dtype=np.uint8)
+    ref[:2] = (200, 0, 0)
+    cand = ref.copy()
+    cand[1] = 255
+    # Red: 4 shared of 8 pixels, white: 8 shared of 12; a shade within the
+    # quantization step is the same class
+    assert color_iou(ref, cand) == pytest.approx((4 / 8 + 8 / 12) / 2)
+    assert color_iou(ref, ref | 3) == 1.0
+
+
+def test_ms_ssim_uses_fewer_scales_on_small_images(map_like):
+    ref = map_like(2, (30, 200, 3))[..., 0]
+    assert ms_ssim(ref, ref) == pytest.approx(1.0)
+    # 30 px only allows two scales; a 6 px image has no full window
+    assert 0 < ms_ssim(ref, np.roll(ref, 1, axis=1)) < 1
+    with pytest.raises(ValueError, match="at least 7x7"):
+        ms_ssim(ref[:6], ref[:6])
+
+
+def test_registered_metric_is_available_to_score_cli(tmp_path):
+    register_metric(
+        "max_abs",
+        "L",
+        lambda ref, cand, tile_size, workers: 255.0 - np.abs(ref.astype(int) - cand).max(),
+    )
+    try:
+        img = tmp_path / "img.png"
+        Image.fromarray(np.zeros((10, 10), dtype=np.uint8)).save(img)
+        out = tmp_path / "score.json"
+        assert (
+            main(
+                [
+                    "score",
+                    "--ref",
+                    str(img),
+                    "--cand",
+                    str(img),
+                    "--metric",
+                    "max_abs",
+                    "--out",
+                    str(out),
+                ]
+            )
+            == 0
+        )
+        assert json.loads(out.read_text()) == {
+            "metric": "max_abs",
+            "score": 255.0,
+            "reference": str(img),
+            "candidate": str(img),
+        }
+    finally:
+        del METRICS["max_abs"]
+
+
+def test_score_cli_psnr_batch(tmp_path, map_like):
+    ref = map_like(3, (40, 40, 3))
+    ref_path, cand_path = tmp_path / "ref.png", tmp_path / "cand.png"
+    Image.fromarray(ref).save(ref_path)
+    Image.fromarray(np.roll(ref, 1, axis=0)).save(cand_path)
+    manifest = tmp_path / "pairs.jsonl"
+    manifest.write_text(json.dumps({"ref": str(ref_path), "cand": str(cand_path)}) + "\n")
+
+    out = tmp_path / "scores.json"
+    assert main(["score", "--batch", str(manifest), "--metric", "psnr", "--out", str(out)]) == 0
+    data = json.loads(out.read_text())
+    assert data["metric"] == "psnr"
+    assert data["results"][0]["score"] == pytest.approx(
+        compute_metric("psnr", str(ref_path), str(cand_path))
+    )
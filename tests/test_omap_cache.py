@@ -0,0 +1,86 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from mapgen.cli import main
+from mapgen.omap import load_omap
+from mapgen.omap.cache import cache_path, read_cache, write_cache
+from mapgen.render.renderer import render_omap_to_png
+
+
+def _copy_fixture(tmp_path: Path, name: str) -> Path:
+    path = tmp_path / name
+    shutil.copy(Path("tests/fixtures") / name, path)
+    return path
+
+
+def test_cache_roundtrip(tmp_path: Path):
+    omap_path = _copy_fixture(tmp_path, "complex.omap")
+    doc = load_omap(omap_path)
+    cache_file = cache_path(omap_path)
+    assert cache_file == tmp_path / "complex.omap.cache"
+
+    write_cache(doc, omap_path, cache_file)
+    cached = read_cache(omap_path, cache_file)
+
+    assert cached is not None
+    assert cached.version == doc.version
+    assert cached.get_colors() == doc.get_colors()
+    assert cached.get_symbols() == doc.get_symbols()
+    assert cached.get_part_names() == doc.get_part_names()
+    assert cached.get_objects() == doc.get_objects()
+    # Coordinates are served straight from the memory-mapped file
+    assert not cached.get_object_store().vertices.flags.writeable
+
+    # load_omap picks the sidecar up transparently; the XML is parsed on demand
+    loaded = load_omap(omap_path)
+    assert loaded.get_objects() == doc.get_objects()
+    assert loaded.root.tag == doc.root.tag
+
+
+def test_cache_invalidation(tmp_path: Path, monkeypatch):
+    omap_path = _copy_fixture(tmp_path, "minimal.omap")
+    cache_file = cache_path(omap_path, tmp_path / "cache")
+    write_cache(load_omap(omap_path), omap_path, cache_file)
+
+    # Touching the file keeps the cache, the content hash still matches
+    stat = omap_path.stat()
+    os.utime(omap_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert read_cache(omap_path, cache_file) is not None
+    # ...and records the new mtime, so the next load does not hash the file again
+    with monkeypatch.context() as m:
+        m.setattr("mapgen.omap.cache.file_sha256", lambda path: pytest.fail("hashed again"))
+        cached = read_cache(omap_path, cache_file)
+    assert cached is not None and cached.get_objects() == load_omap(omap_path).get_objects()
+
+    # Changing a coordinate invalidates it
+    omap_path.write_text(omap_path.read_text().replace("90 90;", "80 80;"))
+    assert read_cache(omap_path, cache_file) is None
+    reloaded = load_omap(omap_path, cache_dir=tmp_path / "cache")
+    assert reloaded.get_objects()[0].coords[2].tolist() == [80, 80]
+
+
+def test_render_with_cache_dir(tmp_path: Path):
+    omap_path = Path("tests/fixtures/minimal.omap")
+    cache_dir = tmp_path / "cache"
+    cold = tmp_path / "cold.png"
+    warm = tmp_path / "warm.png"
+
+    render_omap_to_png(omap_path, cold, (0, 0, 100, 100), (512, 512), cache_dir=cache_dir)
+    assert cache_path(omap_path, cache_dir).exists()
+    render_omap_to_png(omap_path, warm, (0, 0, 100, 100), (512, 512), cache_dir=cache_dir)
+
+    expected = np.array(Image.open("tests/golden/render_minimal/expected.png"))
+    assert np.array_equal(np.array(Image.open(cold)), expected)
+    assert np.array_equal(np.array(Image.open(warm)), expected)
+
+
+def test_cli_compile(tmp_path: Path, capsys):
+    omap_path = _copy_fixture(tmp_path, "complex.omap")
+    assert main(["omap", "compile", "--in", str(omap_path)]) == 0
+    assert "Objects: 4" in capsys.readouterr().out
+    assert (tmp_path / "complex.omap.cache").exists()
@@ -0,0 +1,106 @@
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from mapgen.omap import load_omap
+from mapgen.omap.curves import flatten_curves
+from mapgen.omap.model import COORD_CLOSE_POINT, COORD_CURVE_START
+from mapgen.render.renderer import render_omap_to_png
+
+CURVED_MAP = """<?xml version="1.0" encoding="UTF-8"?>
+<map xmlns="http://openorienteering.org/apps/mapper/xml/v2" version="9">
+<colors count="1">
+<color priority="0" name="Black"><rgb r="0" g="0" b="0"/></color>
+</colors>
+<symbols count="1">
+<symbol type="2" id="0" code="101" name="Line"><line_symbol color="0" line_width="100"/></symbol>
+</symbols>
+<object symbol="0" type="2">
+<coords count="7">10 10 1;10 90;90 90;90 10 1;60 0;40 40;20 50;</coords></object>
+<object symbol="0" type="2"><coords count="2">0 0;100 20;</coords></object>
+</map>
+"""
+
+
+def _bezier(p: np.ndarray, t: np.ndarray) -> np.ndarray:
+    t = t[:, None]
+    return (
+        (1 - t) ** 3 * p[0] + 3 * (1 - t) ** 2 * t * p[1] + 3 * (1 - t) * t**2 * p[2] + t**3 * p[3]
+    )
+
+
+def _distance_to_polyline(points: np.ndarray, polyline: np.ndarray) -> np.ndarray:
+    a, b = polyline[:-1], polyline[1:]
+    ab = b - a
+    t = np.clip(((points[:, None] - a) * ab).sum(-1) / (ab * ab).sum(-1), 0, 1)
+    closest = a + t[..., None] * ab
+    return np.linalg.norm(points[:, None] - closest, axis=-1).min(axis=1)
+
+
+def test_without_curves_inputs_are_returned():
+    vertices = np.array([[0.0, 0.0], [1.0, 1.0]])
+    flags = np.array([0, COORD_CLOSE_POINT], dtype=np.uint8)
+    offsets = np.array([0, 2])
+    assert flatten_curves(vertices, flags, offsets, 0.1)[0] is vertices
+
+
+def test_flattened_curve_stays_within_tolerance():
+    control = np.array([[0.0, 0.0], [0.0, 100.0], [100.0, 100.0], [100.0, 0.0]])
+    flags = np.array([COORD_CURVE_START, 0, 0, COORD_CLOSE_POINT], dtype=np.uint8)
+    for tolerance in (5.0, 0.5, 0.05):
+        vertices, out_flags, offsets = flatten_curves(control, flags, np.array([0, 4]), tolerance)
+
+        assert np.array_equal(vertices[0], control[0]) and np.array_equal(vertices[-1], control[3])
+        assert not (out_flags & COORD_CURVE_START).any()
+        assert out_flags[-1] == COORD_CLOSE_POINT
+        assert offsets.tolist() == [0, len(vertices)]
+        curve = _bezier(control, np.linspace(0, 1, 2001))
+        assert _distance_to_polyline(curve, vertices).max() <= tolerance
+
+
+def test_flattening_many_objects_matches_one_by_one():
+    rng = np.random.default_rng(3)
+    vertices = rng.uniform(0, 100, size=(40, 2))
+    flags = np.zeros(40, dtype=np.uint8)
+    # Chained curves, a curve cut off by the object end and a curve in the last object
+    flags[[0, 3, 8, 17, 20, 36, 38]] = COORD_CURVE_START
+    offsets = np.array([0, 7, 10, 19, 30, 40])
+
+    all_vertices, all_flags, all_offsets = flatten_curves(vertices, flags, offsets, 0.2)
+    for i in range(len(offsets) - 1):
+        a, b = offsets[i], offsets[i + 1]
+        single, single_flags, _ = flatten_curves(
+            vertices[a:b], flags[a:b], np.array([0, b - a]), 0.2
+        )
+        assert np.allclose(all_vertices[all_offsets[i] : all_offsets[i + 1]], single)
+        assert np.array_equal(all_flags[all_offsets[i] : all_offsets[i + 1]], single_flags)
+
+
+def test_flattened_store_is_cached_per_level(tmp_path: Path):
+    omap_path = tmp_path / "curved.omap"
+    omap_path.write_text(CURVED_MAP)
+    doc = load_omap(omap_path)
+
+    store = doc.get_flattened_store(0.3)
+    assert doc.get_flattened_store(0.4) is store
+    assert doc.get_flattened_store(0.1) is not store
+    assert len(store) == 2
+    assert len(store[0].coords) > 7
+    # Objects without curves are left alone
+    assert np.array_equal(store[1].coords, doc.get_object_store()[1].coords)
+
+
+def test_streaming_render_flattens_like_document_render(tmp_path: Path):
+    omap_path = tmp_path / "curved.omap"
+    omap_path.write_text(CURVED_MAP)
+    loaded = tmp_path / "loaded.png"
+    streamed = tmp_path / "streamed.png"
+    render_omap_to_png(omap_path, loaded, (0, 0, 100, 100), (200, 200))
+    render_omap_to_png(omap_path, streamed, (0, 0, 100, 100), (200, 200), streaming=True)
+
+    with Image.open(loaded) as a, Image.open(streamed) as b:
+        pixels = np.array(a)
+        assert np.array_equal(pixels, np.array(b))
+    # The control point at (10, 90) is far off the curve and must not be drawn
+    assert (pixels[18:22, 18:22] == 255).all()
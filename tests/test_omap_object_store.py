@@ -0,0 +1,55 @@
+import numpy as np
+
+from mapgen.omap import load_omap
+from mapgen.omap.coords import parse_coords
+from mapgen.omap.model import COORD_CLOSE_POINT, COORD_CURVE_START, COORD_HOLE_POINT
+
+
+def test_parse_coords_keeps_flags_and_object_boundaries():
+    texts = [
+        "-19106 -39737 1;-26870 -30908;-39580 -25442;-35431 -14442 18;",
+        None,
+        " 0 0;\n100 100 ",
+        "1.5 2.5;;3 4 2;",
+    ]
+    vertices, flags, counts = parse_coords(texts)
+
+    assert counts.tolist() == [4, 0, 2, 2]
+    assert vertices.dtype == np.float64
+    assert vertices.tolist() == [
+        [-19106, -39737],
+        [-26870, -30908],
+        [-39580, -25442],
+        [-35431, -14442],
+        [0, 0],
+        [100, 100],
+        [1.5, 2.5],
+        [3, 4],
+    ]
+    assert flags.tolist() == [
+        COORD_CURVE_START,
+        0,
+        0,
+        COORD_HOLE_POINT | COORD_CLOSE_POINT,
+        0,
+        0,
+        0,
+        2,
+    ]
+
+
+def test_object_store_views():
+    doc = load_omap("tests/fixtures/minimal.omap")
+    store = doc.get_object_store()
+
+    assert len(store) == 2
+    assert store.offsets.tolist() == [0, 5, 7]
+    assert store.symbol_ids.tolist() == [1, 0]
+    assert store.types.tolist() == [3, 2]
+
+    area, line = doc.get_objects()
+    assert area.symbol_id == 1 and area.type == 3
+    assert area.coords.tolist() == [[10, 10], [90, 10], [90, 90], [10, 90], [10, 10]]
+    assert area.flags.tolist() == [0, 0, 0, 0, COORD_CLOSE_POINT]
+    # Views share the document's vertex buffer instead of copying it
+    assert np.shares_memory(line.coords, store.vertices)
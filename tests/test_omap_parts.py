@@ -0,0 +1,105 @@
+from pathlib import Path
+
+import numpy as np
+
+from mapgen.omap import iter_omap, load_omap
+from mapgen.omap.model import Object
+from mapgen.omap.parts import load_parts_parallel, parse_parts_parallel, split_parts, strip_parts
+
+FIXTURE_PATH = Path("tests/fixtures/complex.omap")
+
+
+def _write_multipart(tmp_path: Path, n_parts: int) -> Path:
+    """Copies the fixture with its single map part repeated under different names."""
+    text = FIXTURE_PATH.read_text(encoding="utf-8")
+    start = text.index("<part name=")
+    end = text.index("</part>", start) + len("</part>")
+    part = text[start:end]
+    parts = "\n".join(part.replace('name="', f'name="Layer {i} ', 1) for i in range(n_parts))
+    out = tmp_path / "multipart.omap"
+    out.write_text(text[:start] + parts + text[end:], encoding="utf-8")
+    return out
+
+
+def _assert_parallel_falls_back(omap_path: Path) -> None:
+    """The parts are not split out of the file; the parallel load matches the serial one."""
+    assert load_parts_parallel(omap_path, 2) is None
+    assert parse_parts_parallel(omap_path, 3, 2) is None
+    serial = load_omap(omap_path)
+    parallel = load_omap(omap_path, workers=2)
+    assert parallel.get_part_names() == serial.get_part_names()
+    assert parallel.get_objects() == serial.get_objects()
+
+
+def test_objects_are_read_from_parts():
+    doc = load_omap(FIXTURE_PATH)
+    objects = doc.get_objects()
+
+    assert len(objects) == 4
+    assert [obj.symbol_id for obj in objects] == [0, 76, 41, 17]
+    assert objects[1].coords[0].tolist() == [-19106, -39737]
+    # Symbols inside the <barrier> wrapper are found as well
+    assert 76 in doc.get_symbols()
+
+
+def test_split_parts_ignores_combined_symbol_parts():
+    blobs = split_parts(FIXTURE_PATH.read_bytes())
+    assert len(blobs) == 1
+    assert blobs[0].startswith(b"<part name=")
+
+
+def test_strip_parts_keeps_empty_parts():
+    data = FIXTURE_PATH.read_bytes()
+    skeleton, blobs = strip_parts(data)
+    assert blobs == split_parts(data)
+    assert b"<object " not in skeleton.split(b"<parts", 1)[1]
+    assert b'<part name="' in skeleton and len(skeleton) < len(data)
+
+
+def test_parallel_parts_match_serial(tmp_path: Path):
+    omap_path = _write_multipart(tmp_path, 3)
+
+    serial = load_omap(omap_path)
+    parallel = load_omap(omap_path, workers=2)
+
+    assert serial.get_part_names()[2].startswith("Layer 2")
+    serial_store = serial.get_object_store()
+    parallel_store = parallel.get_object_store()
+    assert serial_store.part_ids.tolist() == [0] * 4 + [1] * 4 + [2] * 4
+    np.testing.assert_array_equal(parallel_store.part_ids, serial_store.part_ids)
+    np.testing.assert_array_equal(parallel_store.vertices, serial_store.vertices)
+    np.testing.assert_array_equal(parallel_store.offsets, serial_store.offsets)
+    assert parallel.get_objects() == serial.get_objects()
+    assert parallel.get_symbols() == serial.get_symbols()
+    assert parallel.get_part_names() == serial.get_part_names()
+    # The full tree is only parsed when asked for
+    assert parallel._root is None
+    assert len(parallel.root.findall(".//omap:part/omap:objects/omap:object", parallel.ns)) == 12
+
+    streamed = [r for r in iter_omap(omap_path) if isinstance(r, Object)]
+    assert streamed == serial.get_objects()
+    assert [obj.store.part_ids[obj.index] for obj in streamed] == serial_store.part_ids.tolist()
+
+
+def test_parallel_load_falls_back_for_other_encodings(tmp_path: Path):
+    omap_path = _write_multipart(tmp_path, 3)
+    text = omap_path.read_text(encoding="utf-8").replace(
+        'encoding="UTF-8"', 'encoding="ISO-8859-1"', 1
+    )
+    text = text.replace('name="Layer 1 ', 'name="Layer 1 \u00e9 ', 1)
+    omap_path.write_bytes(text.encode("latin-1", "xmlcharrefreplace"))
+
+    _assert_parallel_falls_back(omap_path)
+    assert "\u00e9" in load_omap(omap_path, workers=2).get_part_names()[1]
+
+
+def test_parallel_load_falls_back_for_prefixed_tags(tmp_path: Path):
+    omap_path = _write_multipart(tmp_path, 3)
+    text = omap_path.read_text(encoding="utf-8")
+    text = text.replace(
+        "<map ", '<map xmlns:o="http://openorienteering.org/apps/mapper/xml/v2" ', 1
+    )
+    omap_path.write_text(text.replace("<object ", "<o:object ").replace("</object>", "</o:object>"))
+
+    _assert_parallel_falls_back(omap_path)
+    assert len(load_omap(omap_path).get_objects()) == 12
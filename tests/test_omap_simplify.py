@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from mapgen.omap import load_omap
+from mapgen.omap.simplify import simplify_polylines
+from mapgen.render.renderer import render_omap_to_png
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<map xmlns="http://openorienteering.org/apps/mapper/xml/v2" version="9">
+<colors count="2">
+<color priority="0" name="Black"><rgb r="0" g="0" b="0"/></color>
+<color priority="1" name="Yellow"><rgb r="1" g="0.8" b="0.2"/></color>
+</colors>
+<symbols count="2">
+<symbol type="2" id="0" code="101" name="Contour"><line_symbol color="0" line_width="60"/></symbol>
+<symbol type="4" id="1" code="401" name="Open"><area_symbol inner_color="1"/></symbol>
+</symbols>
+"""
+
+
+def _wiggly_rings(n_objects: int, n_vertices: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rings = []
+    t = np.linspace(0, 2 * np.pi, n_vertices)
+    for _ in range(n_objects):
+        r = rng.uniform(5, 30) + np.cumsum(rng.normal(0, 0.05, n_vertices))
+        center = rng.uniform(20, 80, size=2)
+        rings.append(np.c_[center[0] + r * np.cos(t), center[1] + r * np.sin(t)])
+    return np.concatenate(rings)
+
+
+def _write_dense_map(path: Path, n_objects: int, n_vertices: int) -> None:
+    vertices = _wiggly_rings(n_objects, n_vertices, seed=1).reshape(n_objects, n_vertices, 2)
+    lines = [HEADER]
+    for i, ring in enumerate(vertices):
+        symbol, obj_type = (1, 3) if i % 3 == 0 else (0, 2)
+        coords = ";".join(f"{x:.4f} {y:.4f}" for x, y in ring)
+        lines.append(
+            f'<object symbol="{symbol}" type="{obj_type}">'
+            f'<coords count="{n_vertices}">{coords};</coords></object>'
+        )
+    lines.append("</map>")
+    path.write_text("\n".join(lines))
+
+
+def _distance_to_polyline(points: np.ndarray, polyline: np.ndarray) -> np.ndarray:
+    a, b = polyline[:-1], polyline[1:]
+    ab = b - a
+    length2 = np.maximum((ab * ab).sum(-1), 1e-18)
+    t = np.clip(((points[:, None] - a) * ab).sum(-1) / length2, 0, 1)
+    return np.linalg.norm(points[:, None] - (a + t[..., None] * ab), axis=-1).min(axis=1)
+
+
+def test_simplified_outlines_stay_within_tolerance():
+    vertices = _wiggly_rings(4, 500, seed=0)
+    flags = np.zeros(len(vertices), dtype=np.uint8)
+    offsets = np.arange(0, len(vertices) + 1, 500)
+    for tolerance in (0.05, 0.5, 3.0):
+        out, out_flags, out_offsets = simplify_polylines(vertices, flags, offsets, tolerance)
+
+        assert len(out) < len(vertices) and len(out_flags) == len(out)
+        for i in range(4):
+            original = vertices[offsets[i] : offsets[i + 1]]
+            simplified = out[out_offsets[i] : out_offsets[i + 1]]
+            assert np.array_equal(simplified[0], original[0])
+            assert np.array_equal(simplified[-1], original[-1])
+            assert _distance_to_polyline(original, simplified).max() <= tolerance * (1 + 1e-9)
+
+
+def test_collinear_vertices_are_dropped_and_short_objects_kept():
+    line = np.c_[np.linspace(0, 10, 11), np.zeros(11)]
+    vertices = np.concatenate([line, [[0.0, 0.0], [5.0, 5.0]]])
+    flags = np.zeros(len(vertices), dtype=np.uint8)
+    out, _, offsets = simplify_polylines(vertices, flags, np.array([0, 11, 11, 13]), 0.1)
+
+    assert offsets.tolist() == [0, 2, 2, 4]
+    assert out.tolist() == [[0.0, 0.0], [10.0, 0.0], [0.0, 0.0], [5.0, 5.0]]
+    # Nothing to drop: the inputs come back as they are
+    short = vertices[11:]
+    assert simplify_polylines(short, flags[11:], np.array([0, 2]), 0.1)[0] is short
+
+
+def test_lod_render_is_close_and_draws_fewer_vertices(tmp_path: Path):
+    omap_path = tmp_path / "dense.omap"
+    _write_dense_map(omap_path, 30, 3000)
+    exact = tmp_path / "exact.png"
+    lod = tmp_path / "lod.png"
+    streamed = tmp_path / "streamed.png"
+    render_omap_to_png(omap_path, exact, (0, 0, 100, 100), (128, 128))
+    render_omap_to_png(omap_path, lod, (0, 0, 100, 100), (128, 128), lod=True)
+    render_omap_to_png(omap_path, streamed, (0, 0, 100, 100), (128, 128), streaming=True, lod=True)
+
+    with Image.open(exact) as a, Image.open(lod) as b, Image.open(streamed) as c:
+        exact_px, lod_px, streamed_px = np.array(a), np.array(b), np.array(c)
+    assert np.array_equal(lod_px, streamed_px)
+    assert (exact_px != lod_px).any(axis=-1).mean() < 0.05
+
+    doc = load_omap(omap_path)
+    assert len(doc.get_lod_store(100 / 128).vertices) * 10 < len(doc.get_object_store().vertices)
+    assert doc.get_lod_store(100 / 128) is doc.get_lod_store(0.51)
+
+
+def test_lod_keeps_golden_output(tmp_path: Path):
+    out = tmp_path / "lod.png"
+    render_omap_to_png("tests/fixtures/minimal.omap", out, (0, 0, 100, 100), (512, 512), lod=True)
+    with Image.open(out) as a, Image.open("tests/golden/render_minimal/expected.png") as b:
+        assert np.array_equal(np.array(a.convert("RGB")), np.array(b.convert("RGB")))
@@ -0,0 +1,54 @@
+import numpy as np
+
+from mapgen.omap import load_omap
+from mapgen.omap.model import ObjectStore
+from mapgen.omap.spatial import GridIndex, compute_bounds
+
+
+def _random_store(rng: np.random.Generator, n_objects: int) -> ObjectStore:
+    counts = rng.integers(0, 6, size=n_objects)
+    offsets = np.zeros(n_objects + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    # Small objects scattered over the map plus a few map-wide ones
+    centers = np.repeat(rng.uniform(0, 10000, size=(n_objects, 2)), counts, axis=0)
+    spread = np.repeat(np.where(rng.random(n_objects) < 0.02, 5000.0, 50.0), counts)
+    vertices = centers + rng.normal(size=(len(centers), 2)) * spread[:, None]
+    return ObjectStore(
+        vertices,
+        np.zeros(len(vertices), dtype=np.uint8),
+        offsets,
+        np.zeros(n_objects, dtype=np.int32),
+        np.full(n_objects, 2, dtype=np.int8),
+    )
+
+
+def test_grid_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    store = _random_store(rng, 2000)
+    bounds = compute_bounds(store)
+    index = GridIndex(bounds)
+
+    for _ in range(50):
+        x0, y0 = rng.uniform(-2000, 11000, size=2)
+        w, h = rng.uniform(0, 3000, size=2)
+        bbox = (x0, y0, x0 + w, y0 + h)
+        expected = np.flatnonzero(
+            (bounds[:, 0] <= bbox[2])
+            & (bounds[:, 2] >= bbox[0])
+            & (bounds[:, 1] <= bbox[3])
+            & (bounds[:, 3] >= bbox[1])
+        )
+        np.testing.assert_array_equal(index.query(bbox), expected)
+
+
+def test_document_query_bbox():
+    doc = load_omap("tests/fixtures/minimal.omap")
+
+    assert doc.query_bbox((0, 0, 100, 100)).tolist() == [0, 1]
+    # Only the diagonal line reaches the lower-left corner
+    assert doc.query_bbox((0, 0, 5, 5)).tolist() == [1]
+    assert doc.query_bbox((200, 200, 300, 300)).tolist() == []
+
+    visible = doc.get_object_store().subset(doc.query_bbox((0, 0, 5, 5)))
+    assert visible.offsets.tolist() == [0, 2]
+    assert visible.vertices.tolist() == [[0, 0], [100, 100]]
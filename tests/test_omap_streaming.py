@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from mapgen.omap import iter_omap, load_omap
+from mapgen.omap.model import Color, Object, Symbol
+from mapgen.render.renderer import render_omap_to_png
+
+
+@pytest.mark.parametrize("fixture", ["tests/fixtures/minimal.omap", "tests/fixtures/complex.omap"])
+def test_iter_omap_matches_document(fixture):
+    """
+    The streaming loader must yield the same records as the DOM-based accessors.
+    """
+    doc = load_omap(fixture)
+    records = list(iter_omap(fixture))
+
+    colors = {r.priority: r for r in records if isinstance(r, Color)}
+    symbols = {r.id: r for r in records if isinstance(r, Symbol)}
+    objects = [r for r in records if isinstance(r, Object)]
+
+    assert colors == doc.get_colors()
+    assert symbols == doc.get_symbols()
+    assert objects == doc.get_objects()
+
+
+def test_streaming_render_matches_dom_render(tmp_path: Path):
+    omap_path = Path("tests/fixtures/minimal.omap")
+    dom_png = tmp_path / "dom.png"
+    stream_png = tmp_path / "stream.png"
+
+    render_omap_to_png(omap_path, dom_png, (0, 0, 100, 100), (512, 512))
+    render_omap_to_png(omap_path, stream_png, (0, 0, 100, 100), (512, 512), streaming=True)
+
+    assert np.array_equal(np.array(Image.open(dom_png)), np.array(Image.open(stream_png)))
+
+
+@pytest.mark.parametrize(
+    "option", [{"tile_rows": 64}, {"workers": 2}, {"parse_workers": 2}, {"cache_dir": "cache"}]
+)
+def test_streaming_rejects_options_it_cannot_use(tmp_path: Path, option):
+    with pytest.raises(ValueError, match=f"streaming cannot be combined with {next(iter(option))}"):
+        render_omap_to_png(
+            "tests/fixtures/minimal.omap",
+            tmp_path / "a.png",
+            (0, 0, 100, 100),
+            (8, 8),
+            streaming=True,
+            **option,
+        )
+    assert not (tmp_path / "a.png").exists()
@@ -0,0 +1,93 @@
+"""Tests for the incremental .omap writer behind save_omap."""
+
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytest
+
+from mapgen.omap import load_omap, save_omap
+from mapgen.omap.model import OMapDocument
+from mapgen.omap.writer import OMAP_NAMESPACE, object_element
+
+FIXTURES = [
+    "tests/fixtures/minimal.omap",
+    "tests/fixtures/complex.omap",
+    "tests/fixtures/contours_1.omap",
+]
+
+
+def _elementtree_bytes(root: ET.Element) -> bytes:
+    """What save_omap wrote when it indented and wrote with ElementTree."""
+    ET.register_namespace("", OMAP_NAMESPACE)
+    tree = ET.ElementTree(root)
+    ET.indent(tree, space=" ", level=0)
+    body = ET.tostring(root, encoding="utf-8", xml_declaration=False)
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n' + body
+
+
+def _objects_section(doc: OMapDocument) -> ET.Element:
+    """The element save_omap streams objects into."""
+    for prefix in ("", "omap:barrier/"):
+        section = doc.root.find(f"{prefix}omap:parts/omap:part/omap:objects", doc.ns)
+        if section is not None:
+            return section
+    return doc.root
+
+
+def _take_objects(section: ET.Element) -> list:
+    objects = section.findall(f"{{{OMAP_NAMESPACE}}}object")
+    for obj in objects:
+        section.remove(obj)
+    if "count" in section.attrib:
+        section.set("count", "0")
+    return objects
+
+
+@pytest.mark.parametrize("fixture", FIXTURES)
+def test_output_matches_elementtree(tmp_path: Path, fixture):
+    doc = load_omap(fixture)
+    before = ET.tostring(doc.root)
+    save_omap(doc, tmp_path / "new.omap")
+    # The tree is written as it is, not indented in place
+    assert ET.tostring(doc.root) == before
+
+    expected = _elementtree_bytes(load_omap(fixture).root)
+    assert (tmp_path / "new.omap").read_bytes() == expected
+
+
+@pytest.mark.parametrize("fixture", FIXTURES)
+def test_streamed_objects_match_objects_in_tree(tmp_path: Path, fixture):
+    expected = _elementtree_bytes(load_omap(fixture).root)
+
+    doc = load_omap(fixture)
+    section = _objects_section(doc)
+    objects = _take_objects(section)
+    assert objects
+    save_omap(doc, tmp_path / "elements.omap", (obj for obj in objects))
+    assert (tmp_path / "elements.omap").read_bytes() == expected
+
+    # Records, here into a section left without children
+    records = load_omap(fixture).get_objects()
+    save_omap(doc, tmp_path / "records.omap", iter(records))
+    assert load_omap(tmp_path / "records.omap").get_objects() == records
+    section.extend(map(object_element, records))
+    if "count" in section.attrib:
+        section.set("count", str(len(records)))
+    assert (tmp_path / "records.omap").read_bytes() == _elementtree_bytes(doc.root)
+
+
+def test_undeclared_namespace_is_rejected(tmp_path: Path):
+    doc = load_omap("tests/fixtures/minimal.omap")
+    with pytest.raises(ValueError, match="not declared"):
+        save_omap(doc, tmp_path / "out.omap", iter([ET.Element("{urn:other}object")]))
+
+
+def test_registered_prefixes_match_elementtree(tmp_path: Path):
+    doc = load_omap("tests/fixtures/minimal.omap")
+    xsi = "{http://www.w3.org/2001/XMLSchema-instance}"
+    doc.root.set(f"{xsi}schemaLocation", f"{OMAP_NAMESPACE} mapper.xsd")
+    ET.SubElement(doc.root, "{urn:other}extension", value="1")
+    save_omap(doc, tmp_path / "out.omap")
+    data = (tmp_path / "out.omap").read_bytes()
+    assert b"xsi:schemaLocation" in data
+    assert data == _elementtree_bytes(doc.root)
@@ -10,7 +10,7 @@ def test_raster_help():
         [sys.executable, "-m", "mapgen.cli", "raster", "--help"],
         capture_output=True,
         text=True,
-        check=True
+        check=True,
     )
     assert "Available raster commands" in result.stdout
     assert "process" in result.stdout
@@ -25,7 +25,7 @@ def test_raster_process_smoke():
         [sys.executable, "-m", "mapgen.cli", "raster", "process", "--aoi", "test_aoi"],
         capture_output=True,
         text=True,
-        check=True
+        check=True,
     )
     assert "Processing raster for AOI: test_aoi" in result.stdout
     assert "Status: SUCCESS" in result.stdout
@@ -37,7 +37,7 @@ def test_raster_denoise_smoke():
         [sys.executable, "-m", "mapgen.cli", "raster", "denoise", "--aoi", "test_aoi"],
         capture_output=True,
         text=True,
-        check=True
+        check=True,
     )
     assert "Denoising (denoise=True)" in result.stdout
 
@@ -45,10 +45,20 @@ def test_raster_denoise_smoke():
 def test_raster_binarize_smoke():
     """Verify 'mapgen raster binarize' executes."""
     result = subprocess.run(
-        [sys.executable, "-m", "mapgen.cli", "raster", "binarize", "--aoi", "test_aoi", "--thresholds", "0.4,0.6"],
+        [
+            sys.executable,
+            "-m",
+            "mapgen.cli",
+            "raster",
+            "binarize",
+            "--aoi",
+            "test_aoi",
+            "--thresholds",
+            "0.4,0.6",
+        ],
         capture_output=True,
         text=True,
-        check=True
+        check=True,
     )
     assert "Binarizing (thresholds=[0.4, 0.6])" in result.stdout
 
@@ -56,9 +66,41 @@ def test_raster_binarize_smoke():
 def test_raster_morphology_smoke():
     """Verify 'mapgen raster morphology' executes."""
     result = subprocess.run(
-        [sys.executable, "-m", "mapgen.cli", "raster", "morphology", "--aoi", "test_aoi", "--iterations", "5"],
+        [
+            sys.executable,
+            "-m",
+            "mapgen.cli",
+            "raster",
+            "morphology",
+            "--aoi",
+            "test_aoi",
+            "--iterations",
+            "5",
+        ],
         capture_output=True,
         text=True,
-        check=True
+        check=True,
     )
     assert "Morphology (iterations=5)" in result.stdout
+
+
+def test_raster_window_requires_input():
+    """Verify --window without --input is rejected instead of ignored."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "mapgen.cli",
+            "raster",
+            "process",
+            "--aoi",
+            "test_aoi",
+            "--window",
+            "0,0,8,8",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 2
+    assert "--window requires --input" in result.stderr
+    assert "raster process" in result.stderr
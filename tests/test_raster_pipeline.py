@@ -0,0 +1,197 @@
+"""Tests for the block-wise raster pipeline."""
+
+import json
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+from scipy import ndimage
+
+from mapgen.cli import main
+from mapgen.raster import pipeline
+from mapgen.raster.engine import open_raster, process_raster
+
+
+def _scan(seed: int, shape: tuple[int, int]) -> np.ndarray:
+    """A light raster with dark features and salt and pepper noise."""
+    rng = np.random.default_rng(seed)
+    img = np.full(shape, 230, dtype=np.uint8)
+    for _ in range(20):
+        y, x = rng.integers(0, shape[0]), rng.integers(0, shape[1])
+        h, w = rng.integers(1, 15, size=2)
+        img[y : y + h, x : x + w] = rng.integers(0, 120)
+    noise = rng.random(shape)
+    img[noise < 0.03] = 0
+    img[noise > 0.97] = 255
+    return img
+
+
+@pytest.mark.parametrize("block_size, workers", [(7, None), (16, 2), (1000, None)])
+def test_blocks_match_whole_raster_median(tmp_path, block_size, workers):
+    img = _scan(0, (45, 61))
+    np.save(tmp_path / "src.npy", img)
+    fn = partial(ndimage.median_filter, size=5)
+    process_raster(
+        fn, tmp_path / "src.npy", tmp_path / "dst.npy", img.shape, np.uint8, 2, block_size, workers
+    )
+    assert np.array_equal(
+        open_raster(tmp_path / "dst.npy"), ndimage.median_filter(img, size=5, mode="reflect")
+    )
+    assert not list(tmp_path.glob("*.tmp.npy"))
+
+
+def test_pipeline_stages_do_not_depend_on_block_size(tmp_path):
+    img = _scan(1, (70, 53))
+    np.save(tmp_path / "scan.npy", img)
+    outputs = []
+    for block_size in (9, 1000):
+        target = tmp_path / str(block_size)
+        pipeline.ingest(tmp_path / "scan.npy", target, block_size=block_size)
+        pipeline.denoise(target, True, block_size)
+        pipeline.binarize(target, [0.3, 0.6], block_size)
+        pipeline.morphology(target, 2, block_size)
+        outputs.append(
+            [
+                np.array(open_raster(target / pipeline.DENOISED_FILE)),
+                pipeline.load_planes(target / pipeline.BINARY_FILE),
+                pipeline.load_planes(target / pipeline.MORPHOLOGY_FILE),
+            ]
+        )
+
+    for small, whole in zip(*outputs, strict=True):
+        assert np.array_equal(small, whole)
+    denoised, binary, cleaned = outputs[0]
+    assert binary.shape == (2, 70, 53)
+    assert np.array_equal(binary[1], denoised < 0.6 * 255)
+    # Isolated noise pixels are gone after the median filter and morphology
+    assert cleaned.sum() <= binary.sum()
+
+
+def test_raster_process_cli_ingests_window_with_margin(tmp_path, capsys):
+    img = _scan(2, (80, 100))
+    Image.fromarray(img).save(tmp_path / "scan.png")
+    cache = tmp_path / "cache"
+    args = ["raster", "process", "--aoi", "a", "--cache-dir", str(cache), "--block-size", "32"]
+    assert main(args + ["--input", str(tmp_path / "scan.png"), "--window", "10,50,40,70"]) == 0
+    out = capsys.readouterr().out
+    assert "Status: SUCCESS" in out
+
+    target = cache / "a"
+    # The default margin of 100 px is clipped to the raster
+    assert json.loads((target / pipeline.INPUT_META_FILE).read_text())["extent"] == [0, 0, 100, 80]
+    assert np.array_equal(open_raster(target / pipeline.INPUT_FILE), img)
+    assert pipeline.load_planes(target / pipeline.MORPHOLOGY_FILE).shape == (1, 80, 100)
+
+    assert main(args + ["--input", str(tmp_path / "scan.png"), "--window", "10,50,400,70"]) == 1
+
+
+def test_ingest_keeps_margin_around_window(tmp_path):
+    img = _scan(3, (80, 100))
+    np.save(tmp_path / "scan.npy", img)
+    path = pipeline.ingest(
+        tmp_path / "scan.npy", tmp_path / "a", window=(10, 50, 40, 70), margin_px=5
+    )
+    assert np.array_equal(open_raster(path), img[45:75, 5:45])
+
+
+def test_stage_filters_match_scipy(tmp_path):
+    img = _scan(4, (60, 70))
+    np.save(tmp_path / "scan.npy", img)
+    target = tmp_path / "a"
+    pipeline.ingest(tmp_path / "scan.npy", target)
+    denoised = np.array(open_raster(pipeline.denoise(target, True, 16).path))
+    assert np.array_equal(denoised, ndimage.median_filter(img, size=3, mode="reflect"))
+
+    binary = pipeline.load_planes(pipeline.binarize(target, [0.5], 16).path)
+    cleaned = pipeline.load_planes(pipeline.morphology(target, 2, 16).path)
+    structure = np.ones((3, 3), dtype=bool)
+    # Away from the border, where SciPy pads with zeros instead of mirroring
+    expected = ndimage.binary_closing(ndimage.binary_opening(binary[0], structure, 2), structure, 2)
+    assert np.array_equal(cleaned[0, 8:-8, 8:-8], expected[8:-8, 8:-8])
+
+
+def test_binarize_stores_bit_planes(tmp_path):
+    img = _scan(5, (37, 29))
+    np.save(tmp_path / "scan.npy", img)
+    target = tmp_path / "a"
+    pipeline.ingest(tmp_path / "scan.npy", target)
+    pipeline.denoise(target, False)
+    thresholds = [0.2, 0.5, 0.9]
+    path = pipeline.binarize(target, thresholds, block_size=10).path
+
+    # 29 pixels pack into 4 bytes per row
+    assert open_raster(path).shape == (3, 37, 4)
+    meta = pipeline.read_mask_meta(path)
+    assert (meta["width"], meta["thresholds"]) == (29, thresholds)
+    for i, t in enumerate(thresholds):
+        assert np.array_equal(pipeline.load_planes(path, [i])[0], img < t * 255)
+    assert np.array_equal(pipeline.load_planes(path, [2, 0]), pipeline.load_planes(path)[[2, 0]])
+
+
+def _cache_hits(out: str) -> list[bool]:
+    """Whether each stage reported by a raster command was a cache hit."""
+    return [
+        line.startswith("    Cache hit:")
+        for line in out.splitlines()
+        if line.startswith(("    Cache hit:", "    Wrote"))
+    ]
+
+
+def test_raster_stages_rerun_only_when_inputs_change(tmp_path, capsys):
+    np.save(tmp_path / "scan.npy", _scan(6, (40, 50)))
+    common = ["--aoi", "a", "--cache-dir", str(tmp_path / "cache")]
+    process = ["raster", "process", *common]
+
+    assert main(process + ["--input", str(tmp_path / "scan.npy")]) == 0
+    assert _cache_hits(capsys.readouterr().out) == [False, False, False]
+    cleaned = pipeline.load_planes(tmp_path / "cache" / "a" / pipeline.MORPHOLOGY_FILE)
+
+    # Ingesting the same pixels again keeps every stage
+    assert main(process + ["--input", str(tmp_path / "scan.npy")]) == 0
+    assert _cache_hits(capsys.readouterr().out) == [True, True, True]
+
+    # Other morphology parameters re-run only that stage
+    assert main(["raster", "morphology", *common, "--iterations", "1"]) == 0
+    assert _cache_hits(capsys.readouterr().out) == [False]
+    assert main(process) == 0
+    assert _cache_hits(capsys.readouterr().out) == [True, True, False]
+    assert np.array_equal(
+        pipeline.load_planes(tmp_path / "cache" / "a" / pipeline.MORPHOLOGY_FILE), cleaned
+    )
+
+    assert main(process + ["--force"]) == 0
+    assert _cache_hits(capsys.readouterr().out) == [False, False, False]
+
+    # New pixels invalidate everything derived from them
+    np.save(tmp_path / "scan.npy", _scan(7, (40, 50)))
+    assert main(process + ["--input", str(tmp_path / "scan.npy")]) == 0
+    assert _cache_hits(capsys.readouterr().out) == [False, False, False]
+
+
+def test_interrupted_ingest_does_not_keep_stale_stages(tmp_path, monkeypatch):
+    cache = tmp_path / "a"
+    np.save(tmp_path / "scan.npy", _scan(8, (30, 40)))
+    pipeline.ingest(tmp_path / "scan.npy", cache)
+    pipeline.denoise(cache)
+
+    # Stop right after the new pixels are put in place
+    replace = Path.replace
+
+    def interrupted(self, target):
+        replace(self, target)
+        raise KeyboardInterrupt
+
+    np.save(tmp_path / "scan.npy", _scan(9, (30, 40)))
+    with monkeypatch.context() as m:
+        m.setattr(Path, "replace", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            pipeline.ingest(tmp_path / "scan.npy", cache)
+
+    # The stage notices the new pixels by their file hash
+    assert not pipeline.denoise(cache).cached
+    expected = ndimage.median_filter(_scan(9, (30, 40)), size=3, mode="nearest")
+    assert np.array_equal(
+        open_raster(cache / pipeline.DENOISED_FILE)[1:-1, 1:-1], expected[1:-1, 1:-1]
+    )
@@ -0,0 +1,108 @@
+"""Tests for tracing mask rasters into OMap objects."""
+
+import json
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from mapgen.cli import main
+from mapgen.omap import load_omap
+from mapgen.omap.model import COORD_CLOSE_POINT, COORD_HOLE_POINT
+from mapgen.raster.vectorize import Rings, trace_rings
+
+
+def _save_mask(path, masks: np.ndarray) -> str:
+    np.save(path, np.packbits(masks, axis=-1))
+    meta = {"width": masks.shape[-1], "thresholds": [0.5] * len(masks)}
+    path.with_suffix(".json").write_text(json.dumps(meta))
+    return str(path)
+
+
+def _fill(rings: Rings, shape: tuple[int, int], indices=None) -> np.ndarray:
+    """Rasterizes rings with the even-odd rule at pixel centers."""
+    if indices is None:
+        indices = range(len(rings.offsets) - 1)
+    crossings = np.zeros((shape[0], shape[1] + 1), dtype=np.int64)
+    for i in indices:
+        ring = rings.vertices[rings.offsets[i] : rings.offsets[i + 1]]
+        for (x0, y0), (x1, y1) in zip(ring, np.roll(ring, -1, axis=0), strict=True):
+            if x0 == x1:
+                crossings[min(y0, y1) : max(y0, y1), x0] ^= 1
+    return np.cumsum(crossings, axis=1)[:, : shape[1]] % 2 == 1
+
+
+def _canonical(rings: Rings) -> list:
+    """Rings as vertex tuples starting at their smallest vertex, in sorted order."""
+    result = []
+    for a, b in zip(rings.offsets[:-1], rings.offsets[1:], strict=True):
+        ring = [tuple(v) for v in rings.vertices[a:b].tolist()]
+        start = ring.index(min(ring))
+        result.append(ring[start:] + ring[:start])
+    return sorted(result)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rings_reproduce_mask_for_any_tiling(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    masks = rng.random((2, 37, 45)) < (0.2 + 0.15 * seed)
+    path = _save_mask(tmp_path / "mask.npy", masks)
+
+    whole = trace_rings(path, block_size=1000)
+    for plane, rings in enumerate(whole):
+        assert np.array_equal(_fill(rings, masks.shape[1:]), masks[plane])
+        # One outer ring per region of pixels touching at edges or corners
+        regions = ndimage.label(masks[plane], np.ones((3, 3)))[1]
+        assert (rings.owner == np.arange(len(rings.owner))).sum() == regions
+
+    for block_size, workers in [(5, None), (8, 2), (16, None)]:
+        tiled = trace_rings(path, block_size, workers)
+        assert [_canonical(r) for r in tiled] == [_canonical(r) for r in whole]
+
+
+def test_holes_belong_to_their_region(tmp_path):
+    mask = np.zeros((20, 24), dtype=bool)
+    mask[2:18, 2:18] = True
+    mask[5:15, 5:15] = False  # Hole
+    mask[8:12, 8:12] = True  # Island in the hole
+    mask[9:11, 9:11] = False  # Hole of the island
+    mask[3, 20] = mask[4, 21] = True  # Touching at a corner
+    path = _save_mask(tmp_path / "mask.npy", mask[None])
+
+    rings = trace_rings(path, block_size=6)[0]
+    labels, n = ndimage.label(mask, np.ones((3, 3)))
+    assert n == 3
+    outers = np.flatnonzero(rings.owner == np.arange(len(rings.owner)))
+    assert len(outers) == 3 and len(rings.owner) == 5
+    for outer in outers:
+        region = _fill(rings, mask.shape, np.flatnonzero(rings.owner == outer))
+        assert np.array_equal(region, labels == labels[region][0])
+
+
+def test_generate_writes_areas_and_contours(tmp_path, capsys):
+    img = np.full((60, 80), 230, dtype=np.uint8)
+    img[10:50, 10:70] = 40
+    img[20:40, 30:50] = 230
+    np.save(tmp_path / "scan.npy", img)
+    cache = tmp_path / "cache"
+    common = ["--aoi", "a", "--cache-dir", str(cache)]
+    assert main(["raster", "process", *common, "--input", str(tmp_path / "scan.npy")]) == 0
+
+    out = tmp_path / "a.omap"
+    args = ["generate", *common, "--out", str(out), "--bbox", "0,0,8000,6000", "--block-size", "32"]
+    assert main(args) == 0
+    assert "Generated 3 objects (1 areas, 2 lines)" in capsys.readouterr().out
+
+    doc = load_omap(out)
+    assert [s.type for s in doc.get_symbols().values()] == [4, 2]
+    area, *contours = doc.get_objects()
+    assert area.type == 3 and [c.type for c in contours] == [2, 2]
+    # The square and its hole, each closed, at 100 map units per pixel
+    ends = np.flatnonzero(area.flags)
+    assert area.flags[ends].tolist() == [COORD_CLOSE_POINT | COORD_HOLE_POINT, COORD_CLOSE_POINT]
+    assert ends[-1] == len(area.coords) - 1
+    outer, hole = area.coords[: ends[0] + 1], area.coords[ends[0] + 1 :]
+    assert [*outer.min(axis=0), *outer.max(axis=0)] == [1000, 1000, 7000, 5000]
+    assert [*hole.min(axis=0), *hole.max(axis=0)] == [3000, 2000, 5000, 4000]
+
+    assert main(["generate", "--aoi", "missing", "--cache-dir", str(cache), "--out", str(out)]) == 1
@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from mapgen.omap import load_omap
+from mapgen.render.renderer import (
+    _draw_lines,
+    _draw_polygons,
+    render_document,
+    render_omap_to_png,
+)
+
+GOLDEN = Path("tests/golden")
+
+
+def _pixels(path: Path) -> np.ndarray:
+    with Image.open(path) as img:
+        return np.array(img.convert("RGB"))
+
+
+def _random_batch(rng: np.random.Generator, w_px: int, h_px: int, min_vertices: int):
+    counts = rng.integers(min_vertices, 9, size=int(rng.integers(1, 8)))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    # Reach past every canvas edge, and snap some batches to a coarse grid so that
+    # horizontal, vertical and diagonal edges and repeated vertices are common
+    px = np.trunc(rng.uniform(-0.5, 1.5, size=(offsets[-1], 2)) * (w_px, h_px))
+    if rng.random() < 0.3:
+        px = np.trunc(px / 7) * 7
+    return px, offsets
+
+
+def test_batches_match_drawing_objects_one_by_one():
+    rng = np.random.default_rng(0)
+    for trial in range(100):
+        w_px, h_px = (int(v) for v in rng.integers(5, 80, size=2))
+        img = Image.new("RGB", (w_px, h_px), (255, 255, 255))
+        batch_draw = ImageDraw.Draw(img)
+        expected = Image.new("RGB", (w_px, h_px), (255, 255, 255))
+        draw = ImageDraw.Draw(expected)
+        polygons = trial % 2 == 1
+        px, offsets = _random_batch(rng, w_px, h_px, 3 if polygons else 0)
+        width = int(rng.integers(1, 9))
+        if polygons:
+            _draw_polygons(batch_draw, px, offsets, (0, 0, 0))
+        else:
+            _draw_lines(batch_draw, px, offsets, (0, 0, 0), width)
+        for a, b in zip(offsets[:-1], offsets[1:], strict=True):
+            xy = [tuple(v) for v in px[a:b].tolist()]
+            if polygons:
+                draw.polygon(xy, fill=(0, 0, 0))
+            elif xy:
+                draw.line(xy, fill=(0, 0, 0), width=width)
+        assert np.array_equal(np.asarray(img), np.asarray(expected)), trial
+
+
+@pytest.mark.parametrize("aoi", ["aoi_01", "aoi_02"])
+def test_batches_match_golden(aoi: str):
+    config = json.loads((GOLDEN / aoi / "render_config.json").read_text())
+    doc = load_omap(GOLDEN / aoi / "ref.omap")
+    img = render_document(doc, tuple(config["bbox"]), tuple(config["size"]))
+    assert np.array_equal(np.asarray(img), _pixels(GOLDEN / aoi / "ref.png"))
+
+
+def test_batches_on_every_render_path(tmp_path: Path):
+    omap_path = "tests/fixtures/minimal.omap"
+    expected = _pixels(GOLDEN / "render_minimal" / "expected.png")
+    for options in ({}, {"streaming": True}, {"tile_rows": 100}, {"lod": True}):
+        out = tmp_path / "out.png"
+        render_omap_to_png(omap_path, out, (0, 0, 100, 100), (512, 512), **options)
+        assert np.array_equal(_pixels(out), expected), options
@@ -0,0 +1,143 @@
+import io
+import sqlite3
+import tracemalloc
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from mapgen.cli import main
+from mapgen.omap import load_omap
+from mapgen.omap.spatial import GridIndex
+from mapgen.render.pyramid import _occupied_tiles, pyramid_extent, render_pyramid, tile_bbox
+from mapgen.render.renderer import render_document
+
+MINIMAL = "tests/fixtures/minimal.omap"
+
+
+def _pixels(data: bytes) -> np.ndarray:
+    with Image.open(io.BytesIO(data)) as img:
+        return np.array(img.convert("RGB"))
+
+
+def _tiles(root: Path) -> dict:
+    return {
+        tuple(int(p) for p in path.relative_to(root).with_suffix("").parts): path.read_bytes()
+        for path in root.rglob("*.png")
+    }
+
+
+def test_deepest_level_matches_direct_render(tmp_path: Path):
+    doc = load_omap(MINIMAL)
+    extent = (-10.0, -10.0, 110.0, 110.0)
+    counts = render_pyramid(doc, tmp_path / "tiles", 0, 2, tile_size=64, extent=extent)
+    tiles = _tiles(tmp_path / "tiles")
+
+    assert counts[2] == sum(1 for z, _, _ in tiles if z == 2)
+    for (z, x, y), data in tiles.items():
+        if z == 2:
+            expected = np.asarray(
+                render_document(doc, tile_bbox(extent, z, x, y), (64, 64), lod=True)
+            )
+            assert np.array_equal(_pixels(data), expected)
+
+
+def test_lower_levels_are_downsampled_children(tmp_path: Path):
+    doc = load_omap(MINIMAL)
+    render_pyramid(doc, tmp_path / "tiles", 0, 3, tile_size=32)
+    tiles = _tiles(tmp_path / "tiles")
+
+    for (z, x, y), data in tiles.items():
+        if z == 3:
+            continue
+        canvas = Image.new("RGB", (64, 64), (255, 255, 255))
+        for dy in (0, 1):
+            for dx in (0, 1):
+                child = tiles.get((z + 1, 2 * x + dx, 2 * y + dy))
+                if child is not None:
+                    canvas.paste(Image.open(io.BytesIO(child)).convert("RGB"), (32 * dx, 32 * dy))
+        assert np.array_equal(_pixels(data), np.asarray(canvas.reduce(2)))
+
+
+def test_empty_tiles_are_skipped(tmp_path: Path):
+    doc = load_omap(MINIMAL)
+    # The objects sit in the top-left quarter of this extent
+    extent = pyramid_extent(doc)
+    grown = (
+        extent[0],
+        extent[3] - 8 * (extent[3] - extent[1]),
+        extent[0] + 8 * (extent[2] - extent[0]),
+        extent[3],
+    )
+    counts = render_pyramid(doc, tmp_path / "tiles", 0, 4, tile_size=16, extent=grown)
+
+    assert counts[0] == 1
+    assert counts[4] < 4**4 // 16
+    assert len(_tiles(tmp_path / "tiles")) == sum(counts.values())
+
+
+def test_blank_tiles_are_skipped(tmp_path: Path):
+    doc = load_omap(MINIMAL)
+    # The diagonal line reaches every tile by its extent, but draws nothing
+    # in the corners beyond the square
+    counts = render_pyramid(doc, tmp_path / "tiles", 4, 4, tile_size=16)
+    tiles = _tiles(tmp_path / "tiles")
+
+    assert 0 < counts[4] < 4**4
+    assert all((_pixels(data) != 255).any() for data in tiles.values())
+
+
+def test_occupied_tiles_are_the_tiles_of_object_extents():
+    rng = np.random.default_rng(0)
+    lo = rng.uniform(0, 100, size=(30, 2))
+    bounds = np.hstack([lo, lo + rng.uniform(0, 30, size=(30, 2))])
+    bounds[3] = np.nan
+    extent = (0.0, 0.0, 128.0, 128.0)
+    expected = set()
+    for xmin, ymin, xmax, ymax in bounds[~np.isnan(bounds[:, 0])] + (-1, -1, 1, 1):
+        for x in range(max(int(xmin // 8), 0), min(int(xmax // 8), 15) + 1):
+            for y in range(max(int((128 - ymax) // 8), 0), min(int((128 - ymin) // 8), 15) + 1):
+                expected.add((x, y))
+    tiles = list(_occupied_tiles(GridIndex(bounds), extent, 4, 1.0))
+    assert tiles == sorted(expected, key=lambda tile: (tile[1], tile[0]))
+
+
+def test_map_spanning_area_is_not_expanded_at_deep_zoom():
+    # One area covering the whole extent reaches all 4**14 tiles of level 14
+    index = GridIndex(np.array([[0.0, 0.0, 1000.0, 1000.0]]))
+    tracemalloc.start()
+    try:
+        tiles = list(islice(_occupied_tiles(index, (0.0, 0.0, 1000.0, 1000.0), 14, 0.0), 3))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert tiles == [(0, 0), (1, 0), (2, 0)]
+    assert peak < 1 << 20
+
+
+def test_mbtiles_matches_directory(tmp_path: Path):
+    doc = load_omap(MINIMAL)
+    render_pyramid(doc, tmp_path / "tiles", 1, 3, tile_size=32)
+    counts = render_pyramid(doc, tmp_path / "map.mbtiles", 1, 3, tile_size=32, workers=2)
+
+    conn = sqlite3.connect(tmp_path / "map.mbtiles")
+    rows = conn.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles").fetchall()
+    metadata = dict(conn.execute("SELECT name, value FROM metadata").fetchall())
+    conn.close()
+
+    # MBTiles rows count from the bottom
+    mbtiles = {(z, x, (1 << z) - 1 - row): data for z, x, row, data in rows}
+    directory = _tiles(tmp_path / "tiles")
+    assert mbtiles.keys() == directory.keys()
+    for key, data in directory.items():
+        assert np.array_equal(_pixels(mbtiles[key]), _pixels(data))
+    assert len(rows) == sum(counts.values())
+    assert metadata["minzoom"] == "1" and metadata["maxzoom"] == "3"
+
+
+def test_cli_render_tiles(tmp_path: Path, capsys):
+    out = tmp_path / "tiles"
+    assert main(["render", "tiles", "--in", MINIMAL, "--out", str(out), "--zoom-max", "2"]) == 0
+    assert (out / "0" / "0" / "0.png").exists()
+    assert "Zoom 2:" in capsys.readouterr().out
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from mapgen.omap import load_omap
+from mapgen.omap.model import Color, Symbol
+from mapgen.render.renderer import render_omap_to_png
+from mapgen.render.style import RenderStyle
+
+MINIMAL = Path("tests/fixtures/minimal.omap")
+
+
+def _style() -> RenderStyle:
+    colors = {
+        0: Color(0, "Black", (0.0, 0.0, 0.0)),
+        1: Color(1, "Brown", (0.6, 0.3, 0.0)),
+        2: Color(2, "Yellow", (1.0, 0.8, 0.2)),
+    }
+    symbols = {
+        0: Symbol(0, "101", "Contour", 2, line_width=140, color_id=1),
+        1: Symbol(1, "401", "Open", 4, fill_color_id=2),
+        3: Symbol(3, "102", "Path", 2, line_width=300, color_id=0),
+        4: Symbol(4, "999", "Undefined color", 2, line_width=100, color_id=7),
+    }
+    return RenderStyle(colors, symbols)
+
+
+def test_style_table_rows_match_style_lookups():
+    style = _style()
+    table = style.table
+
+    assert table is style.table
+    for symbol_id in (0, 1, 2, 3, 4, 17, -1):
+        row = int(table.rows(np.array([symbol_id]))[0])
+        color, width = style.get_line_style(symbol_id)
+        assert tuple(table.line_rgb[row]) == color
+        assert table.line_width_px[row] == max(1, int(width / 50))
+        assert tuple(table.fill_rgb[row]) == style.get_fill_style(symbol_id)
+    # Unknown symbols and colors are drawn below every known color
+    assert table.line_priority.tolist() == [1, 3, 3, 0, 3, 3]
+    assert table.fill_priority.tolist() == [3, 2, 3, 3, 3, 3]
+
+
+def test_draw_batches_follow_color_priority():
+    table = _style().table
+    types = np.array([2, 3, 2, 3, 1, 2, 2, 3, 2])
+    symbols = np.array([3, 1, 0, 1, 0, 0, 9, 1, 3])
+    order, bounds = table.draw_batches(types, symbols)
+
+    # Unknown symbol first, then yellow areas, brown lines and black lines;
+    # objects of other types are skipped
+    assert order.tolist() == [6, 1, 3, 7, 2, 5, 0, 8]
+    assert bounds.tolist() == [0, 1, 4, 6, 8]
+
+
+def test_render_draws_lower_priorities_on_top(tmp_path: Path):
+    # The line comes first in the file but its color has the higher priority
+    text = MINIMAL.read_text()
+    area = text[text.index('<object symbol="1"') : text.index('<object symbol="0"')]
+    swapped = tmp_path / "swapped.omap"
+    swapped.write_text(text.replace(area, "").replace("</map>", area + "</map>"))
+    assert [o.symbol_id for o in load_omap(swapped).get_objects()] == [0, 1]
+
+    with Image.open("tests/golden/render_minimal/expected.png") as img:
+        expected = np.array(img.convert("RGB"))
+    for streaming in (False, True):
+        out = tmp_path / "out.png"
+        render_omap_to_png(swapped, out, (0, 0, 100, 100), (512, 512), streaming=streaming)
+        with Image.open(out) as img:
+            assert np.array_equal(np.array(img.convert("RGB")), expected)
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from mapgen.render.renderer import render_omap_to_png
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<map xmlns="http://openorienteering.org/apps/mapper/xml/v2" version="9">
+<colors count="3">
+<color priority="0" name="Black"><rgb r="0" g="0" b="0"/></color>
+<color priority="1" name="Blue"><rgb r="0" g="0.5" b="1"/></color>
+<color priority="2" name="Yellow"><rgb r="1" g="0.8" b="0.2"/></color>
+</colors>
+<symbols count="3">
+<symbol type="2" id="0" code="101" name="Thin"><line_symbol color="0" line_width="60"/></symbol>
+<symbol type="2" id="1" code="102" name="Wide"><line_symbol color="1" line_width="450"/></symbol>
+<symbol type="4" id="2" code="401" name="Open"><area_symbol inner_color="2"/></symbol>
+</symbols>
+"""
+
+
+def _write_random_map(path: Path, n_objects: int, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    lines = [HEADER]
+    for _ in range(n_objects):
+        is_area = rng.random() < 0.3
+        n = int(rng.integers(3, 9))
+        center = rng.uniform(-20, 120, size=2)
+        pts = center + rng.normal(size=(n, 2)) * rng.choice([1.0, 8.0, 40.0])
+        coords = ";".join(f"{x:.3f} {y:.3f}" for x, y in pts)
+        symbol, obj_type = (2, 3) if is_area else (int(rng.integers(0, 2)), 2)
+        lines.append(
+            f'<object symbol="{symbol}" type="{obj_type}">'
+            f'<coords count="{n}">{coords};</coords></object>'
+        )
+    lines.append("</map>")
+    path.write_text("\n".join(lines))
+
+
+def _pixels(path: Path) -> np.ndarray:
+    with Image.open(path) as img:
+        return np.array(img.convert("RGB"))
+
+
+def test_tiled_render_matches_golden(tmp_path: Path):
+    out = tmp_path / "tiled.png"
+    render_omap_to_png(
+        "tests/fixtures/minimal.omap", out, (0, 0, 100, 100), (512, 512), tile_rows=37
+    )
+    assert np.array_equal(_pixels(out), _pixels(Path("tests/golden/render_minimal/expected.png")))
+
+
+@pytest.mark.parametrize("tile_rows,workers", [(1, None), (16, None), (64, 2), (1000, 2)])
+def test_tiled_render_is_pixel_identical(tmp_path: Path, tile_rows, workers):
+    omap_path = tmp_path / "random.omap"
+    _write_random_map(omap_path, 400, seed=tile_rows)
+    single = tmp_path / "single.png"
+    tiled = tmp_path / "tiled.png"
+    bbox = (0.0, 0.0, 100.0, 80.0)
+    size = (333, 271)
+
+    render_omap_to_png(omap_path, single, bbox, size)
+    render_omap_to_png(omap_path, tiled, bbox, size, tile_rows=tile_rows, workers=workers)
+
+    assert np.array_equal(_pixels(single), _pixels(tiled))
@@ -1,20 +1,35 @@
 import json
+
 import numpy as np
+import pytest
 from PIL import Image
+
 from mapgen.cli import main
-import pytest
+
 
 def test_score_cli_pass(tmp_path):
     ref_path = tmp_path / "ref.png"
     cand_path = tmp_path / "cand.png"
     out_path = tmp_path / "score.json"
-    
+
     img = Image.fromarray(np.full((100, 100), 128, dtype=np.uint8))
     img.save(ref_path)
     img.save(cand_path)
-    
-    exit_code = main(["score", "--ref", str(ref_path), "--cand", str(cand_path), "--out", str(out_path), "--threshold", "0.99"])
-    
+
+    exit_code = main(
+        [
+            "score",
+            "--ref",
+            str(ref_path),
+            "--cand",
+            str(cand_path),
+            "--out",
+            str(out_path),
+            "--threshold",
+            "0.99",
+        ]
+    )
+
     assert exit_code == 0
     assert out_path.exists()
     with open(out_path) as f:
@@ -22,24 +37,94 @@ def test_score_cli_pass(tmp_path):
         assert data["score"] >= 0.99
         assert data["pass"] is True
 
+
 def test_score_cli_fail(tmp_path):
     ref_path = tmp_path / "ref.png"
     cand_path = tmp_path / "cand.png"
     out_path = tmp_path / "score.json"
-    
+
     # Different images
     Image.fromarray(np.full((100, 100), 0, dtype=np.uint8)).save(ref_path)
     Image.fromarray(np.full((100, 100), 255, dtype=np.uint8)).save(cand_path)
-    
-    exit_code = main(["score", "--ref", str(ref_path), "--cand", str(cand_path), "--out", str(out_path), "--threshold", "0.9"])
-    
+
+    exit_code = main(
+        [
+            "score",
+            "--ref",
+            str(ref_path),
+            "--cand",
+            str(cand_path),
+            "--out",
+            str(out_path),
+            "--threshold",
+            "0.9",
+        ]
+    )
+
     assert exit_code == 2
     with open(out_path) as f:
         data = json.load(f)
         assert data["score"] < 0.1
         assert data["pass"] is False
 
+
 def test_score_cli_missing_file(tmp_path):
     out_path = tmp_path / "score.json"
-    exit_code = main(["score", "--ref", "nonexistent.png", "--cand", "nonexistent.png", "--out", str(out_path)])
+    exit_code = main(
+        ["score", "--ref", "nonexistent.png", "--cand", "nonexistent.png", "--out", str(out_path)]
+    )
     assert exit_code == 1
+
+
+def test_score_cli_batch(tmp_path):
+    from mapgen.metrics.similarity import compute_ssim
+
+    rng = np.random.default_rng(0)
+    ref = rng.integers(0, 256, size=(60, 80), dtype=np.uint8)
+    paths = {}
+    for name, arr in (("ref", ref), ("same", ref), ("noisy", ref // 2), ("other", ref[::-1])):
+        paths[name] = tmp_path / f"{name}.png"
+        Image.fromarray(arr).save(paths[name])
+    other_ref = tmp_path / "ref2.png"
+    Image.fromarray(ref.T[:60, :60].copy()).save(other_ref)
+
+    pairs = [
+        {"id": "a", "ref": str(paths["ref"]), "cand": str(paths["noisy"])},
+        {"id": "b", "ref": str(other_ref), "cand": str(other_ref)},
+        {"id": "c", "ref": str(paths["ref"]), "cand": str(paths["same"])},
+        {"id": "d", "ref": str(paths["ref"]), "cand": str(paths["other"])},
+    ]
+    manifest = tmp_path / "pairs.jsonl"
+    manifest.write_text("\n".join(json.dumps(p) for p in pairs) + "\n")
+
+    out = tmp_path / "scores.json"
+    args = ["score", "--batch", str(manifest), "--out", str(out), "--threshold", "0.99"]
+    assert main(args + ["--workers", "2", "--tile-size", "32"]) == 2
+    results = json.loads(out.read_text())["results"]
+    assert [r["id"] for r in results] == ["a", "b", "c", "d"]
+    assert [r["pass"] for r in results] == [False, True, True, False]
+    for pair, result in zip(pairs, results, strict=True):
+        expected = compute_ssim(pair["ref"], pair["cand"])
+        assert result["score"] == pytest.approx(expected, abs=1e-12)
+
+    out = tmp_path / "scores.jsonl"
+    assert main(["score", "--batch", str(manifest), "--out", str(out)]) == 0
+    lines = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [r["candidate"] for r in lines] == [p["cand"] for p in pairs]
+
+
+def test_score_cli_batch_reports_missing_images(tmp_path):
+    img = tmp_path / "img.png"
+    Image.fromarray(np.zeros((20, 20), dtype=np.uint8)).save(img)
+    manifest = tmp_path / "pairs.jsonl"
+    manifest.write_text(
+        json.dumps({"ref": str(img), "cand": "nonexistent.png"})
+        + "\n"
+        + json.dumps({"ref": str(img), "cand": str(img)})
+        + "\n"
+    )
+    out = tmp_path / "scores.json"
+    assert main(["score", "--batch", str(manifest), "--out", str(out)]) == 1
+    first, second = json.loads(out.read_text())["results"]
+    assert "File not found" in first["error"]
+    assert second["score"] == pytest.approx(1.0)
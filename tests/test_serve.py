@@ -0,0 +1,235 @@
+"""Tests for the long-lived `mapgen serve` worker."""
+
+import io
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from mapgen.acceptance.run import run_aoi
+from mapgen.render.renderer import render_omap_to_png
+from mapgen.serve import LRUCache, Worker, serve_socket, serve_stream
+
+GOLDEN = Path("tests/golden")
+FIXTURE = "tests/fixtures/complex.omap"
+
+
+def _serve(worker: Worker, requests: list) -> dict:
+    """Runs requests through a stream and returns the responses by id."""
+    lines = io.StringIO(
+        "".join((r if isinstance(r, str) else json.dumps(r)) + "\n" for r in requests)
+    )
+    out = io.StringIO()
+    serve_stream(worker, lines, out)
+    return {r["id"]: r for r in map(json.loads, out.getvalue().splitlines())}
+
+
+@pytest.fixture
+def worker():
+    worker = Worker(jobs=2)
+    yield worker
+    worker.close()
+
+
+def test_requests_reuse_cached_documents_and_images(tmp_path, worker):
+    render = {
+        "op": "render",
+        "input": FIXTURE,
+        "bbox": [-5000, -5000, 5000, 5000],
+        "size": [64, 64],
+    }
+    responses = _serve(
+        worker, [dict(render, id=i, output=str(tmp_path / f"{i}.png")) for i in range(3)]
+    )
+    assert all(responses[i]["ok"] for i in range(3))
+    # Parsed once; the other renders waited for it or found it cached
+    assert worker.cache.stats()["misses"] == 1
+
+    expected = tmp_path / "expected.png"
+    render_omap_to_png(FIXTURE, expected, (-5000, -5000, 5000, 5000), (64, 64))
+    assert (tmp_path / "0.png").read_bytes() == expected.read_bytes()
+
+    score = {"op": "score", "ref": str(expected), "cand": str(tmp_path / "1.png"), "threshold": 0.9}
+    responses = _serve(worker, [dict(score, id=i) for i in range(2)])
+    assert responses[0]["result"]["score"] == pytest.approx(1.0)
+    assert responses[0]["result"]["pass"] is True
+    stats = worker.cache.stats()
+    assert (stats["entries"], stats["misses"], stats["hits"]) == (2, 2, 3)
+
+
+def test_acceptance_matches_run_aoi(tmp_path, worker):
+    request = {"id": 1, "op": "acceptance", "aoi": "aoi_01", "artifacts": str(tmp_path / "served")}
+    result = _serve(worker, [request])[1]["result"]
+    expected = run_aoi(GOLDEN / "aoi_01", tmp_path / "direct" / "aoi_01")
+    assert result["score"] == expected["score"] and result["pass"] == expected["pass"]
+    assert result["cached"] is False
+    assert _serve(worker, [request])[1]["result"]["cached"] is True
+
+
+def test_requests_do_not_start_process_pools(tmp_path, worker, monkeypatch):
+    import mapgen.render.tiled
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a request started a process pool")
+
+    monkeypatch.setattr(mapgen.render.tiled, "ProcessPoolExecutor", no_pool)
+    render = {
+        "op": "render",
+        "input": FIXTURE,
+        "bbox": [-5000, -5000, 5000, 5000],
+        "size": [64, 64],
+    }
+    request = dict(render, id=1, output=str(tmp_path / "a.png"), tile_rows=16, workers=4)
+    assert _serve(worker, [request])[1]["ok"]
+
+
+def test_errors_are_reported_per_request(worker):
+    responses = _serve(
+        worker,
+        [
+            "not json",
+            {"id": 1, "op": "explode"},
+            {"id": 2, "op": "render", "input": FIXTURE},
+            {"id": 3, "op": "score", "ref": "missing.png", "cand": "missing.png"},
+            {"id": 4, "op": "stats"},
+        ],
+    )
+    assert responses[None]["error"].startswith("Invalid request")
+    assert "Unknown op" in responses[1]["error"]
+    assert responses[2]["error"] == "Missing parameter: bbox"
+    assert responses[3]["error"].startswith("FileNotFoundError")
+    assert responses[4]["ok"]
+
+
+def test_cache_evicts_least_recently_used_by_size():
+    cache = LRUCache(max_bytes=100)
+    loads = []
+
+    def loader(key, size):
+        return lambda: (loads.append(key) or key, size)
+
+    for key in "abc":
+        cache.get(key, loader(key, 40))
+    # "a" went to make room for "c"
+    assert loads == ["a", "b", "c"] and cache.bytes == 80
+    cache.get("b", loader("b", 40))
+    cache.get("d", loader("d", 40))
+    cache.get("b", loader("b", 40))
+    assert loads == ["a", "b", "c", "d"]
+    # Too large to keep
+    cache.get("e", loader("e", 101))
+    assert cache.stats()["entries"] == 2
+
+
+def test_resize_recharges_and_evicts():
+    cache = LRUCache(max_bytes=100)
+    a, b = cache.get("a", lambda: ([], 40)), cache.get("b", lambda: ([], 40))
+    cache.resize("b", b, 70)
+    # "a" went to make room for the grown "b"
+    assert cache.stats()["entries"] == 1 and cache.bytes == 70
+    # Only the value the key still holds is recharged
+    cache.resize("b", a, 10)
+    assert cache.bytes == 70
+    cache.resize("b", b, 101)
+    assert cache.stats()["entries"] == 0 and cache.bytes == 0
+
+
+def test_render_charges_flattened_and_lod_stores(tmp_path, worker):
+    doc = worker.load_document(FIXTURE)
+    stores = doc.store_bytes()
+    tree = worker.cache.bytes - stores
+    render = {
+        "op": "render",
+        "input": FIXTURE,
+        "bbox": [-5000, -5000, 5000, 5000],
+        "size": [64, 64],
+    }
+    responses = _serve(worker, [dict(render, id=1, output=str(tmp_path / "a.png"), lod=True)])
+    assert responses[1]["ok"]
+    assert doc.store_bytes() > stores
+    assert worker.cache.bytes == tree + doc.store_bytes()
+
+
+def test_documents_without_a_tree_are_charged_their_stores(tmp_path):
+    omap_path = tmp_path / "map.omap"
+    shutil.copy(FIXTURE, omap_path)
+    # The first load parses the XML and writes the binary cache
+    warm = Worker(jobs=1, omap_cache_dir=tmp_path / "cache")
+    assert warm.load_document(omap_path).has_tree
+    warm.close()
+
+    worker = Worker(jobs=1, omap_cache_dir=tmp_path / "cache")
+    try:
+        doc = worker.load_document(omap_path)
+        assert not doc.has_tree
+        assert worker.cache.bytes == doc.store_bytes()
+
+        # A request that parses the tree gets it charged
+        with worker._documents() as load_document:
+            assert load_document(omap_path).root is not None
+        assert worker.cache.bytes > doc.store_bytes()
+    finally:
+        worker.close()
+
+
+def test_concurrent_misses_load_once():
+    cache = LRUCache(max_bytes=100)
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value", 1
+
+    threads = [threading.Thread(target=cache.get, args=("k", load)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+
+
+def test_socket_serves_until_shutdown(tmp_path, worker):
+    path = tmp_path / "mapgen.sock"
+    server = threading.Thread(target=serve_socket, args=(worker, path))
+    server.start()
+    for _ in range(100):
+        if path.exists():
+            break
+        time.sleep(0.05)
+
+    with socket.socket(socket.AF_UNIX) as conn:
+        conn.connect(str(path))
+        conn.sendall(b'{"id": 1, "op": "stats"}\n{"id": 2, "op": "shutdown"}\n')
+        with conn.makefile() as f:
+            responses = [json.loads(line) for line in f]
+    assert [(r["id"], r["ok"]) for r in responses] == [(1, True), (2, True)]
+    server.join(timeout=10)
+    assert not server.is_alive() and not path.exists()
+
+
+def test_serve_command_reads_stdin(tmp_path):
+    out = tmp_path / "a.png"
+    request = {
+        "id": 7,
+        "op": "render",
+        "input": FIXTURE,
+        "output": str(out),
+        "bbox": "0,0,100,100",
+        "size": "8,8",
+    }
+    result = subprocess.run(
+        [sys.executable, "-m", "mapgen.cli", "serve", "--jobs", "1"],
+        input=json.dumps(request) + "\n",
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert json.loads(result.stdout) == {"id": 7, "ok": True, "result": {"output": str(out)}}
+    assert out.exists()
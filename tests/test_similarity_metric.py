@@ -1,59 +1,106 @@
 import numpy as np
-from PIL import Image
 import pytest
-from mapgen.metrics.similarity import compute_ssim
-import os
+from PIL import Image
+from skimage.metrics import structural_similarity as ssim
+
+from mapgen.metrics.similarity import compute_ssim, ssim_tiled
+
 
 def test_identical_images(tmp_path):
     img_path = tmp_path / "img.png"
     img = Image.fromarray(np.full((100, 100), 128, dtype=np.uint8))
     img.save(img_path)
-    
+
     score = compute_ssim(str(img_path), str(img_path))
     assert score >= 0.999
 
+
 def test_slightly_modified_image(tmp_path):
     ref_path = tmp_path / "ref.png"
     cand_path = tmp_path / "cand.png"
-    
+
     ref = Image.fromarray(np.full((100, 100), 128, dtype=np.uint8))
     ref.save(ref_path)
-    
+
     # Add a single dot
     cand_arr = np.full((100, 100), 128, dtype=np.uint8)
     cand_arr[50, 50] = 0
     cand = Image.fromarray(cand_arr)
     cand.save(cand_path)
-    
+
     score = compute_ssim(str(ref_path), str(cand_path))
     assert score < 0.999
     assert score > 0.9
 
+
 def test_shifted_image(tmp_path):
     ref_path = tmp_path / "ref.png"
     cand_path = tmp_path / "cand.png"
-    
+
     # Create a simple pattern
     ref_arr = np.zeros((100, 100), dtype=np.uint8)
     ref_arr[40:60, 40:60] = 255
     Image.fromarray(ref_arr).save(ref_path)
-    
+
     # Shift by 1px
     cand_arr = np.zeros((100, 100), dtype=np.uint8)
     cand_arr[41:61, 41:61] = 255
     Image.fromarray(cand_arr).save(cand_path)
-    
+
     score = compute_ssim(str(ref_path), str(cand_path))
     # Shifting by 1px significantly reduces SSIM for sharp edges
     assert score < 0.99
     assert score > 0.5  # Still recognizes similarity
 
+
 def test_different_dimensions(tmp_path):
     img1_path = tmp_path / "img1.png"
     img2_path = tmp_path / "img2.png"
-    
+
     Image.fromarray(np.zeros((100, 100), dtype=np.uint8)).save(img1_path)
     Image.fromarray(np.zeros((50, 50), dtype=np.uint8)).save(img2_path)
-    
+
     with pytest.raises(ValueError, match="Image dimensions do not match"):
         compute_ssim(str(img1_path), str(img2_path))
+
+
+@pytest.mark.parametrize("shape", [(7, 7), (64, 91), (203, 157)])
+def test_tiled_ssim_matches_monolithic(shape, map_like):
+    ref = map_like(0, shape)
+    cand = np.roll(ref, 2, axis=1)
+    expected = ssim(ref, cand, data_range=255)
+    for tile_size in (3, 16, 50, 1000):
+        for workers in (None, 3):
+            assert ssim_tiled(ref, cand, tile_size, workers) == pytest.approx(expected, abs=1e-12)
+
+
+def test_compute_ssim_tiles_large_images(tmp_path, map_like):
+    ref_path = tmp_path / "ref.png"
+    cand_path = tmp_path / "cand.png"
+    ref = map_like(1, (150, 230))
+    Image.fromarray(ref).save(ref_path)
+    Image.fromarray(np.roll(ref, 1, axis=0)).save(cand_path)
+
+    whole = compute_ssim(str(ref_path), str(cand_path), tile_size=None)
+    tiled = compute_ssim(str(ref_path), str(cand_path), tile_size=64, workers=2)
+    assert tiled == pytest.approx(whole, abs=1e-12)
+    assert compute_ssim(str(ref_path), str(cand_path)) == whole
+
+
+def test_tiled_ssim_rejects_images_smaller_than_the_window():
+    with pytest.raises(ValueError, match="at least 7x7"):
+        ssim_tiled(np.zeros((6, 50), dtype=np.uint8), np.zeros((6, 50), dtype=np.uint8))
+
+
+def test_loading_images_in_threads_keeps_the_pixel_limit(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from mapgen.images import MAX_IMAGE_PIXELS, load_image
+
+    path = str(tmp_path / "a.png")
+    Image.new("L", (64, 64), 128).save(path)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        images = list(pool.map(load_image, [path] * 64))
+    assert all(image.shape == (64, 64) for image in images)
+    # Raised once for renders up to 20k x 20k, never lifted or put back
+    assert Image.MAX_IMAGE_PIXELS == MAX_IMAGE_PIXELS